@@ -1,5 +1,6 @@
-from fastapi import APIRouter
-from . import auth, events, layouts, upload, user_elements
+from fastapi import APIRouter, Depends
+from . import auth, events, internal, layouts, upload, user_elements
+from ...core.auth import require_internal_token
 
 api_router = APIRouter()
 
@@ -8,4 +9,10 @@ api_router.include_router(auth.router, prefix="/auth", tags=["authentication"])
 api_router.include_router(events.router, prefix="/events", tags=["events"])
 api_router.include_router(layouts.router, prefix="/layouts", tags=["layouts"])
 api_router.include_router(upload.router, prefix="/upload", tags=["upload"])
-api_router.include_router(user_elements.router, prefix="/user-elements", tags=["user-elements"])
\ No newline at end of file
+api_router.include_router(user_elements.router, prefix="/user-elements", tags=["user-elements"])
+api_router.include_router(
+    internal.router,
+    prefix="/internal",
+    tags=["internal"],
+    dependencies=[Depends(require_internal_token)]
+)
\ No newline at end of file
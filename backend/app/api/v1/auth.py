@@ -1,19 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
 
 from ...core.database import get_db
-from ...core.auth import authenticate_user, create_access_token, get_password_hash, get_current_user, verify_password
+from ...core.auth import authenticate_user, create_access_token, get_password_hash_async, get_current_user, verify_password_async
 from ...core.config import JWT_ACCESS_TOKEN_EXPIRE_MINUTES
-from ...models.models import User
+from ...core.image_refs import sync_event_images
+from ...core.principal_cache import principal_cache
+from ...models.models import User, Event
 from ...schemas.user import UserCreate, UserResponse, UserLogin, Token, UserUpdateProfile, UserUpdatePassword, UserDeleteConfirmation
 
 router = APIRouter()
 
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     """Register a new user"""
     try:
         # Validate password length (bcrypt limit is 72 bytes)
@@ -24,7 +27,7 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
             )
         
         # Hash the password
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await get_password_hash_async(user.password)
         
         # Create new user
         db_user = User(
@@ -34,13 +37,13 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
         )
         
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         
         return db_user
         
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
@@ -48,9 +51,9 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=Token)
-async def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
+async def login_user(user_credentials: UserLogin, db: AsyncSession = Depends(get_db)):
     """Login user and return JWT token"""
-    user = authenticate_user(db, user_credentials.email, user_credentials.password)
+    user = await authenticate_user(db, user_credentials.email, user_credentials.password)
     
     if not user:
         raise HTTPException(
@@ -77,7 +80,7 @@ async def login_user(user_credentials: UserLogin, db: Session = Depends(get_db))
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_profile(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get current user profile"""
@@ -87,7 +90,7 @@ async def get_current_user_profile(
 @router.put("/me/profile", response_model=UserResponse)
 async def update_user_profile(
     profile_data: UserUpdateProfile,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Update user profile (name and/or email)"""
@@ -99,10 +102,10 @@ async def update_user_profile(
         # Update email if provided
         if profile_data.email is not None:
             # Check if email is already taken by another user
-            existing_user = db.query(User).filter(
+            existing_user = await db.scalar(select(User).where(
                 User.email == profile_data.email,
                 User.user_id != current_user.user_id
-            ).first()
+            ))
             
             if existing_user:
                 raise HTTPException(
@@ -112,13 +115,14 @@ async def update_user_profile(
             
             current_user.email = profile_data.email
         
-        db.commit()
-        db.refresh(current_user)
+        await db.commit()
+        await db.refresh(current_user)
+        principal_cache.invalidate_user(current_user.user_id)
         
         return current_user
         
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
@@ -128,12 +132,12 @@ async def update_user_profile(
 @router.put("/me/password")
 async def update_user_password(
     password_data: UserUpdatePassword,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Update user password"""
     # Verify current password
-    if not verify_password(password_data.current_password, current_user.password_hash):
+    if not await verify_password_async(password_data.current_password, current_user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
@@ -147,9 +151,10 @@ async def update_user_password(
         )
     
     # Hash and update new password
-    current_user.password_hash = get_password_hash(password_data.new_password)
+    current_user.password_hash = await get_password_hash_async(password_data.new_password)
     
-    db.commit()
+    await db.commit()
+    principal_cache.invalidate_user(current_user.user_id)
     
     return {"message": "Password updated successfully"}
 
@@ -157,19 +162,26 @@ async def update_user_password(
 @router.delete("/me")
 async def delete_user_account(
     delete_data: UserDeleteConfirmation,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Delete user account (requires password confirmation)"""
     # Verify password
-    if not verify_password(delete_data.password, current_user.password_hash):
+    if not await verify_password_async(delete_data.password, current_user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Password is incorrect"
         )
     
+    # Release image references held by the user's events
+    user_id = current_user.user_id
+    events = (await db.execute(select(Event.event_id, Event.images).where(Event.user_id == user_id))).all()
+    for event_id, images in events:
+        await sync_event_images(db, event_id, images, [])
+    
     # Delete user (cascade will handle related events, layouts, and custom elements)
-    db.delete(current_user)
-    db.commit()
+    await db.delete(current_user)
+    await db.commit()
+    principal_cache.invalidate_user(user_id)
     
     return {"message": "Account deleted successfully"}
\ No newline at end of file
@@ -1,19 +1,50 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+import hashlib
 
-from ...core.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date
+from typing import List, Literal, Optional, Tuple
+
+from ...core.database import get_db, open_db_session
 from ...core.auth import get_current_user
+from ...core.calendar_feed import calendar_footer, calendar_header, encode_vevents, feed_token, feed_user_id, verify_feed_token
+from ...core.config import FAST_JSON_RESPONSES, EVENT_BULK_BATCH_SIZE, EVENT_BULK_MAX_ERRORS
+from ...core.event_search import event_search_available, search_events
+from ...core.event_transfer import (
+    BulkImportError, encode_csv, encode_ndjson, insert_events, iter_csv_records, iter_event_rows,
+    iter_lines, iter_ndjson_records, parse_event
+)
+from ...core.http_cache import (
+    cache_headers, check_if_match, collection_etag, is_conditional, is_not_modified, make_etag, not_modified
+)
+from ...core.responses import FastJSONResponse
+from ...core.image_refs import sync_event_images
+from ...core.pagination import keyset_paginate, page_results, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from ...models.models import User, Event
-from ...schemas.event import EventCreate, EventUpdate, EventResponse, ImageUpload
+from ...schemas.common import Page
+from ...schemas.event import EventCreate, EventUpdate, EventResponse, EventSearchResults, ImageUpload
+
+router = APIRouter(default_response_class=FastJSONResponse if FAST_JSON_RESPONSES else JSONResponse)
+
+# Ranked results past this depth are rarely wanted and get slower to reach
+SEARCH_MAX_OFFSET = 1000
+
 
-router = APIRouter()
+def _event_etag(event_id: int, updated_at) -> str:
+    return make_etag("event", event_id, updated_at)
+
+
+def _event_headers(event: Event) -> dict:
+    return cache_headers(_event_etag(event.event_id, event.updated_at), event.updated_at)
 
 
 @router.post("/", response_model=EventResponse, status_code=status.HTTP_201_CREATED)
 async def create_event(
     event: EventCreate,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Create a new event"""
@@ -31,35 +62,285 @@ async def create_event(
     )
     
     db.add(db_event)
-    db.commit()
-    db.refresh(db_event)
+    await db.flush()
+    await sync_event_images(db, db_event.event_id, [], db_event.images)
+    await db.commit()
+    await db.refresh(db_event)
     
+    response.headers.update(_event_headers(db_event))
     return db_event
 
 
-@router.get("/", response_model=List[EventResponse])
+@router.get("/", response_model=Page[EventResponse])
 async def get_user_events(
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    order: Literal["asc", "desc"] = Query("asc", description="Sort by creation time, or by start date when filtering by date"),
+    date_from: Optional[date] = Query(None, alias="from", description="Only events starting on or after this date"),
+    date_to: Optional[date] = Query(None, alias="to", description="Only events starting on or before this date"),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get all events for the current user"""
-    events = db.query(Event).filter(
-        Event.user_id == current_user.user_id
-    ).all()
-    return events
+    """Get a page of events for the current user, ordered by creation time.
+    
+    With ``from``/``to`` only events starting in that range are returned,
+    ordered by start date. Events without a start date are left out then.
+    """
+    filters = [Event.user_id == current_user.user_id]
+    sort_key = [Event.created_at, Event.event_id]
+    descending = order == "desc"
+    
+    if date_from is not None and date_to is not None and date_from > date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'from' must not be after 'to'"
+        )
+    if date_from is not None or date_to is not None:
+        # Both bounds and the order come from the (user_id, start_date,
+        # event_id) index. Filtering on end_date as well would catch
+        # multi-day events that began earlier, but leaves the lower bound
+        # unindexed and walks every older event
+        sort_key = [Event.start_date, Event.event_id]
+        filters.append(Event.start_date.is_not(None))
+        if date_from is not None:
+            filters.append(Event.start_date >= date_from)
+        if date_to is not None:
+            filters.append(Event.start_date <= date_to)
+    
+    if is_conditional(request):
+        # Revalidate from the timestamps of the page's rows alone
+        probe = select(Event.event_id, Event.updated_at, *sort_key[:1]).where(*filters)
+        rows = (await db.execute(keyset_paginate(probe, sort_key, cursor, limit, descending=descending))).all()
+        etag = collection_etag("events", [(row.event_id, row.updated_at) for row in rows])
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+    
+    query = select(Event).where(*filters)
+    query = keyset_paginate(query, sort_key, cursor, limit, descending=descending)
+    
+    fetched = (await db.scalars(query)).all()
+    events, next_cursor = page_results(fetched, sort_key, limit)
+    # The look-ahead row decides next_cursor, so it is part of the ETag
+    response.headers.update(cache_headers(collection_etag("events", [(event.event_id, event.updated_at) for event in fetched])))
+    return {"items": events, "next_cursor": next_cursor}
+
+
+def _reject_row(report: dict, line: int, error: str) -> None:
+    report["failed"] += 1
+    if len(report["errors"]) < EVENT_BULK_MAX_ERRORS:
+        report["errors"].append({"line": line, "error": error})
+
+
+async def _insert_batch(db: AsyncSession, user_id: int, batch: List[Tuple[int, EventCreate]], report: dict) -> None:
+    """Insert and commit one batch; if the database rejects it, every row in it is reported failed"""
+    try:
+        await insert_events(db, user_id, [event for _, event in batch])
+        await db.commit()
+        report["inserted"] += len(batch)
+    except Exception as e:
+        await db.rollback()
+        print(f"Error inserting bulk event batch: {e}")
+        for line, _ in batch:
+            _reject_row(report, line, "Batch could not be saved")
+    report["batches"] += 1
+
+
+@router.post("/bulk")
+async def bulk_import_events(
+    request: Request,
+    format: Optional[Literal["ndjson", "csv"]] = Query(None, description="Body format, taken from Content-Type when omitted"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Create many events from a streamed NDJSON or CSV body.
+    
+    The body is parsed as it arrives and inserted in batches, each in its
+    own transaction, so a bad row never undoes the others. The report lists
+    the line number and reason for every rejected row, up to a limit.
+    """
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    parse_records = iter_csv_records if format == "csv" else iter_ndjson_records
+    user_id = current_user.user_id
+    
+    report = {"format": format, "inserted": 0, "failed": 0, "batches": 0, "errors": [], "aborted": None}
+    batch: List[Tuple[int, EventCreate]] = []
+    try:
+        async for line, record in parse_records(iter_lines(request.stream())):
+            event = parse_event(record) if isinstance(record, dict) else record
+            if isinstance(event, str):
+                _reject_row(report, line, event)
+                continue
+            batch.append((line, event))
+            if len(batch) >= EVENT_BULK_BATCH_SIZE:
+                await _insert_batch(db, user_id, batch, report)
+                batch = []
+    except BulkImportError as e:
+        if not (batch or report["inserted"] or report["failed"]):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        # Rows read before the body became unreadable are still saved
+        report["aborted"] = str(e)
+    
+    if batch:
+        await _insert_batch(db, user_id, batch, report)
+    
+    return report
+
+
+@router.get("/export")
+async def export_events(
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    current_user: User = Depends(get_current_user)
+):
+    """Download all of the current user's events as NDJSON or CSV.
+    
+    Rows are streamed from the database in batches as they are sent, and
+    the file can be fed back to ``POST /events/bulk``.
+    """
+    user_id = current_user.user_id
+    
+    async def body():
+        if format == "csv":
+            yield encode_csv([], header=True)
+        encode = encode_csv if format == "csv" else encode_ndjson
+        # The request's session may be closed before a streamed body finishes
+        async with open_db_session() as db:
+            async for rows in iter_event_rows(db, user_id):
+                yield encode(rows)
+    
+    return StreamingResponse(
+        body(),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={
+            "Content-Disposition": f'attachment; filename="events.{format}"',
+            "Cache-Control": "no-store"
+        }
+    )
+
+
+@router.get("/search", response_model=EventSearchResults)
+async def search_user_events(
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find in title, description or location"),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0, le=SEARCH_MAX_OFFSET),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Search the current user's events, best matches first.
+    
+    Every word must match; the last one also matches as a prefix. Each hit
+    carries highlighted title and location and a description snippet.
+    """
+    if not event_search_available():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Search is not available"
+        )
+    
+    hits = await search_events(db, current_user.user_id, q, limit + 1, offset)
+    has_more = len(hits) > limit
+    hits = hits[:limit]
+    
+    events = {}
+    if hits:
+        events = {event.event_id: event for event in (await db.scalars(
+            select(Event).where(Event.event_id.in_([event_id for event_id, _, _ in hits]))
+        )).all()}
+    
+    return {
+        "items": [
+            {"event": events[event_id], "score": score, "highlights": highlights}
+            for event_id, score, highlights in hits if event_id in events
+        ],
+        "next_offset": offset + limit if has_more else None
+    }
+
+
+@router.get("/calendar-feed")
+async def get_calendar_feed_url(
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """Get the private URL calendar apps can subscribe to for the current
+    user's events. Anyone with the URL can read the feed; changing the
+    password replaces it."""
+    token = feed_token(current_user)
+    return {"url": str(request.url_for("get_calendar_feed", token=token))}
+
+
+@router.get("/calendar/{token}.ics")
+async def get_calendar_feed(
+    token: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """iCalendar feed of a user's events, authorized by the token in the URL.
+    
+    Calendar apps poll this every few minutes, so unchanged feeds are
+    answered with 304 from an index-only count and max(updated_at), plus
+    the calendar header, which renders the user's name; otherwise the
+    VEVENTs are streamed as they are read.
+    """
+    user_id = feed_user_id(token)
+    user = await db.get(User, user_id) if user_id is not None else None
+    if user is None or not verify_feed_token(token, user):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Calendar feed not found"
+        )
+    
+    # A deletion lowers the count; any insert or update raises max(updated_at)
+    count, last_modified = (await db.execute(
+        select(func.count(), func.max(Event.updated_at)).where(Event.user_id == user_id)
+    )).one()
+    # Users have no updated_at, so a rename is caught by hashing what it renders
+    header = calendar_header(f"{user.name} - Host Buddy")
+    etag = make_etag("calendar", user_id, count, last_modified, hashlib.sha1(header).hexdigest()[:12])
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified)
+    
+    async def body():
+        yield header
+        # The request's session may be closed before a streamed body finishes
+        async with open_db_session() as feed_db:
+            async for rows in iter_event_rows(feed_db, user_id):
+                yield encode_vevents(rows)
+        yield calendar_footer()
+    
+    return StreamingResponse(
+        body(),
+        media_type="text/calendar",
+        headers={**cache_headers(etag, last_modified), "Content-Disposition": 'inline; filename="events.ics"'}
+    )
 
 
 @router.get("/{event_id}", response_model=EventResponse)
 async def get_event(
     event_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get a specific event"""
-    event = db.query(Event).filter(
+    if is_conditional(request):
+        updated_at = await db.scalar(select(Event.updated_at).where(
+            Event.event_id == event_id,
+            Event.user_id == current_user.user_id
+        ))
+        etag = _event_etag(event_id, updated_at)
+        if updated_at is not None and is_not_modified(request, etag, updated_at):
+            return not_modified(etag, updated_at)
+    
+    event = await db.scalar(select(Event).where(
         Event.event_id == event_id,
         Event.user_id == current_user.user_id
-    ).first()
+    ))
     
     if not event:
         raise HTTPException(
@@ -67,6 +348,7 @@ async def get_event(
             detail="Event not found"
         )
     
+    response.headers.update(_event_headers(event))
     return event
 
 
@@ -74,14 +356,16 @@ async def get_event(
 async def update_event(
     event_id: int,
     event_update: EventUpdate,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Update an event"""
-    event = db.query(Event).filter(
+    event = await db.scalar(select(Event).where(
         Event.event_id == event_id,
         Event.user_id == current_user.user_id
-    ).first()
+    ))
     
     if not event:
         raise HTTPException(
@@ -89,28 +373,34 @@ async def update_event(
             detail="Event not found"
         )
     
+    check_if_match(request, _event_etag(event.event_id, event.updated_at))
+    
     # Update event fields
     update_data = event_update.dict(exclude_unset=True)
+    if "images" in update_data:
+        await sync_event_images(db, event.event_id, event.images, update_data["images"])
     for field, value in update_data.items():
         setattr(event, field, value)
     
-    db.commit()
-    db.refresh(event)
+    await db.commit()
+    await db.refresh(event)
     
+    response.headers.update(_event_headers(event))
     return event
 
 
 @router.delete("/{event_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_event(
     event_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Delete an event"""
-    event = db.query(Event).filter(
+    event = await db.scalar(select(Event).where(
         Event.event_id == event_id,
         Event.user_id == current_user.user_id
-    ).first()
+    ))
     
     if not event:
         raise HTTPException(
@@ -118,22 +408,25 @@ async def delete_event(
             detail="Event not found"
         )
     
-    db.delete(event)
-    db.commit()
+    check_if_match(request, _event_etag(event.event_id, event.updated_at))
+    
+    await sync_event_images(db, event.event_id, event.images, [])
+    await db.delete(event)
+    await db.commit()
 
 
 @router.post("/{event_id}/images", response_model=EventResponse)
 async def add_image_to_event(
     event_id: int,
     image_upload: ImageUpload,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Add an image URL to an event"""
-    event = db.query(Event).filter(
+    event = await db.scalar(select(Event).where(
         Event.event_id == event_id,
         Event.user_id == current_user.user_id
-    ).first()
+    ))
     
     if not event:
         raise HTTPException(
@@ -141,14 +434,14 @@ async def add_image_to_event(
             detail="Event not found"
         )
     
-    # Add image URL to the array
-    if event.images is None:
-        event.images = []
-    
-    event.images.append(image_upload.image_url)
+    # Assign a new list: JSON columns don't track in-place mutation
+    images = list(event.images or [])
+    images.append(image_upload.image_url)
+    await sync_event_images(db, event.event_id, event.images, images)
+    event.images = images
     
-    db.commit()
-    db.refresh(event)
+    await db.commit()
+    await db.refresh(event)
     
     return event
 
@@ -157,14 +450,14 @@ async def add_image_to_event(
 async def remove_image_from_event(
     event_id: int,
     image_index: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Remove an image from an event by index"""
-    event = db.query(Event).filter(
+    event = await db.scalar(select(Event).where(
         Event.event_id == event_id,
         Event.user_id == current_user.user_id
-    ).first()
+    ))
     
     if not event:
         raise HTTPException(
@@ -179,9 +472,12 @@ async def remove_image_from_event(
         )
     
     # Remove image at the specified index
-    event.images.pop(image_index)
+    images = list(event.images)
+    images.pop(image_index)
+    await sync_event_images(db, event.event_id, event.images, images)
+    event.images = images
     
-    db.commit()
-    db.refresh(event)
+    await db.commit()
+    await db.refresh(event)
     
     return event
\ No newline at end of file
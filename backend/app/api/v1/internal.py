@@ -0,0 +1,91 @@
+from fastapi import APIRouter, HTTPException, Query, status
+
+from ...core.collab import collab_hub
+from ...core.database import engine, async_engine, get_pool_stats
+from ...core.hashing import hashing_service
+from ...core.images import image_variant_service
+from ...core.layout_analysis import layout_analysis_cache
+from ...core.layout_history import layout_revisions
+from ...core.layout_render import layout_render_service
+from ...core.principal_cache import principal_cache
+from ...core.storage import get_storage_service
+from ...core.storage_gc import storage_gc, GarbageCollectionRunning
+from ...core.thumbnails import migrate_inline_thumbnails
+
+router = APIRouter()
+
+
+@router.get("/auth")
+async def get_auth_stats():
+    """Get principal cache and password hashing pool counters"""
+    return {
+        "principal_cache": principal_cache.stats(),
+        "hashing_pool": hashing_service.stats()
+    }
+
+
+@router.get("/db-pool")
+async def get_db_pool_stats():
+    """Get connection pool occupancy and checkout wait times"""
+    return {
+        "sync": get_pool_stats(engine),
+        "async": get_pool_stats(async_engine.sync_engine) if async_engine is not None else None
+    }
+
+
+
+@router.get("/images")
+async def get_image_pipeline_stats():
+    """Get upload deduplication and image variant pipeline counters"""
+    return {
+        "storage": get_storage_service().stats(),
+        "variants": image_variant_service.stats()
+    }
+
+
+@router.get("/collab")
+async def get_collaboration_stats():
+    """Get live editing room, broadcast and batched write counters"""
+    return collab_hub.stats()
+
+
+@router.get("/layout-analysis")
+async def get_layout_analysis_stats():
+    """Get layout geometry analysis cache counters"""
+    return layout_analysis_cache.stats()
+
+
+@router.get("/layout-history")
+async def get_layout_history_stats():
+    """Get revision snapshot/delta write and reconstruction counters"""
+    return layout_revisions.stats()
+
+
+@router.get("/layout-render")
+async def get_layout_render_stats():
+    """Get layout render cache and worker pool counters"""
+    return layout_render_service.stats()
+
+
+@router.get("/storage-gc")
+async def get_storage_gc_status():
+    """Get progress of a running collection and the last run's report"""
+    return storage_gc.stats()
+
+
+@router.post("/storage-gc")
+async def run_storage_gc(dry_run: bool = Query(True, description="Only report orphans, delete nothing")):
+    """Delete stored objects no longer referenced by the database"""
+    try:
+        return await storage_gc.run(dry_run=dry_run)
+    except GarbageCollectionRunning:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A storage collection is already running"
+        )
+
+
+@router.post("/thumbnails/migrate")
+async def migrate_thumbnails():
+    """Move element thumbnails still stored inline as base64 to object storage"""
+    return await migrate_inline_thumbnails()
\ No newline at end of file
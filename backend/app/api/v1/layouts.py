@@ -1,88 +1,211 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response, WebSocket
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, cast, Text
+import math
+from datetime import datetime, time
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
+from sqlalchemy.orm.exc import StaleDataError
+from starlette.concurrency import run_in_threadpool
+from typing import List, Literal, Optional
 
+from ...core.collab import collab_hub
+from ...core.config import (
+    FAST_JSON_RESPONSES, LAYOUT_ANALYSIS_MAX_CLEARANCE, LAYOUT_ANALYSIS_MIN_CLEARANCE, LAYOUT_RENDER_DEFAULT_WIDTH,
+    LAYOUT_RENDER_MAX_WIDTH
+)
 from ...core.database import get_db
-from ...models.models import Layout
-from ...schemas.layout import LayoutCreate, LayoutUpdate
+from ...core.http_cache import (
+    cache_headers, check_if_match, collection_etag, is_conditional, is_not_modified, make_etag, not_modified
+)
+from ...core.layout_analysis import analyze_layout, layout_analysis_cache
+from ...core.layout_history import layout_revisions
+from ...core.layout_ops import apply_operations, set_layout_elements, LayoutOperationError
+from ...core.layout_render import RENDER_FORMATS, RenderTooLargeError, layout_render_service
+from ...core.pagination import keyset_paginate, page_results, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from ...core.responses import FastJSONResponse, raw_json
+from ...core.spatial import spatial_index_cache
+from ...models.models import Event, Layout, LayoutRevision
+from ...schemas.layout import LayoutCreate, LayoutUpdate, LayoutPatch, LayoutPatchAck, LayoutExport
 
 router = APIRouter()
 
 
+def _layout_summary(layout: Layout) -> dict:
+    """Scalar layout fields and precomputed stats, without the element JSON"""
+    has_bounds = layout.bounds_min_x is not None
+    return {
+        "id": layout.layout_id,
+        "layout_id": layout.layout_id,
+        "event_id": layout.event_id,
+        "name": layout.name,
+        "title": layout.name,
+        "version": layout.version,
+        "element_count": layout.element_count,
+        "bounds": [
+            layout.bounds_min_x,
+            layout.bounds_min_y,
+            layout.bounds_max_x,
+            layout.bounds_max_y
+        ] if has_bounds else None,
+        "created_at": layout.created_at,
+        "updated_at": layout.updated_at
+    }
+
+
+def _layout_detail(layout: Layout) -> dict:
+    """Full layout including the element JSON"""
+    return {
+        **_layout_summary(layout),
+        "layout": layout.layout,
+        "elements": layout.layout.get("elements", []) if layout.layout else []
+    }
+
+
+# Stored layout documents only hold the element list. Selecting it cast to
+# text hands the driver's string to the response without decoding it
+_raw_elements = cast(Layout.layout["elements"], Text)
+
+
+def _layout_raw_detail(layout: Layout, raw_elements: Optional[str]) -> dict:
+    """Full layout with the element JSON embedded verbatim"""
+    if raw_elements in (None, "null"):
+        raw_elements = "[]"
+    elements = raw_json(raw_elements)
+    return {
+        **_layout_summary(layout),
+        "layout": {"elements": elements},
+        "elements": elements
+    }
+
+
+def _respond(content, status_code: int = status.HTTP_200_OK, headers: Optional[dict] = None):
+    """Render through orjson, skipping jsonable_encoder, when fast responses are on"""
+    if FAST_JSON_RESPONSES:
+        return FastJSONResponse(content, status_code=status_code, headers=headers)
+    if headers:
+        return JSONResponse(jsonable_encoder(content), status_code=status_code, headers=headers)
+    return content
+
+
+def _layout_etag(layout_id: int, version: int) -> str:
+    return make_etag("layout", layout_id, version)
+
+
+def _layout_headers(layout: Layout) -> dict:
+    return cache_headers(_layout_etag(layout.layout_id, layout.version), layout.updated_at)
+
+
+def _list_etag(rows, view: str) -> str:
+    """ETag for a page of layouts from its (layout_id, version) pairs,
+    including the look-ahead row that decides next_cursor"""
+    return collection_etag(f"layouts-{view}", rows)
+
+
 @router.get("/")
 async def get_layouts(
+    request: Request,
     event_id: Optional[int] = Query(None),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    view: Literal["full", "summary"] = Query("full", description="summary omits element data"),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get layouts, optionally filtered by event_id"""
-    query = db.query(Layout)
+    """Get a page of layouts, optionally filtered by event_id"""
+    sort_key = [Layout.layout_id]
+    
+    if is_conditional(request):
+        # Revalidate from the version column of the page's rows alone
+        probe = select(Layout.layout_id, Layout.version)
+        if event_id:
+            probe = probe.where(Layout.event_id == event_id)
+        etag = _list_etag((await db.execute(keyset_paginate(probe, sort_key, cursor, limit))).all(), view)
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+    
+    raw = view == "full" and FAST_JSON_RESPONSES
+    query = select(Layout, _raw_elements) if raw else select(Layout)
+    
+    if view == "summary" or raw:
+        # Never decode the JSON document; summaries use the stat columns and
+        # the fast path embeds the raw element text
+        query = query.options(defer(Layout.layout, raiseload=True))
     
     if event_id:
-        query = query.filter(Layout.event_id == event_id)
-    
-    layouts = query.all()
-    
-    result = []
-    for layout in layouts:
-        layout_dict = {
-            "id": layout.layout_id,
-            "layout_id": layout.layout_id,
-            "event_id": layout.event_id,
-            "name": layout.name,
-            "title": layout.name,
-            "layout": layout.layout,
-            "elements": layout.layout.get("elements", []) if layout.layout else [],
-            "created_at": layout.created_at,
-            "updated_at": layout.updated_at
-        }
-        result.append(layout_dict)
+        query = query.where(Layout.event_id == event_id)
     
-    return result
+    query = keyset_paginate(query, sort_key, cursor, limit)
+    
+    if raw:
+        rows = (await db.execute(query)).all()
+        fetched = [row[0] for row in rows]
+        layouts, next_cursor = page_results(fetched, sort_key, limit)
+        items = [_layout_raw_detail(layout, raw_elements) for layout, raw_elements in rows[:len(layouts)]]
+    else:
+        fetched = (await db.scalars(query)).all()
+        layouts, next_cursor = page_results(fetched, sort_key, limit)
+        serialize = _layout_summary if view == "summary" else _layout_detail
+        items = [serialize(layout) for layout in layouts]
+    
+    etag = _list_etag([(layout.layout_id, layout.version) for layout in fetched], view)
+    return _respond({"items": items, "next_cursor": next_cursor}, headers=cache_headers(etag))
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_layout(
     layout: LayoutCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new layout for an event"""
     
     layout_name = layout.title or layout.name or "Untitled Layout"
     
-    layout_data = {
-        "elements": layout.elements or []
-    }
-    
     db_layout = Layout(
         event_id=layout.event_id,
-        name=layout_name,
-        layout=layout_data
+        name=layout_name
     )
+    set_layout_elements(db_layout, layout.elements or [])
     
     db.add(db_layout)
-    db.commit()
-    db.refresh(db_layout)
+    await layout_revisions.record(db, db_layout)
+    await db.commit()
+    await db.refresh(db_layout)
     
-    return {
-        "id": db_layout.layout_id,
-        "layout_id": db_layout.layout_id,
-        "event_id": db_layout.event_id,
-        "name": db_layout.name,
-        "title": db_layout.name,
-        "layout": db_layout.layout,
-        "elements": db_layout.layout.get("elements", []) if db_layout.layout else [],
-        "created_at": db_layout.created_at,
-        "updated_at": db_layout.updated_at
-    }
+    return _respond(_layout_detail(db_layout), status_code=status.HTTP_201_CREATED, headers=_layout_headers(db_layout))
 
 
 @router.get("/{layout_id}")
 async def get_layout(
     layout_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a specific layout by ID"""
-    layout = db.query(Layout).filter(Layout.layout_id == layout_id).first()
+    if is_conditional(request):
+        # Answer revalidation from the version column without reading the JSON
+        row = (await db.execute(
+            select(Layout.version, Layout.updated_at).where(Layout.layout_id == layout_id)
+        )).first()
+        if row is not None:
+            etag = _layout_etag(layout_id, row.version)
+            if is_not_modified(request, etag, row.updated_at):
+                return not_modified(etag, row.updated_at)
+    
+    if FAST_JSON_RESPONSES:
+        row = (await db.execute(
+            select(Layout, _raw_elements)
+            .options(defer(Layout.layout, raiseload=True))
+            .where(Layout.layout_id == layout_id)
+        )).first()
+        if not row:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Layout not found"
+            )
+        return FastJSONResponse(_layout_raw_detail(*row), headers=_layout_headers(row[0]))
+    
+    layout = await db.scalar(select(Layout).where(Layout.layout_id == layout_id))
     
     if not layout:
         raise HTTPException(
@@ -90,27 +213,328 @@ async def get_layout(
             detail="Layout not found"
         )
     
+    return _respond(_layout_detail(layout), headers=_layout_headers(layout))
+
+
+@router.get("/{layout_id}/elements")
+async def get_layout_elements_in_region(
+    layout_id: int,
+    bbox: str = Query(..., description="Viewport as x0,y0,x1,y1"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get the elements of a layout that intersect a bounding box"""
+    try:
+        x0, y0, x1, y1 = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox must be four comma-separated numbers: x0,y0,x1,y1"
+        )
+    
+    if not all(math.isfinite(value) for value in (x0, y0, x1, y1)):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="bbox values must be finite numbers"
+        )
+    
+    if x0 > x1 or y0 > y1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox must satisfy x0 <= x1 and y0 <= y1"
+        )
+    
+    # Check the cheap version column first; the JSON document is only read
+    # when the cached index is missing or stale
+    version = await db.scalar(select(Layout.version).where(Layout.layout_id == layout_id))
+    
+    if version is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Layout not found"
+        )
+    
+    index = spatial_index_cache.get(layout_id, version)
+    if index is None:
+        row = (await db.execute(
+            select(Layout.layout, Layout.version).where(Layout.layout_id == layout_id)
+        )).first()
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Layout not found"
+            )
+        layout_data, version = row
+        elements = layout_data.get("elements", []) if layout_data else []
+        index = spatial_index_cache.build(layout_id, version, elements)
+    
+    elements = index.query((x0, y0, x1, y1))
+    
     return {
-        "id": layout.layout_id,
-        "layout_id": layout.layout_id,
-        "event_id": layout.event_id,
-        "name": layout.name,
-        "title": layout.name,
-        "layout": layout.layout,
-        "elements": layout.layout.get("elements", []) if layout.layout else [],
-        "created_at": layout.created_at,
-        "updated_at": layout.updated_at
+        "layout_id": layout_id,
+        "version": version,
+        "bbox": [x0, y0, x1, y1],
+        "elements": elements,
+        "count": len(elements)
     }
 
 
+@router.get("/{layout_id}/analysis")
+async def analyze_layout_geometry(
+    layout_id: int,
+    request: Request,
+    clearance: int = Query(
+        LAYOUT_ANALYSIS_MIN_CLEARANCE, ge=0, le=LAYOUT_ANALYSIS_MAX_CLEARANCE,
+        description="Minimum gap between elements, in whole canvas units"
+    ),
+    db: AsyncSession = Depends(get_db)
+):
+    """Check a layout for overlapping elements, elements off the canvas and
+    gaps narrower than ``clearance``, and count elements and seats by type"""
+    row = (await db.execute(
+        select(Layout.version, Layout.updated_at).where(Layout.layout_id == layout_id)
+    )).first()
+    
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Layout not found"
+        )
+    
+    version, updated_at = row
+    etag = make_etag("layout-analysis", layout_id, version, clearance)
+    if is_not_modified(request, etag, updated_at):
+        return not_modified(etag, updated_at)
+    
+    result = layout_analysis_cache.get(layout_id, version, clearance)
+    if result is None:
+        row = (await db.execute(
+            select(Layout.layout, Layout.version, Layout.updated_at).where(Layout.layout_id == layout_id)
+        )).first()
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Layout not found"
+            )
+        layout_data, version, updated_at = row
+        elements = layout_data.get("elements", []) if layout_data else []
+        # Tens of milliseconds for a large venue; keep it off the event loop
+        result = {
+            "layout_id": layout_id,
+            "version": version,
+            **await run_in_threadpool(analyze_layout, elements, clearance)
+        }
+        layout_analysis_cache.put(layout_id, version, clearance, result)
+        etag = make_etag("layout-analysis", layout_id, version, clearance)
+    
+    return _respond(result, headers=cache_headers(etag, updated_at))
+
+
+@router.get("/{layout_id}/export")
+async def export_layout(
+    layout_id: int,
+    request: Request,
+    format: Literal["png", "svg", "pdf", "json"] = Query("png"),
+    width: int = Query(LAYOUT_RENDER_DEFAULT_WIDTH, ge=16, le=LAYOUT_RENDER_MAX_WIDTH, description="Output width in pixels"),
+    download: bool = Query(True, description="Send as an attachment rather than inline"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Export a layout as a PNG, SVG or PDF drawing, or as JSON"""
+    row = (await db.execute(
+        select(Layout.version, Layout.updated_at, Layout.name).where(Layout.layout_id == layout_id)
+    )).first()
+    
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Layout not found"
+        )
+    
+    version, updated_at, name = row
+    data = None
+    if format != "json":
+        # Renders of the current version are answered without reading the JSON
+        etag = make_etag("layout", layout_id, version, format, width)
+        if is_not_modified(request, etag, updated_at):
+            return not_modified(etag, updated_at)
+        data = layout_render_service.cached((layout_id, version, format, width))
+    
+    if data is None:
+        row = (await db.execute(
+            select(Layout, Event.title, Event.start_date, Event.start_time, Event.created_at)
+            .join(Event, Event.event_id == Layout.event_id)
+            .where(Layout.layout_id == layout_id)
+        )).first()
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Layout not found"
+            )
+        layout, event_title, start_date, start_time, event_created_at = row
+        # The layout may have been saved since the version check
+        version, updated_at, name = layout.version, layout.updated_at, layout.name
+        elements = layout.layout.get("elements", []) if layout.layout else []
+        
+        if format == "json":
+            export = LayoutExport(
+                layout_id=layout_id,
+                name=name,
+                layout={"elements": elements},
+                event_title=event_title,
+                event_date=datetime.combine(start_date, start_time or time()) if start_date else event_created_at,
+                exported_at=datetime.utcnow()
+            )
+            return _respond(export.model_dump(), headers={"Cache-Control": "no-store"})
+        
+        etag = make_etag("layout", layout_id, version, format, width)
+        try:
+            data = await layout_render_service.render((layout_id, version, format, width), elements)
+        except RenderTooLargeError as e:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=str(e)
+            )
+        except Exception as e:
+            print(f"Error rendering layout {layout_id}: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to render layout"
+            )
+    
+    media_type, extension = RENDER_FORMATS[format]
+    filename = "".join(c if c.isalnum() or c in "-_ " else "_" for c in name).strip() or "layout"
+    headers = cache_headers(etag, updated_at)
+    headers["Content-Disposition"] = f'{"attachment" if download else "inline"}; filename="{filename}.{extension}"'
+    return Response(content=data, media_type=media_type, headers=headers)
+
+
+def _revision_summary(revision: LayoutRevision) -> dict:
+    return {
+        "version": revision.version,
+        "name": revision.name,
+        "kind": revision.kind,
+        "element_count": revision.element_count,
+        "size_bytes": revision.size_bytes,
+        "created_at": revision.created_at
+    }
+
+
+@router.get("/{layout_id}/revisions")
+async def get_layout_revisions(
+    layout_id: int,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get a page of a layout's saved revisions, newest first"""
+    if await db.scalar(select(Layout.layout_id).where(Layout.layout_id == layout_id)) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Layout not found"
+        )
+    
+    sort_key = [LayoutRevision.version]
+    query = (
+        select(LayoutRevision)
+        .options(defer(LayoutRevision.data, raiseload=True))
+        .where(LayoutRevision.layout_id == layout_id)
+    )
+    revisions = (await db.scalars(keyset_paginate(query, sort_key, cursor, limit, descending=True))).all()
+    revisions, next_cursor = page_results(revisions, sort_key, limit)
+    
+    return _respond({
+        "items": [_revision_summary(revision) for revision in revisions],
+        "next_cursor": next_cursor
+    })
+
+
+async def _get_revision(db: AsyncSession, layout_id: int, version: int):
+    result = await layout_revisions.reconstruct(db, layout_id, version)
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Revision not found"
+        )
+    return result
+
+
+@router.get("/{layout_id}/revisions/{version}")
+async def get_layout_revision(
+    layout_id: int,
+    version: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get a layout as it was saved at a given version"""
+    # Revisions never change once written
+    etag = make_etag("layout-revision", layout_id, version)
+    if is_not_modified(request, etag):
+        if await db.scalar(select(LayoutRevision.revision_id).where(
+            LayoutRevision.layout_id == layout_id,
+            LayoutRevision.version == version
+        )) is not None:
+            return not_modified(etag)
+    
+    revision, elements, deltas_applied = await _get_revision(db, layout_id, version)
+    return _respond({
+        **_revision_summary(revision),
+        "layout_id": layout_id,
+        "layout": {"elements": elements},
+        "elements": elements,
+        "deltas_applied": deltas_applied
+    }, headers=cache_headers(etag, revision.created_at))
+
+
+@router.post("/{layout_id}/revisions/{version}/restore")
+async def restore_layout_revision(
+    layout_id: int,
+    version: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """Make an earlier revision the current layout.
+    
+    The restore is saved as a new version, so it can itself be undone.
+    """
+    db_layout = await db.scalar(select(Layout).where(Layout.layout_id == layout_id))
+    
+    if not db_layout:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Layout not found"
+        )
+    
+    check_if_match(request, _layout_etag(layout_id, db_layout.version))
+    
+    revision, elements, _ = await _get_revision(db, layout_id, version)
+    current = db_layout.layout or {}
+    db_layout.name = revision.name
+    set_layout_elements(db_layout, elements, base=current)
+    
+    try:
+        await layout_revisions.record(db, db_layout, current.get("elements", []))
+        await db.commit()
+    except StaleDataError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED if "if-match" in request.headers else status.HTTP_409_CONFLICT,
+            detail="Layout has changed, reload and retry"
+        )
+    await db.refresh(db_layout)
+    spatial_index_cache.invalidate(layout_id)
+    await collab_hub.layout_saved(layout_id)
+    
+    return _respond(_layout_detail(db_layout), headers=_layout_headers(db_layout))
+
+
 @router.put("/{layout_id}")
 async def update_layout(
     layout_id: int,
     layout: LayoutUpdate,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_db)
 ):
     """Update a specific layout by ID"""
-    db_layout = db.query(Layout).filter(Layout.layout_id == layout_id).first()
+    db_layout = await db.scalar(select(Layout).where(Layout.layout_id == layout_id))
     
     if not db_layout:
         raise HTTPException(
@@ -118,28 +542,85 @@ async def update_layout(
             detail="Layout not found"
         )
     
-    layout_name = layout.title or layout.name or db_layout.name
+    check_if_match(request, _layout_etag(layout_id, db_layout.version))
     
-    layout_data = {
-        "elements": layout.elements or []
-    }
+    layout_name = layout.title or layout.name or db_layout.name
+    previous = (db_layout.layout or {}).get("elements") or []
     
     # Update the layout
     db_layout.name = layout_name
-    db_layout.layout = layout_data
+    set_layout_elements(db_layout, layout.elements or [])
     
-    db.commit()
-    db.refresh(db_layout)
+    try:
+        await layout_revisions.record(db, db_layout, previous)
+        await db.commit()
+    except StaleDataError:
+        # Another writer committed between our read (and If-Match check) and the versioned UPDATE
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED if "if-match" in request.headers else status.HTTP_409_CONFLICT,
+            detail="Layout has changed, reload and retry"
+        )
+    await db.refresh(db_layout)
+    spatial_index_cache.invalidate(layout_id)
+    await collab_hub.layout_saved(layout_id)
+    
+    return _respond(_layout_detail(db_layout), headers=_layout_headers(db_layout))
+
+
+@router.patch("/{layout_id}", response_model=LayoutPatchAck)
+async def patch_layout(
+    layout_id: int,
+    patch: LayoutPatch,
+    db: AsyncSession = Depends(get_db)
+):
+    """Apply element-level operations to a layout"""
+    db_layout = await db.scalar(select(Layout).where(Layout.layout_id == layout_id))
+    
+    if not db_layout:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Layout not found"
+        )
+    
+    if patch.version != db_layout.version:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Layout has changed (current version {db_layout.version})"
+        )
+    
+    base_version = db_layout.version
+    current = db_layout.layout or {}
+    try:
+        elements = apply_operations(current.get("elements", []), patch.operations)
+    except LayoutOperationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    set_layout_elements(db_layout, elements, base=current)
+    if patch.title or patch.name:
+        db_layout.name = patch.title or patch.name
+    
+    try:
+        await layout_revisions.record(db, db_layout, current.get("elements", []))
+        await db.commit()
+    except StaleDataError:
+        # Another writer committed between our read and the versioned UPDATE
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Layout has changed, reload and retry"
+        )
+    
+    spatial_index_cache.apply(layout_id, base_version, db_layout.version, patch.operations, elements)
+    await collab_hub.layout_saved(layout_id)
     
     return {
-        "id": db_layout.layout_id,
         "layout_id": db_layout.layout_id,
-        "event_id": db_layout.event_id,
-        "name": db_layout.name,
-        "title": db_layout.name,
-        "layout": db_layout.layout,
-        "elements": db_layout.layout.get("elements", []) if db_layout.layout else [],
-        "created_at": db_layout.created_at,
+        "version": db_layout.version,
+        "applied": len(patch.operations),
         "updated_at": db_layout.updated_at
     }
 
@@ -147,10 +628,11 @@ async def update_layout(
 @router.delete("/{layout_id}")
 async def delete_layout(
     layout_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete a specific layout by ID"""
-    layout = db.query(Layout).filter(Layout.layout_id == layout_id).first()
+    layout = await db.scalar(select(Layout).where(Layout.layout_id == layout_id))
     
     if not layout:
         raise HTTPException(
@@ -158,7 +640,26 @@ async def delete_layout(
             detail="Layout not found"
         )
     
-    db.delete(layout)
-    db.commit()
+    check_if_match(request, _layout_etag(layout_id, layout.version))
+    
+    await db.delete(layout)
+    await db.commit()
+    spatial_index_cache.invalidate(layout_id)
+    layout_render_service.invalidate(layout_id)
+    layout_analysis_cache.invalidate(layout_id)
+    await collab_hub.layout_deleted(layout_id)
     
     return {"message": "Layout deleted successfully"}
+
+
+@router.websocket("/{layout_id}/ws")
+async def collaborate_on_layout(websocket: WebSocket, layout_id: int):
+    """Edit a layout together with everyone else connected to it.
+    
+    The server sends a ``snapshot`` on connect, then ``ops`` from other
+    editors, ``ack``/``error`` for the client's own ``ops`` messages,
+    ``saved`` when changes reach the database and ``presence`` as editors
+    come and go. Clients send ``{"type": "ops", "ref": ..., "operations": [...]}``
+    using the same operations as PATCH.
+    """
+    await collab_hub.serve(layout_id, websocket)
\ No newline at end of file
@@ -1,16 +1,55 @@
+import asyncio
+import re
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
+from fastapi.responses import FileResponse
 from typing import List
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ...core.database import get_db
 from ...core.auth import get_current_user
-from ...core.storage import storage_service
-from ...models.models import User
+from ...core.image_refs import get_ref_count
+from ...core.config import PRESIGNED_UPLOAD_EXPIRES_SECONDS
+from ...core.storage import (
+    get_storage_service,
+    content_key,
+    FileTooLargeError,
+    LocalStorageService,
+    PresignNotSupported,
+    UploadResult,
+    IMMUTABLE_CACHE_CONTROL,
+)
+from ...core.images import image_variant_service, variant_map, variant_urls
+from ...models.models import User, StoredObject
+from ...schemas.upload import PresignedUploadRequest, PresignedUploadComplete
 
 router = APIRouter()
 
 ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+ALLOWED_CONTENT_TYPES = {'image/jpeg', 'image/png', 'image/gif', 'image/webp'}
+# Keys a direct upload may complete: events/<sha256>.<ext>
+DIRECT_UPLOAD_KEY = re.compile(r"^events/([0-9a-f]{64})\.(jpg|jpeg|png|gif|webp)$")
+
+
+def _file_too_large(file: UploadFile) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"File {file.filename} is too large. Maximum size: 10MB"
+    )
+
+
+async def _upload_within_limit(file: UploadFile):
+    """Stream a file to storage, rejecting it once it passes MAX_FILE_SIZE"""
+    # Reject up front when the multipart parser already knows the size
+    if file.size is not None and file.size > MAX_FILE_SIZE:
+        raise _file_too_large(file)
+    
+    try:
+        return await get_storage_service().upload_file(file, folder="events", max_size=MAX_FILE_SIZE)
+    except FileTooLargeError:
+        raise _file_too_large(file)
 
 @router.post("/image")
 async def upload_image(
@@ -33,30 +72,24 @@ async def upload_image(
             detail=f"File type {file_extension} not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
         )
     
-    # Check file size
-    file_content = await file.read()
-    if len(file_content) > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File {file.filename} is too large. Maximum size: 10MB"
-        )
-    
-    # Reset file pointer
-    await file.seek(0)
-    
-    # Upload to S3
-    file_url = await storage_service.upload_file(file, folder="events")
+    # Upload to S3; the size limit is enforced while streaming
+    result = await _upload_within_limit(file)
     
-    if not file_url:
+    if not result:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to upload {file.filename}"
         )
     
+    # Resized copies are generated in the background
+    image_variant_service.submit(result.url)
+    
     return {
         "message": "Successfully uploaded file",
         "filename": file.filename,
-        "url": file_url
+        "url": result.url,
+        "deduplicated": result.deduplicated,
+        "variants": variant_map(result.url)
     }
 
 @router.post("/upload")
@@ -72,10 +105,8 @@ async def upload_images(
             detail="Maximum 5 files allowed per upload"
         )
     
-    uploaded_urls = []
-    
+    # Validate every file before uploading any of them
     for file in files:
-        # Validate file type
         if not file.filename:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -88,45 +119,186 @@ async def upload_images(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"File type {file_extension} not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
             )
+    
+    # Upload concurrently; the storage service caps uploads per process.
+    # The size limit is enforced while streaming
+    results = await asyncio.gather(
+        *(_upload_within_limit(file) for file in files),
+        return_exceptions=True
+    )
+    
+    uploaded = [result for result in results if isinstance(result, UploadResult)]
+    if len(uploaded) < len(files):
+        # All or nothing: remove whatever this request wrote to storage.
+        # Deduplicated files were already there and may be in use elsewhere
+        await get_storage_service().delete_files([result.url for result in uploaded if not result.deduplicated])
         
-        # Check file size
-        file_content = await file.read()
-        if len(file_content) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"File {file.filename} is too large. Maximum size: 10MB"
-            )
-        
-        # Reset file pointer
-        await file.seek(0)
-        
-        # Upload to S3
-        file_url = await storage_service.upload_file(file, folder="events")
+        for file, result in zip(files, results):
+            if isinstance(result, HTTPException):
+                raise result
+            if not isinstance(result, UploadResult):
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail=f"Failed to upload {file.filename}"
+                )
+    
+    for result in uploaded:
+        image_variant_service.submit(result.url)
+    
+    uploaded_urls = [
+        {
+            "filename": file.filename,
+            "url": result.url,
+            "deduplicated": result.deduplicated,
+            "variants": variant_map(result.url)
+        }
+        for file, result in zip(files, uploaded)
+    ]
+    
+    return {
+        "message": f"Successfully uploaded {len(uploaded_urls)} file(s)",
+        "files": uploaded_urls
+    }
+
+def _presign_not_supported() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_501_NOT_IMPLEMENTED,
+        detail="Direct uploads are not supported by this storage backend; use /upload/image"
+    )
+
+@router.post("/presigned")
+async def create_presigned_upload(
+    upload: PresignedUploadRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Issue a URL the client can upload an image to directly.
+    
+    The URL is only valid for the declared content type, size and SHA-256,
+    so storage rejects anything else. Call /presigned/complete afterwards.
+    """
+    
+    file_extension = '.' + upload.filename.split('.')[-1].lower()
+    if file_extension not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File type {file_extension} not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
+        )
+    
+    if upload.content_type not in ALLOWED_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Content type {upload.content_type} not allowed"
+        )
+    
+    if upload.size > MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File {upload.filename} is too large. Maximum size: 10MB"
+        )
+    
+    storage = get_storage_service()
+    key = content_key(upload.filename, "events", upload.sha256.lower())
+    
+    try:
+        # Identical bytes are already stored; nothing to upload
+        if await storage.exists(key):
+            return {"key": key, "url": storage.public_url(key), "deduplicated": True, "upload": None}
         
-        if not file_url:
+        direct_upload = await storage.presign_upload(
+            key, upload.content_type, upload.size, upload.sha256.lower(), PRESIGNED_UPLOAD_EXPIRES_SECONDS
+        )
+    except PresignNotSupported:
+        raise _presign_not_supported()
+    
+    return {
+        "key": key,
+        "url": storage.public_url(key),
+        "deduplicated": False,
+        "upload": direct_upload,
+        "expires_in": PRESIGNED_UPLOAD_EXPIRES_SECONDS
+    }
+
+@router.post("/presigned/complete")
+async def complete_presigned_upload(
+    completion: PresignedUploadComplete,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Verify a direct upload and record the stored object"""
+    
+    match = DIRECT_UPLOAD_KEY.match(completion.key)
+    if not match:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid upload key"
+        )
+    
+    storage = get_storage_service()
+    try:
+        info = await storage.object_info(completion.key)
+        if info is None:
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Failed to upload {file.filename}"
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Upload not found"
             )
         
-        uploaded_urls.append({
-            "filename": file.filename,
-            "url": file_url
-        })
+        # The signed checksum header makes storage verify the bytes. Backends
+        # that don't report a checksum get the object hashed here instead
+        digest = info["sha256"] or await storage.hash_object(completion.key)
+    except PresignNotSupported:
+        raise _presign_not_supported()
+    
+    existing = await db.scalar(select(StoredObject.object_key).where(StoredObject.object_key == completion.key))
+    bad_bytes = digest != match.group(1) or info["size"] > MAX_FILE_SIZE
+    if bad_bytes or info["content_type"] not in ALLOWED_CONTENT_TYPES:
+        # The key is shared by everyone uploading these bytes. Only remove an
+        # object no other upload path could have written and nothing has
+        # recorded; anything else is left to storage garbage collection
+        if bad_bytes and existing is None:
+            await storage.delete_file(storage.public_url(completion.key))
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Uploaded file does not match the requested upload"
+        )
+    
+    # Record the object so cleanup knows it came from a finished upload
+    if existing is None:
+        db.add(StoredObject(object_key=completion.key, ref_count=0))
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Recorded by a concurrent completion of the same bytes
+            await db.rollback()
+    
+    url = storage.public_url(completion.key)
+    image_variant_service.submit(url)
     
     return {
-        "message": f"Successfully uploaded {len(uploaded_urls)} file(s)",
-        "files": uploaded_urls
+        "message": "Successfully uploaded file",
+        "url": url,
+        "variants": variant_map(url)
     }
 
 @router.delete("/delete")
 async def delete_image(
     file_url: str,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Delete an uploaded image"""
     
-    success = storage_service.delete_file(file_url)
+    # Identical uploads share one object, so it may belong to other events too
+    storage = get_storage_service()
+    if storage.owns_url(file_url):
+        ref_count = await get_ref_count(db, storage.key_from_url(file_url))
+        if ref_count > 0:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Image is still referenced {ref_count} time(s)"
+            )
+    
+    # Remove the generated variants along with the original
+    success = await storage.delete_files([file_url] + variant_urls(file_url))
     
     if not success:
         raise HTTPException(
@@ -134,4 +306,18 @@ async def delete_image(
             detail="Failed to delete file"
         )
     
-    return {"message": "File deleted successfully"}
\ No newline at end of file
+    return {"message": "File deleted successfully"}
+
+@router.get("/files/{key:path}")
+async def get_local_file(key: str):
+    """Serve a file stored by the local storage backend"""
+    storage = get_storage_service()
+    if not isinstance(storage, LocalStorageService):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    
+    path = storage.path_for_key(key)
+    # Dot-files are in-progress uploads
+    if path is None or path.name.startswith(".") or not path.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    
+    return FileResponse(path, headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL})
\ No newline at end of file
@@ -1,10 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 import json
 
 from ...core.database import get_db
 from ...core.auth import get_current_user
+from ...core.config import FAST_JSON_RESPONSES
+from ...core.http_cache import (
+    cache_headers, check_if_match, collection_etag, is_conditional, is_not_modified, make_etag, not_modified
+)
+from ...core.responses import FastJSONResponse
+from ...core.image_refs import sync_thumbnail_ref
+from ...core.thumbnails import store_thumbnail, thumbnail_url_column
+from ...core.pagination import keyset_paginate, page_results, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from ...models.models import UserElement, User
 from ...schemas.user_element import (
     UserElementCreate, 
@@ -14,36 +24,76 @@ from ...schemas.user_element import (
     ElementUsageUpdate
 )
 
-router = APIRouter()
+router = APIRouter(default_response_class=FastJSONResponse if FAST_JSON_RESPONSES else JSONResponse)
+
+
+def _element_etag(element_id: int, updated_at) -> str:
+    return make_etag("element", element_id, updated_at)
+
+
+def _element_headers(element: UserElement) -> dict:
+    return cache_headers(_element_etag(element.element_id, element.updated_at), element.updated_at)
 
 
 @router.get("/", response_model=UserElementLibrary)
 async def get_user_elements(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     search: Optional[str] = Query(None, description="Search in name"),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get all custom elements for the current user"""
-    query = db.query(UserElement).filter(UserElement.user_id == current_user.user_id)
+    """Get a page of custom elements for the current user"""
+    sort_key = [UserElement.element_id]
+    filters = [UserElement.user_id == current_user.user_id]
     
     # Search in name
     if search:
         search_filter = f"%{search}%"
-        query = query.filter(UserElement.name.ilike(search_filter))
-    
-    elements = query.all()
+        filters.append(UserElement.name.ilike(search_filter))
+    
+    total_count = await db.scalar(select(func.count()).select_from(UserElement).where(*filters))
+    
+    if is_conditional(request):
+        # Revalidate from the timestamps of the page's rows alone
+        probe = select(UserElement.element_id, UserElement.updated_at).where(*filters)
+        etag = collection_etag("elements", (await db.execute(keyset_paginate(probe, sort_key, cursor, limit))).all(), total_count)
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+    
+    # Thumbnails are returned as URLs; inline base64 payloads are never read here
+    query = select(
+        UserElement.element_id,
+        UserElement.user_id,
+        UserElement.name,
+        UserElement.element_data,
+        thumbnail_url_column,
+        UserElement.updated_at
+    ).where(*filters)
+    
+    query = keyset_paginate(query, sort_key, cursor, limit)
+    fetched = (await db.execute(query)).all()
+    elements, next_cursor = page_results(fetched, sort_key, limit)
+    # The look-ahead row decides next_cursor, so it is part of the ETag
+    response.headers.update(cache_headers(
+        collection_etag("elements", [(row.element_id, row.updated_at) for row in fetched], total_count)
+    ))
     
     return UserElementLibrary(
         elements=elements,
-        total_count=len(elements)
+        total_count=total_count,
+        next_cursor=next_cursor
     )
 
 
 @router.post("/", response_model=UserElementResponse, status_code=status.HTTP_201_CREATED)
 async def create_user_element(
     element: UserElementCreate,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new custom element for the user"""
     
@@ -51,27 +101,41 @@ async def create_user_element(
         user_id=current_user.user_id,
         name=element.name,
         element_data=element.element_data,
-        thumbnail=element.thumbnail
+        thumbnail=await store_thumbnail(element.thumbnail)
     )
     
     db.add(db_element)
-    db.commit()
-    db.refresh(db_element)
+    await sync_thumbnail_ref(db, None, db_element.thumbnail)
+    await db.commit()
+    await db.refresh(db_element)
     
+    response.headers.update(_element_headers(db_element))
     return db_element
 
 
 @router.get("/{element_id}", response_model=UserElementResponse)
 async def get_user_element(
     element_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a specific custom element"""
-    element = db.query(UserElement).filter(
+    if is_conditional(request):
+        row = (await db.execute(select(UserElement.updated_at).where(
+            UserElement.element_id == element_id,
+            UserElement.user_id == current_user.user_id
+        ))).first()
+        if row is not None:
+            etag = _element_etag(element_id, row.updated_at)
+            if is_not_modified(request, etag, row.updated_at):
+                return not_modified(etag, row.updated_at)
+    
+    element = await db.scalar(select(UserElement).where(
         UserElement.element_id == element_id,
         UserElement.user_id == current_user.user_id
-    ).first()
+    ))
     
     if not element:
         raise HTTPException(
@@ -79,6 +143,7 @@ async def get_user_element(
             detail="Custom element not found"
         )
     
+    response.headers.update(_element_headers(element))
     return element
 
 
@@ -86,14 +151,16 @@ async def get_user_element(
 async def update_user_element(
     element_id: int,
     element_update: UserElementUpdate,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update a custom element"""
-    db_element = db.query(UserElement).filter(
+    db_element = await db.scalar(select(UserElement).where(
         UserElement.element_id == element_id,
         UserElement.user_id == current_user.user_id
-    ).first()
+    ))
     
     if not db_element:
         raise HTTPException(
@@ -101,28 +168,35 @@ async def update_user_element(
             detail="Custom element not found"
         )
     
+    check_if_match(request, _element_etag(db_element.element_id, db_element.updated_at))
+    
     # Update fields if provided
     update_data = element_update.dict(exclude_unset=True)
+    if "thumbnail" in update_data:
+        update_data["thumbnail"] = await store_thumbnail(update_data["thumbnail"])
+        await sync_thumbnail_ref(db, db_element.thumbnail, update_data["thumbnail"])
     for field, value in update_data.items():
         setattr(db_element, field, value)
     
-    db.commit()
-    db.refresh(db_element)
+    await db.commit()
+    await db.refresh(db_element)
     
+    response.headers.update(_element_headers(db_element))
     return db_element
 
 
 @router.delete("/{element_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user_element(
     element_id: int,
+    request: Request,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete a custom element"""
-    db_element = db.query(UserElement).filter(
+    db_element = await db.scalar(select(UserElement).where(
         UserElement.element_id == element_id,
         UserElement.user_id == current_user.user_id
-    ).first()
+    ))
     
     if not db_element:
         raise HTTPException(
@@ -130,15 +204,19 @@ async def delete_user_element(
             detail="Custom element not found"
         )
     
-    db.delete(db_element)
-    db.commit()
+    check_if_match(request, _element_etag(db_element.element_id, db_element.updated_at))
+    
+    await sync_thumbnail_ref(db, db_element.thumbnail, None)
+    await db.delete(db_element)
+    await db.commit()
 
 
 @router.post("/from-selection", response_model=UserElementResponse, status_code=status.HTTP_201_CREATED)
 async def create_element_from_selection(
     element: UserElementCreate,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a custom element from selected layout elements (grouped/merged)"""
     # This endpoint is specifically for creating elements from selected layout elements
@@ -159,11 +237,13 @@ async def create_element_from_selection(
         user_id=current_user.user_id,
         name=element.name,
         element_data=element_data,
-        thumbnail=element.thumbnail
+        thumbnail=await store_thumbnail(element.thumbnail)
     )
     
     db.add(db_element)
-    db.commit()
-    db.refresh(db_element)
+    await sync_thumbnail_ref(db, None, db_element.thumbnail)
+    await db.commit()
+    await db.refresh(db_element)
     
+    response.headers.update(_element_headers(db_element))
     return db_element
\ No newline at end of file
@@ -1,13 +1,18 @@
+import hmac
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 
-from ..core.config import JWT_SECRET_KEY, JWT_ALGORITHM, JWT_ACCESS_TOKEN_EXPIRE_MINUTES
+from ..core.config import JWT_SECRET_KEY, JWT_ALGORITHM, JWT_ACCESS_TOKEN_EXPIRE_MINUTES, INTERNAL_API_TOKEN
 from ..core.database import get_db
+from ..core.hashing import hashing_service, HashingPoolBusy, HashingTimeout
+from ..core.principal_cache import principal_cache
 from ..models.models import User
 from ..schemas.user import TokenData
 
@@ -20,6 +25,9 @@ pwd_context = CryptContext(
 
 # JWT token security
 security = HTTPBearer()
+# Internal endpoints answer 404 rather than 403 without a token, like
+# routes that don't exist
+internal_security = HTTPBearer(auto_error=False)
 
 
 def _truncate_password(password: str) -> str:
@@ -57,10 +65,39 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
+async def _run_hashing(func, *args):
+    """Run a hashing function in the worker pool, mapping overload to 503"""
+    try:
+        return await hashing_service.run(func, *args)
+    except (HashingPoolBusy, HashingTimeout):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service is busy, please try again",
+            headers={"Retry-After": "1"},
+        )
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password without blocking the event loop"""
+    return await _run_hashing(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password without blocking the event loop"""
+    return await _run_hashing(get_password_hash, password)
+
+
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> Optional[User]:
     """Authenticate a user with email and password"""
-    user = db.query(User).filter(User.email == email).first()
-    if not user or not verify_password(password, user.password_hash):
+    user = await db.scalar(select(User).where(User.email == email))
+    if not user:
+        return None
+    # Hand the connection back before verifying: the hash can queue behind
+    # other logins, and holding a pooled connection meanwhile starves every
+    # other request. Expunged first so the rollback doesn't expire it
+    db.expunge(user)
+    await db.rollback()
+    if not await verify_password_async(password, user.password_hash):
         return None
     return user
 
@@ -89,7 +126,7 @@ def verify_token(token: str) -> TokenData:
                 detail="Could not validate credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        token_data = TokenData(email=email)
+        token_data = TokenData(email=email, exp=payload.get("exp"))
         return token_data
     except JWTError:
         raise HTTPException(
@@ -99,17 +136,53 @@ def verify_token(token: str) -> TokenData:
         )
 
 
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User:
     """Get current authenticated user"""
-    token_data = verify_token(credentials.credentials)
-    user = db.query(User).filter(User.email == token_data.email).first()
+    token = credentials.credentials
+
+    # Cached principals skip both JWT decoding and the user lookup; the
+    # snapshot is attached to this request's session without emitting SQL
+    cached = principal_cache.get(token)
+    if cached is not None:
+        user = User(**cached)
+        make_transient_to_detached(user)
+        return await db.merge(user, load=False)
+
+    token_data = verify_token(token)
+    user = await db.scalar(select(User).where(User.email == token_data.email))
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return user
\ No newline at end of file
+
+    principal_cache.put(token, user.user_id, _user_snapshot(user), token_exp=token_data.exp)
+    return user
+
+
+def _user_snapshot(user: User) -> dict:
+    """Copy a user's column values for the principal cache"""
+    return {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+
+
+async def require_internal_token(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(internal_security)
+) -> None:
+    """Guard for the operational /internal endpoints.
+
+    They expose server internals and can delete stored objects, so they
+    need the INTERNAL_API_TOKEN shared secret rather than a user login,
+    and are switched off entirely while no token is configured.
+    """
+    if not INTERNAL_API_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if credentials is None or not hmac.compare_digest(credentials.credentials.encode(), INTERNAL_API_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid internal API token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
\ No newline at end of file
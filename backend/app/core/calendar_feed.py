@@ -0,0 +1,130 @@
+import base64
+import hashlib
+import hmac
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from .config import JWT_SECRET_KEY, CALENDAR_FEED_REFRESH_MINUTES, CALENDAR_FEED_UID_DOMAIN
+from ..models.models import User
+
+PRODID = "-//Host Buddy//Events//EN"
+# RFC 5545 lines are at most 75 octets, continued after CRLF + space
+_LINE_OCTETS = 75
+
+
+def _signature(user: User) -> str:
+    # Signing the password hash too means a password change revokes every
+    # feed URL handed out before it
+    mac = hmac.new(
+        JWT_SECRET_KEY.encode(),
+        f"calendar-feed:{user.user_id}:{user.password_hash}".encode(),
+        hashlib.sha256
+    )
+    return base64.urlsafe_b64encode(mac.digest()[:18]).decode()
+
+
+def feed_token(user: User) -> str:
+    """Secret for a user's calendar feed URL.
+
+    Calendar clients can't send an Authorization header, so the URL itself
+    is the credential. It is not a JWT and can't be used as an access token.
+    """
+    return f"{user.user_id}-{_signature(user)}"
+
+
+def feed_user_id(token: str) -> Optional[int]:
+    user_id, _, signature = token.partition("-")
+    return int(user_id) if user_id.isdigit() and signature else None
+
+
+def verify_feed_token(token: str, user: User) -> bool:
+    return hmac.compare_digest(token.encode(), feed_token(user).encode())
+
+
+def _escape(value: str) -> str:
+    value = value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+    return value.replace("\r\n", "\\n").replace("\n", "\\n").replace("\r", "\\n")
+
+
+def _fold(line: str) -> bytes:
+    """Encode a content line, folding it without splitting a UTF-8 sequence"""
+    data = line.encode()
+    parts = []
+    start, limit = 0, _LINE_OCTETS
+    while len(data) - start > limit:
+        end = start + limit
+        while (data[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(data[start:end])
+        # Continuation lines spend one octet on the leading space
+        start, limit = end, _LINE_OCTETS - 1
+    parts.append(data[start:])
+    return b"\r\n ".join(parts) + b"\r\n"
+
+
+def _utc(value: datetime) -> str:
+    # Timestamps are stored naive, in UTC
+    return value.strftime("%Y%m%dT%H%M%SZ")
+
+
+def calendar_header(name: str) -> bytes:
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_escape(name)}",
+        f"REFRESH-INTERVAL;VALUE=DURATION:PT{CALENDAR_FEED_REFRESH_MINUTES}M",
+        f"X-PUBLISHED-TTL:PT{CALENDAR_FEED_REFRESH_MINUTES}M",
+    ]
+    return b"".join(_fold(line) for line in lines)
+
+
+def calendar_footer() -> bytes:
+    return _fold("END:VCALENDAR")
+
+
+def _vevent_lines(row) -> List[str]:
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:event-{row.event_id}@{CALENDAR_FEED_UID_DOMAIN}",
+        f"DTSTAMP:{_utc(row.updated_at or row.created_at)}",
+    ]
+
+    if row.start_time is None:
+        # All-day event; DTEND is exclusive
+        end = (row.end_date or row.start_date) + timedelta(days=1)
+        end = max(end, row.start_date + timedelta(days=1))
+        lines.append(f"DTSTART;VALUE=DATE:{row.start_date:%Y%m%d}")
+        lines.append(f"DTEND;VALUE=DATE:{end:%Y%m%d}")
+    else:
+        # Events carry no time zone, so times are floating: shown at the
+        # same wall-clock time wherever the calendar is
+        start = datetime.combine(row.start_date, row.start_time)
+        lines.append(f"DTSTART:{start:%Y%m%dT%H%M%S}")
+        if row.end_time is not None:
+            end = datetime.combine(row.end_date or row.start_date, row.end_time)
+            if end > start:
+                lines.append(f"DTEND:{end:%Y%m%dT%H%M%S}")
+
+    lines.append(f"SUMMARY:{_escape(row.title)}")
+    if row.description:
+        lines.append(f"DESCRIPTION:{_escape(row.description)}")
+    if row.location:
+        lines.append(f"LOCATION:{_escape(row.location)}")
+    if row.created_at is not None:
+        lines.append(f"CREATED:{_utc(row.created_at)}")
+    if row.updated_at is not None:
+        lines.append(f"LAST-MODIFIED:{_utc(row.updated_at)}")
+    lines.append("END:VEVENT")
+    return lines
+
+
+def encode_vevents(rows: Iterable) -> bytes:
+    """VEVENT blocks for event rows; events without a start date are left out"""
+    return b"".join(
+        _fold(line)
+        for row in rows if row.start_date is not None
+        for line in _vevent_lines(row)
+    )
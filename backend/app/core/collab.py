@@ -0,0 +1,430 @@
+import asyncio
+import itertools
+import time
+from typing import Any, Dict, List, Optional
+
+import orjson
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm.exc import StaleDataError
+
+from .config import (
+    COLLAB_FLUSH_INTERVAL_MS,
+    COLLAB_FLUSH_MAX_OPS,
+    COLLAB_CLIENT_QUEUE_SIZE,
+    COLLAB_MAX_CLIENTS_PER_LAYOUT,
+    COLLAB_MAX_OPS_PER_MESSAGE,
+)
+from .database import open_db_session
+from .layout_history import layout_revisions
+from .layout_ops import apply_operations, set_layout_elements, LayoutOperationError
+from .spatial import spatial_index_cache
+from ..models.models import Layout
+from ..schemas.layout import LayoutOperation
+
+# Close codes sent to clients (4000-4999 are free for applications)
+CLOSE_NOT_FOUND = 4404
+CLOSE_ROOM_FULL = 4429
+CLOSE_TOO_SLOW = 4408
+CLOSE_GOING_AWAY = 1001
+
+_operations = TypeAdapter(List[LayoutOperation])
+
+
+class _Client:
+    """One connected editor, with its own bounded outgoing queue so a slow
+    socket never holds up the broadcast to everyone else"""
+
+    def __init__(self, client_id: int, websocket: WebSocket):
+        self.client_id = client_id
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=COLLAB_CLIENT_QUEUE_SIZE)
+        self.sender: Optional[asyncio.Task] = None
+        self.dropped = False
+
+    async def _send_loop(self) -> None:
+        while True:
+            await self.websocket.send_text(await self.queue.get())
+
+
+class LayoutRoom:
+    """Authoritative in-memory state of a layout being edited together.
+
+    Operations are applied here and broadcast as soon as they arrive; the
+    database row is written in coalesced batches. ``unflushed`` holds the
+    operations applied since the last write so they can be replayed on top
+    of a save made through the REST endpoints.
+    """
+
+    def __init__(self, layout_id: int, version: int, document: Dict[str, Any]):
+        self.layout_id = layout_id
+        self.version = version  # version of the row ``elements`` was last written to
+        self.base = {key: value for key, value in document.items() if key != "elements"}
+        self.elements: List[Dict[str, Any]] = list(document.get("elements") or [])
+        self.seq = 0  # number of operation batches applied in this room
+        self.clients: Dict[int, _Client] = {}
+        self.unflushed: List[LayoutOperation] = []
+        self.flush_lock = asyncio.Lock()
+        self.flush_task: Optional[asyncio.Task] = None
+        self.flush_now = asyncio.Event()  # set when enough operations are waiting
+        self.closed = False
+
+
+class CollaborationHub:
+    """Rooms of editors connected to the same layout over WebSockets.
+
+    Rooms live in this process only: editors of one layout must reach the
+    same worker (sticky routing) to see each other's changes live. Writes
+    from other processes still merge, since each flush rebases pending
+    operations onto whatever version is stored.
+    """
+
+    def __init__(self, flush_interval_ms: int, flush_max_ops: int, max_clients: int, max_ops_per_message: int):
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_max_ops = flush_max_ops
+        self.max_clients = max_clients
+        self.max_ops_per_message = max_ops_per_message
+        self._rooms: Dict[int, LayoutRoom] = {}
+        self._opening: Dict[int, asyncio.Lock] = {}
+        self._client_ids = itertools.count(1)
+
+        self.connections = 0
+        self.rejected = 0
+        self.dropped_clients = 0
+        self.batches_applied = 0
+        self.ops_applied = 0
+        self.ops_rejected = 0
+        self.messages_sent = 0
+        self.flushes = 0
+        self.flushed_ops = 0
+        self.flush_seconds = 0.0
+        self.flush_errors = 0
+        self.rebases = 0
+        self.rebase_dropped_ops = 0
+
+    # -- Messaging -----------------------------------------------------------
+
+    def _send(self, client: _Client, message: str) -> None:
+        try:
+            client.queue.put_nowait(message)
+            self.messages_sent += 1
+        except asyncio.QueueFull:
+            self._drop(client, CLOSE_TOO_SLOW)
+
+    def _broadcast(self, room: LayoutRoom, payload: dict, exclude: Optional[_Client] = None) -> None:
+        # Serialized once, however many editors are connected
+        message = orjson.dumps(payload).decode()
+        for client in list(room.clients.values()):
+            if client is not exclude:
+                self._send(client, message)
+
+    def _drop(self, client: _Client, code: int) -> None:
+        """Disconnect a client whose queue is full rather than buffer without bound"""
+        if client.dropped:
+            return
+        client.dropped = True
+        self.dropped_clients += 1
+        if client.sender is not None:
+            client.sender.cancel()
+        asyncio.create_task(self._close(client.websocket, code))
+
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int) -> None:
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    def _snapshot(self, room: LayoutRoom, client: Optional[_Client] = None) -> dict:
+        snapshot = {
+            "type": "snapshot",
+            "layout_id": room.layout_id,
+            "version": room.version,
+            "seq": room.seq,
+            "elements": room.elements,
+            "clients": len(room.clients),
+        }
+        if client is not None:
+            snapshot["client_id"] = client.client_id
+        return snapshot
+
+    # -- Rooms ---------------------------------------------------------------
+
+    async def _load(self, layout_id: int):
+        async with open_db_session() as db:
+            return (await db.execute(
+                select(Layout.version, Layout.layout).where(Layout.layout_id == layout_id)
+            )).first()
+
+    async def _open_room(self, layout_id: int) -> Optional[LayoutRoom]:
+        room = self._rooms.get(layout_id)
+        if room is not None:
+            return room
+        # Editors joining at once share one load of the layout
+        lock = self._opening.setdefault(layout_id, asyncio.Lock())
+        async with lock:
+            room = self._rooms.get(layout_id)
+            if room is None:
+                row = await self._load(layout_id)
+                if row is not None:
+                    room = LayoutRoom(layout_id, row.version, row.layout or {})
+                    self._rooms[layout_id] = room
+        self._opening.pop(layout_id, None)
+        return room
+
+    async def _close_room(self, room: LayoutRoom) -> None:
+        """Save and forget a room. It stays registered while saving, so an
+        editor joining meanwhile gets the current state, not the stored one.
+        If the save fails the room is kept and saving is retried every flush
+        interval; it is forgotten once a retry succeeds"""
+        await self._flush(room)
+        if room.clients or room.closed:
+            return
+        if room.unflushed:
+            self._schedule_flush(room)
+            return
+        room.closed = True
+        if self._rooms.get(room.layout_id) is room:
+            del self._rooms[room.layout_id]
+        if room.flush_task is not None:
+            room.flush_task.cancel()
+            room.flush_task = None
+
+    async def serve(self, layout_id: int, websocket: WebSocket) -> None:
+        """Run one editor's connection until it disconnects"""
+        await websocket.accept()
+        room = await self._open_room(layout_id)
+        if room is None:
+            self.rejected += 1
+            await websocket.close(code=CLOSE_NOT_FOUND)
+            return
+        if len(room.clients) >= self.max_clients:
+            self.rejected += 1
+            await websocket.close(code=CLOSE_ROOM_FULL)
+            return
+
+        client = _Client(next(self._client_ids), websocket)
+        client.sender = asyncio.create_task(client._send_loop())
+        room.clients[client.client_id] = client
+        self.connections += 1
+        self._send(client, orjson.dumps(self._snapshot(room, client)).decode())
+        self._broadcast(room, {"type": "presence", "clients": len(room.clients)}, exclude=client)
+
+        try:
+            while not client.dropped:
+                self._receive(room, client, await websocket.receive_text())
+        except WebSocketDisconnect:
+            pass
+        except RuntimeError:
+            # Socket closed underneath us after the client was dropped
+            pass
+        finally:
+            room.clients.pop(client.client_id, None)
+            client.sender.cancel()
+            if room.clients:
+                self._broadcast(room, {"type": "presence", "clients": len(room.clients)})
+            elif not room.closed:
+                await self._close_room(room)
+
+    def _receive(self, room: LayoutRoom, client: _Client, text: str) -> None:
+        try:
+            message = orjson.loads(text)
+            kind = message.get("type")
+        except (orjson.JSONDecodeError, AttributeError):
+            self._send(client, orjson.dumps({"type": "error", "detail": "Messages must be JSON objects"}).decode())
+            return
+
+        if kind == "ping":
+            self._send(client, orjson.dumps({"type": "pong", "seq": room.seq, "version": room.version}).decode())
+        elif kind == "ops":
+            self._apply(room, client, message)
+        elif kind == "sync":
+            self._send(client, orjson.dumps(self._snapshot(room)).decode())
+        else:
+            self._send(client, orjson.dumps({"type": "error", "detail": f"Unknown message type {kind!r}"}).decode())
+
+    def _apply(self, room: LayoutRoom, client: _Client, message: dict) -> None:
+        ref = message.get("ref")
+        raw = message.get("operations")
+        try:
+            if not isinstance(raw, list) or not raw or len(raw) > self.max_ops_per_message:
+                raise LayoutOperationError(f"'operations' must be a list of 1 to {self.max_ops_per_message} operations")
+            operations = _operations.validate_python(raw)
+            # All or nothing, like PATCH /layouts/{id}
+            room.elements = apply_operations(room.elements, operations)
+        except (ValidationError, LayoutOperationError) as e:
+            self.ops_rejected += len(raw) if isinstance(raw, list) else 1
+            detail = str(e) if isinstance(e, LayoutOperationError) else "Invalid operations"
+            self._send(client, orjson.dumps({"type": "error", "ref": ref, "detail": detail, "seq": room.seq}).decode())
+            return
+
+        room.seq += 1
+        self.batches_applied += 1
+        self.ops_applied += len(operations)
+        self._send(client, orjson.dumps({"type": "ack", "ref": ref, "seq": room.seq}).decode())
+        self._broadcast(room, {
+            "type": "ops",
+            "seq": room.seq,
+            "client_id": client.client_id,
+            "operations": [operation.model_dump(exclude_none=True) for operation in operations],
+        }, exclude=client)
+
+        room.unflushed.extend(operations)
+        self._schedule_flush(room)
+
+    # -- Persistence ---------------------------------------------------------
+
+    def _schedule_flush(self, room: LayoutRoom) -> None:
+        """Write at most every flush interval, or sooner once flush_max_ops pile up"""
+        if len(room.unflushed) >= self.flush_max_ops:
+            room.flush_now.set()
+        if room.flush_task is None or room.flush_task.done():
+            room.flush_task = asyncio.create_task(self._flush_later(room))
+
+    async def _flush_later(self, room: LayoutRoom) -> None:
+        try:
+            await asyncio.wait_for(room.flush_now.wait(), self.flush_interval)
+        except asyncio.TimeoutError:
+            pass
+        room.flush_now.clear()
+        await self._flush(room)
+        if room.closed:
+            return
+        if room.unflushed:
+            room.flush_task = asyncio.create_task(self._flush_later(room))
+        elif not room.clients:
+            # Retried the save of a room its last editor has left
+            room.flush_task = None
+            await self._close_room(room)
+
+    def _rebase(self, room: LayoutRoom, version: int, document: Dict[str, Any]) -> None:
+        """Replay the unflushed operations on a newer stored document.
+
+        Operations that no longer apply (say, an update to an element that
+        was deleted in the meantime) are dropped, and every editor is sent
+        the merged state.
+        """
+        elements = list(document.get("elements") or [])
+        kept = []
+        for operation in room.unflushed:
+            try:
+                elements = apply_operations(elements, [operation])
+                kept.append(operation)
+            except LayoutOperationError:
+                self.rebase_dropped_ops += 1
+        room.elements = elements
+        room.unflushed = kept
+        room.base = {key: value for key, value in document.items() if key != "elements"}
+        room.version = version
+        self.rebases += 1
+        self._broadcast(room, self._snapshot(room))
+
+    async def _flush(self, room: LayoutRoom) -> None:
+        """Write the room's elements to the layout row if anything changed"""
+        async with room.flush_lock:
+            if not room.unflushed:
+                return
+            started = time.perf_counter()
+            elements = room.elements
+            flushed = len(room.unflushed)
+            try:
+                async with open_db_session() as db:
+                    layout = await db.scalar(select(Layout).where(Layout.layout_id == room.layout_id))
+                    if layout is None:
+                        await self._layout_gone(room)
+                        return
+                    if layout.version != room.version:
+                        # Saved elsewhere since we last wrote: merge, then write the result
+                        self._rebase(room, layout.version, layout.layout or {})
+                        elements = room.elements
+                        flushed = len(room.unflushed)
+                    previous = (layout.layout or {}).get("elements") or []
+                    set_layout_elements(layout, elements, base=room.base)
+                    await layout_revisions.record(db, layout, previous)
+                    await db.commit()
+                    version = layout.version
+            except StaleDataError:
+                # Lost a race with a REST write; the next flush rebases onto it
+                return
+            except Exception as e:
+                self.flush_errors += 1
+                print(f"Error saving layout {room.layout_id} from collaboration room: {e}")
+                return
+
+            room.version = version
+            # Operations applied while the write was in flight stay queued
+            room.unflushed = room.unflushed[flushed:]
+            spatial_index_cache.invalidate(room.layout_id)
+            self.flushes += 1
+            self.flushed_ops += flushed
+            self.flush_seconds += time.perf_counter() - started
+            self._broadcast(room, {"type": "saved", "version": version, "seq": room.seq})
+
+    async def _layout_gone(self, room: LayoutRoom) -> None:
+        room.closed = True
+        room.unflushed = []
+        self._rooms.pop(room.layout_id, None)
+        self._broadcast(room, {"type": "error", "detail": "Layout was deleted"})
+        for client in list(room.clients.values()):
+            asyncio.create_task(self._close(client.websocket, CLOSE_NOT_FOUND))
+
+    async def layout_saved(self, layout_id: int) -> None:
+        """Merge a save made through the REST endpoints into an open room"""
+        room = self._rooms.get(layout_id)
+        if room is None:
+            return
+        async with room.flush_lock:
+            row = await self._load(layout_id)
+            if row is None:
+                await self._layout_gone(room)
+            elif row.version != room.version:
+                self._rebase(room, row.version, row.layout or {})
+        if room.unflushed and not room.closed:
+            self._schedule_flush(room)
+
+    async def layout_deleted(self, layout_id: int) -> None:
+        room = self._rooms.get(layout_id)
+        if room is not None:
+            await self._layout_gone(room)
+
+    async def shutdown(self) -> None:
+        """Save every open room and disconnect its editors"""
+        for room in list(self._rooms.values()):
+            await self._flush(room)
+            room.closed = True
+            if room.flush_task is not None:
+                room.flush_task.cancel()
+            for client in list(room.clients.values()):
+                await self._close(client.websocket, CLOSE_GOING_AWAY)
+        self._rooms.clear()
+
+    def stats(self) -> dict:
+        return {
+            "rooms": len(self._rooms),
+            "clients": sum(len(room.clients) for room in self._rooms.values()),
+            "connections": self.connections,
+            "rejected": self.rejected,
+            "dropped_clients": self.dropped_clients,
+            "batches_applied": self.batches_applied,
+            "ops_applied": self.ops_applied,
+            "ops_rejected": self.ops_rejected,
+            "messages_sent": self.messages_sent,
+            "pending_ops": sum(len(room.unflushed) for room in self._rooms.values()),
+            "flushes": self.flushes,
+            "flushed_ops": self.flushed_ops,
+            "avg_ops_per_flush": self.flushed_ops / self.flushes if self.flushes else 0.0,
+            "avg_flush_ms": self.flush_seconds / self.flushes * 1000 if self.flushes else 0.0,
+            "flush_errors": self.flush_errors,
+            "rebases": self.rebases,
+            "rebase_dropped_ops": self.rebase_dropped_ops,
+        }
+
+
+# Global instance
+collab_hub = CollaborationHub(
+    flush_interval_ms=COLLAB_FLUSH_INTERVAL_MS,
+    flush_max_ops=COLLAB_FLUSH_MAX_OPS,
+    max_clients=COLLAB_MAX_CLIENTS_PER_LAYOUT,
+    max_ops_per_message=COLLAB_MAX_OPS_PER_MESSAGE,
+)
\ No newline at end of file
@@ -1,23 +1,232 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from .config import DATABASE_URL
+import threading
+import time
+from contextlib import asynccontextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
+from .config import (
+    DATABASE_URL,
+    DATABASE_ASYNC,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING,
+    SQLITE_JOURNAL_MODE,
+    SQLITE_SYNCHRONOUS,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE,
+    SQLITE_MMAP_SIZE,
+)
 
-# Create engine with SQLite-specific settings if using SQLite
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={"check_same_thread": False}  # Needed for SQLite
+
+class _TimedCheckoutMixin:
+    """Records how long callers wait to check a connection out of the pool"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wait_lock = threading.Lock()
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_timeouts = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self._wait_lock:
+                self.wait_timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._wait_lock:
+                self.wait_count += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _is_sqlite_memory(url: str) -> bool:
+    database = make_url(url).database
+    return not database or database == ":memory:"
+
+
+def _engine_options(url: str, is_async: bool) -> dict:
+    """Build pool and connect options for an engine"""
+    options = {}
+    if url.startswith("sqlite"):
+        if not is_async:
+            options["connect_args"] = {"check_same_thread": False}  # Needed for SQLite
+        if _is_sqlite_memory(url):
+            # In-memory databases live in a single connection; keep SQLAlchemy's default pool
+            return options
+    options.update(
+        poolclass=TimedAsyncAdaptedQueuePool if is_async else TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
     )
-else:
-    engine = create_engine(DATABASE_URL)
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply WAL and cache pragmas to each new SQLite connection"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.close()
+
+
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL, is_async=False))
+if DATABASE_URL.startswith("sqlite"):
+    event.listen(engine, "connect", _set_sqlite_pragmas)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
-def get_db():
+def get_async_database_url(url: str) -> str:
+    """Map a sync database URL onto its async driver"""
+    scheme, _, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg://{rest}"
+    return url
+
+
+# The sync engine above is always created: table creation and migrations use
+# it, and it serves requests when DATABASE_ASYNC is off
+if DATABASE_ASYNC:
+    _async_url = get_async_database_url(DATABASE_URL)
+    async_engine = create_async_engine(_async_url, **_engine_options(_async_url, is_async=True))
+    if DATABASE_URL.startswith("sqlite"):
+        event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+else:
+    async_engine = None
+    AsyncSessionLocal = None
+
+
+def get_pool_stats(engine) -> dict:
+    """Snapshot connection counts and checkout wait times for an engine's pool"""
+    pool = engine.pool
+    stats = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+        )
+    if isinstance(pool, _TimedCheckoutMixin):
+        with pool._wait_lock:
+            stats.update(
+                checkouts=pool.wait_count,
+                wait_avg_ms=(pool.wait_total / pool.wait_count * 1000) if pool.wait_count else 0.0,
+                wait_max_ms=pool.wait_max * 1000,
+                wait_timeouts=pool.wait_timeouts,
+            )
+    return stats
+
+
+class ThreadedSession:
+    """Awaitable facade over a sync Session.
+
+    Exposes the subset of the AsyncSession API used by the routers, running
+    each blocking call in the threadpool so the sync engine never stalls the
+    event loop. Results are pre-buffered so rows can be consumed afterwards
+    without touching the connection again.
+    """
+
+    _prebuffer = {"prebuffer_rows": True}
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    def add(self, instance) -> None:
+        self.sync_session.add(instance)
+
+    def add_all(self, instances) -> None:
+        self.sync_session.add_all(instances)
+
+    def expunge(self, instance) -> None:
+        self.sync_session.expunge(instance)
+
+    async def execute(self, statement, params=None, **kw):
+        kw["execution_options"] = {**kw.get("execution_options", {}), **self._prebuffer}
+        return await run_in_threadpool(self.sync_session.execute, statement, params, **kw)
+
+    async def scalar(self, statement, params=None, **kw):
+        return await run_in_threadpool(self.sync_session.scalar, statement, params, **kw)
+
+    async def scalars(self, statement, params=None, **kw):
+        result = await self.execute(statement, params, **kw)
+        return result.scalars()
+
+    async def get(self, entity, ident, **kw):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kw)
+
+    async def merge(self, instance, **kw):
+        return await run_in_threadpool(self.sync_session.merge, instance, **kw)
+
+    async def delete(self, instance) -> None:
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self) -> None:
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def refresh(self, instance, attribute_names=None) -> None:
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def run_sync(self, fn, *args, **kw):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kw)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.sync_session.close)
+
+
+async def get_db():
     """Dependency to get database session"""
-    db = SessionLocal()
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+
+    # Match the async session's expire_on_commit=False so attributes stay
+    # readable after commit without a lazy refresh on the event loop
+    db = ThreadedSession(SessionLocal(expire_on_commit=False))
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        await db.close()
+
+
+
+# Same session as get_db, for work outside a request such as background jobs
+open_db_session = asynccontextmanager(get_db)
\ No newline at end of file
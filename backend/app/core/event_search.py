@@ -0,0 +1,210 @@
+import html
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import DATABASE_URL, EVENT_SEARCH_LANGUAGE
+
+# Highlight markers are private-use characters, so the text around them can
+# be HTML-escaped before they become <mark> tags
+_MARK_START = "\ue000"
+_MARK_END = "\ue001"
+_ELLIPSIS = "…"
+_SNIPPET_WORDS = 16
+
+# Relative weight of a match in each column when ranking
+_TITLE_WEIGHT = 10.0
+_LOCATION_WEIGHT = 5.0
+_DESCRIPTION_WEIGHT = 3.0
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+_installed = False
+
+# External-content FTS5 index over events. user_id is indexed too, so a
+# search is a posting-list intersection with the owner's events instead of
+# a filter over every match
+_SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE events_fts USING fts5(
+        title, description, location, user_id,
+        content='events', content_rowid='event_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events BEGIN
+        INSERT INTO events_fts(rowid, title, description, location, user_id)
+        VALUES (new.event_id, new.title, new.description, new.location, new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events BEGIN
+        INSERT INTO events_fts(events_fts, rowid, title, description, location, user_id)
+        VALUES ('delete', old.event_id, old.title, old.description, old.location, old.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS events_fts_update AFTER UPDATE OF title, description, location, user_id ON events BEGIN
+        INSERT INTO events_fts(events_fts, rowid, title, description, location, user_id)
+        VALUES ('delete', old.event_id, old.title, old.description, old.location, old.user_id);
+        INSERT INTO events_fts(rowid, title, description, location, user_id)
+        VALUES (new.event_id, new.title, new.description, new.location, new.user_id);
+    END
+    """,
+]
+
+
+def _postgres_vector(config: str) -> str:
+    return (
+        f"setweight(to_tsvector('{config}'::regconfig, coalesce(title, '')), 'A') || "
+        f"setweight(to_tsvector('{config}'::regconfig, coalesce(location, '')), 'B') || "
+        f"setweight(to_tsvector('{config}'::regconfig, coalesce(description, '')), 'C')"
+    )
+
+
+# A generated column is recomputed by Postgres on every write, so it can't
+# drift from the row
+_POSTGRES_DDL = [
+    f"ALTER TABLE events ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS ({_postgres_vector(EVENT_SEARCH_LANGUAGE)}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_events_search_vector ON events USING GIN (search_vector)",
+]
+
+
+def install_event_search(engine: Engine) -> None:
+    """Create the full-text index over events and the hooks that keep it
+    in sync. Safe to run on every start; an index created over existing
+    rows is filled once.
+
+    Search stays disabled, rather than the app failing to start, when the
+    database can't provide an index (say, SQLite built without FTS5).
+    """
+    global _installed
+    try:
+        with engine.begin() as conn:
+            if IS_SQLITE:
+                exists = conn.scalar(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'events_fts'"))
+                for statement in _SQLITE_DDL[1 if exists else 0:]:
+                    conn.execute(text(statement))
+                if not exists:
+                    conn.execute(text("INSERT INTO events_fts(events_fts) VALUES ('rebuild')"))
+            elif engine.dialect.name == "postgresql":
+                for statement in _POSTGRES_DDL:
+                    conn.execute(text(statement))
+            else:
+                return
+        _installed = True
+    except Exception as e:
+        print(f"Error installing event search index: {e}")
+
+
+def event_search_available() -> bool:
+    return _installed
+
+
+def query_terms(query: str) -> List[str]:
+    """Words of a search string. Operators and punctuation are dropped, so
+    user input can never be a malformed index query."""
+    return _TERM.findall(query.lower())
+
+
+def _fts5_query(terms: List[str], user_id: int) -> str:
+    # Every term must match, and the last one may be a prefix so results
+    # show up while the user is still typing
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return f'user_id : "{user_id}" AND {{title description location}} : ({" ".join(quoted)})'
+
+
+def _tsquery(terms: List[str]) -> str:
+    return " & ".join(terms[:-1] + [terms[-1] + ":*"])
+
+
+_SQLITE_SEARCH = text(f"""
+    SELECT rowid AS event_id,
+           bm25(events_fts, {_TITLE_WEIGHT}, {_DESCRIPTION_WEIGHT}, {_LOCATION_WEIGHT}, 0.0) AS score,
+           highlight(events_fts, 0, :start, :end) AS title,
+           snippet(events_fts, 1, :start, :end, :ellipsis, {_SNIPPET_WORDS}) AS description,
+           highlight(events_fts, 2, :start, :end) AS location
+    FROM events_fts
+    WHERE events_fts MATCH :query
+    ORDER BY score
+    LIMIT :limit OFFSET :offset
+""")
+
+# Headlines re-parse the text, so they are only built for the page of rows
+# the ranked inner query returns
+_POSTGRES_SEARCH = text(f"""
+    SELECT hit.event_id,
+           hit.score,
+           ts_headline(CAST(:config AS regconfig), coalesce(hit.title, ''), hit.query, :whole_options) AS title,
+           ts_headline(CAST(:config AS regconfig), coalesce(hit.description, ''), hit.query, :snippet_options) AS description,
+           ts_headline(CAST(:config AS regconfig), coalesce(hit.location, ''), hit.query, :whole_options) AS location
+    FROM (
+        SELECT e.event_id, e.title, e.description, e.location, q.query,
+               ts_rank_cd('{{0.1, {_DESCRIPTION_WEIGHT / 10}, {_LOCATION_WEIGHT / 10}, {_TITLE_WEIGHT / 10}}}', e.search_vector, q.query) AS score
+        FROM events e, to_tsquery(CAST(:config AS regconfig), :query) AS q(query)
+        WHERE e.user_id = :user_id AND e.search_vector @@ q.query
+        ORDER BY score DESC, e.event_id
+        LIMIT :limit OFFSET :offset
+    ) AS hit
+    ORDER BY hit.score DESC, hit.event_id
+""")
+
+
+def _marked(value: Optional[str]) -> Optional[str]:
+    if not value:
+        return value
+    return html.escape(value).replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+
+async def search_events(db: AsyncSession, user_id: int, query: str, limit: int, offset: int) -> List[Tuple[int, float, Dict[str, Any]]]:
+    """Rank a user's events against a search string.
+
+    Returns (event_id, score, highlights) for one page of results, best
+    first. Highlights are HTML-escaped with matches wrapped in <mark>;
+    the description is cut down to a snippet around the matches. Higher
+    scores are better on both databases.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+
+    if IS_SQLITE:
+        rows = (await db.execute(_SQLITE_SEARCH, {
+            "query": _fts5_query(terms, user_id),
+            "start": _MARK_START,
+            "end": _MARK_END,
+            "ellipsis": _ELLIPSIS,
+            "limit": limit,
+            "offset": offset,
+        })).all()
+        # bm25 is lower-is-better
+        scored = [(row.event_id, -row.score, row) for row in rows]
+    else:
+        options = f"StartSel={_MARK_START}, StopSel={_MARK_END}"
+        rows = (await db.execute(_POSTGRES_SEARCH, {
+            "config": EVENT_SEARCH_LANGUAGE,
+            "query": _tsquery(terms),
+            "user_id": user_id,
+            "whole_options": f"{options}, HighlightAll=true",
+            "snippet_options": f"{options}, MaxWords={_SNIPPET_WORDS}, MinWords={_SNIPPET_WORDS // 2}, FragmentDelimiter={_ELLIPSIS}, MaxFragments=2",
+            "limit": limit,
+            "offset": offset,
+        })).all()
+        scored = [(row.event_id, row.score, row) for row in rows]
+
+    return [
+        (event_id, score, {
+            "title": _marked(row.title),
+            "description": _marked(row.description),
+            "location": _marked(row.location),
+        })
+        for event_id, score, row in scored
+    ]
@@ -0,0 +1,215 @@
+import codecs
+import csv
+import io
+from datetime import date, datetime, time
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import orjson
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import EVENT_BULK_MAX_LINE_BYTES, EVENT_EXPORT_BATCH_SIZE
+from .image_refs import sync_event_images
+from ..models.models import Event
+from ..schemas.event import EventCreate
+
+# Columns a bulk import reads, in CSV header order
+IMPORT_COLUMNS = ["title", "description", "location", "start_date", "end_date", "start_time", "end_time", "images"]
+# Exports add the server-set columns, so an export can be imported again
+EXPORT_COLUMNS = ["event_id", *IMPORT_COLUMNS, "created_at", "updated_at"]
+
+# (line number, parsed record or error message)
+Record = Tuple[int, Union[Dict[str, Any], str]]
+
+
+class BulkImportError(ValueError):
+    """Raised when the body can't be read any further, as opposed to a bad row"""
+
+
+def _byte_length(text: str) -> int:
+    # A UTF-8 character is at most 4 bytes, so short strings skip encoding
+    return len(text) if len(text) * 4 <= EVENT_BULK_MAX_LINE_BYTES else len(text.encode())
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a streamed UTF-8 body into lines without buffering all of it"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    try:
+        async for chunk in chunks:
+            pending += decoder.decode(chunk)
+            lines = pending.split("\n")
+            pending = lines.pop()
+            for line in (*lines, pending):
+                if _byte_length(line) > EVENT_BULK_MAX_LINE_BYTES:
+                    raise BulkImportError(f"Line longer than {EVENT_BULK_MAX_LINE_BYTES} bytes")
+            for line in lines:
+                yield line.rstrip("\r")
+        pending += decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise BulkImportError("Body is not valid UTF-8")
+    if pending.strip():
+        yield pending.rstrip("\r")
+
+
+async def iter_ndjson_records(lines: AsyncIterator[str]) -> AsyncIterator[Record]:
+    """One JSON object per line; blank lines are skipped"""
+    number = 0
+    async for line in lines:
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            record = orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            yield number, f"Invalid JSON: {e}"
+            continue
+        yield number, record if isinstance(record, dict) else "Expected a JSON object"
+
+
+async def iter_csv_records(lines: AsyncIterator[str]) -> AsyncIterator[Record]:
+    """Rows of a CSV file with a header line.
+
+    Quoted fields may span lines: a record is complete once its quotes
+    balance, and is rejected once it grows past EVENT_BULK_MAX_LINE_BYTES.
+    Empty cells read as null and ``images`` holds space-separated URLs.
+    Unknown columns are ignored.
+    """
+    header: Optional[List[str]] = None
+    buffer: List[str] = []
+    start = number = quotes = size = 0
+    async for line in lines:
+        number += 1
+        if not buffer:
+            if not line.strip():
+                continue
+            start, quotes, size = number, 0, 0
+        buffer.append(line)
+        # Running totals, so a long quoted record isn't re-scanned per line
+        quotes += line.count('"')
+        size += _byte_length(line) + 1
+        if size > EVENT_BULK_MAX_LINE_BYTES:
+            buffer = []
+            yield start, f"Record longer than {EVENT_BULK_MAX_LINE_BYTES} bytes (unbalanced quote?)"
+            continue
+        if quotes % 2:
+            continue
+        text = "\n".join(buffer)
+        buffer = []
+
+        try:
+            values = next(csv.reader([text]))
+        except csv.Error as e:
+            yield start, f"Invalid CSV: {e}"
+            continue
+
+        if header is None:
+            header = [name.strip().lower() for name in values]
+            if "title" not in header:
+                raise BulkImportError("CSV header must include a 'title' column")
+            continue
+        if len(values) != len(header):
+            yield start, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+
+        record = {name: value if value != "" else None for name, value in zip(header, values)}
+        if record.get("images") is not None:
+            record["images"] = record["images"].split()
+        yield start, record
+
+    if buffer:
+        yield start, "Unterminated quoted field"
+
+
+def parse_event(record: Dict[str, Any]) -> Union[EventCreate, str]:
+    """Validate a record as an event, or describe why it isn't one"""
+    try:
+        return EventCreate.model_validate(record)
+    except ValidationError as e:
+        return "; ".join(
+            f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}" for error in e.errors()
+        )
+
+
+async def insert_events(db: AsyncSession, user_id: int, events: Sequence[EventCreate]) -> None:
+    """Insert a batch of events as one executemany statement.
+
+    Image references are only synced for rows that have images, which
+    needs the new ids back; plain rows skip RETURNING. The caller commits.
+    """
+    rows = [{**event.model_dump(include=set(IMPORT_COLUMNS)), "user_id": user_id} for event in events]
+    for row in rows:
+        row["images"] = row["images"] or []
+
+    if not any(row["images"] for row in rows):
+        await db.execute(insert(Event), rows)
+        return
+
+    result = await db.execute(insert(Event).returning(Event.event_id, sort_by_parameter_order=True), rows)
+    for event_id, row in zip(result.scalars().all(), rows):
+        if row["images"]:
+            await sync_event_images(db, event_id, [], row["images"])
+
+
+def _export_query(user_id: int):
+    return (
+        select(*(getattr(Event, name) for name in EXPORT_COLUMNS))
+        .where(Event.user_id == user_id)
+        .order_by(Event.event_id)
+    )
+
+
+async def iter_event_rows(db: AsyncSession, user_id: int) -> AsyncIterator[Sequence]:
+    """A user's events in batches, oldest id first.
+
+    An async session reads them through a server-side cursor, so the
+    export is one consistent query; the threaded sync session can't hold a
+    cursor across calls and pages by id instead.
+    """
+    if hasattr(db, "stream"):
+        result = await db.stream(_export_query(user_id).execution_options(yield_per=EVENT_EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield rows
+        return
+
+    last_id = 0
+    while True:
+        rows = (await db.execute(
+            _export_query(user_id).where(Event.event_id > last_id).limit(EVENT_EXPORT_BATCH_SIZE)
+        )).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].event_id
+
+
+def _export_record(row) -> Dict[str, Any]:
+    record = dict(row._mapping)
+    # Old rows may hold the column default, a JSON string, instead of a list
+    if not isinstance(record["images"], list):
+        record["images"] = []
+    return record
+
+
+def encode_ndjson(rows: Iterable) -> bytes:
+    return b"".join(orjson.dumps(_export_record(row)) + b"\n" for row in rows)
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, list):
+        return " ".join(value)
+    return value
+
+
+def encode_csv(rows: Iterable, header: bool = False) -> bytes:
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        record = _export_record(row)
+        writer.writerow([_csv_value(record[name]) for name in EXPORT_COLUMNS])
+    return out.getvalue().encode()
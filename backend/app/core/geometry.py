@@ -0,0 +1,47 @@
+import math
+from typing import Any, Dict, Sequence, Tuple
+
+# Shapes the designer positions by their centre; everything else is anchored
+# at its top-left corner (mirrors the frontend's bounds calculation)
+CENTERED_TYPES = {"round", "ellipse", "triangle", "pentagon", "hexagon", "octagon", "star", "arc"}
+
+DEFAULT_SIZE = 50
+
+
+def _number(value: Any, default: float) -> float:
+    # Elements are stored as sent, so fields may hold strings, objects or inf
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    return number if math.isfinite(number) else default
+
+
+def element_bounds(element: Dict[str, Any]) -> Tuple[float, float, float, float]:
+    """Return an element's axis-aligned bounds as (min_x, min_y, max_x, max_y)"""
+    x = _number(element.get("x"), 0.0)
+    y = _number(element.get("y"), 0.0)
+    width = _number(element.get("width"), 0.0) or DEFAULT_SIZE
+    height = _number(element.get("height"), 0.0) or width
+
+    if element.get("type") in CENTERED_TYPES:
+        return (x - width / 2, y - height / 2, x + width / 2, y + height / 2)
+    return (x, y, x + width, y + height)
+
+
+def compute_layout_stats(elements: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """Element count and overall bounding box, matching the Layout stat columns"""
+    stats = {
+        "element_count": len(elements),
+        "bounds_min_x": None,
+        "bounds_min_y": None,
+        "bounds_max_x": None,
+        "bounds_max_y": None,
+    }
+    if elements:
+        all_bounds = [element_bounds(element) for element in elements]
+        stats["bounds_min_x"] = min(b[0] for b in all_bounds)
+        stats["bounds_min_y"] = min(b[1] for b in all_bounds)
+        stats["bounds_max_x"] = max(b[2] for b in all_bounds)
+        stats["bounds_max_y"] = max(b[3] for b in all_bounds)
+    return stats
@@ -0,0 +1,112 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from .config import (
+    PASSWORD_HASH_EXECUTOR,
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_MAX_QUEUE,
+    PASSWORD_HASH_TIMEOUT_SECONDS,
+)
+
+
+class HashingPoolBusy(Exception):
+    """Raised when the hashing pool has no free worker or queue slot"""
+
+
+class HashingTimeout(Exception):
+    """Raised when a hashing call does not finish within the configured timeout"""
+
+
+def _run_unless_expired(deadline: float, func: Callable[..., Any], *args: Any) -> Any:
+    """Skip work that waited in the queue past its caller's timeout.
+
+    The caller has already answered 503 by then, so hashing would only take
+    the worker away from logins that can still succeed.
+    """
+    if time.monotonic() > deadline:
+        raise HashingTimeout()
+    return func(*args)
+
+
+class PasswordHashingService:
+    """Runs password hashing/verification in a bounded worker pool.
+
+    Argon2 is deliberately slow, so running it inline in an ``async def``
+    handler freezes the event loop. Calls are handed to a thread or process
+    pool instead; at most ``workers + max_queue`` calls may be in flight and
+    anything beyond that is rejected immediately with ``HashingPoolBusy``.
+    """
+
+    def __init__(self, executor_type: str, workers: int, max_queue: int, timeout: float):
+        self.executor_type = executor_type
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor: Optional[Executor] = None
+        self._in_flight = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_type == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="password-hash"
+                )
+        return self._executor
+
+    def _release(self, future) -> None:
+        self._in_flight -= 1
+        # Retrieve the outcome of calls nobody waits for any more, so asyncio
+        # doesn't log it as never retrieved
+        if not future.cancelled():
+            future.exception()
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run ``func(*args)`` in the pool, honouring the queue limit and timeout"""
+        if self._in_flight >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HashingPoolBusy()
+
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + self.timeout
+        future = loop.run_in_executor(self._get_executor(), _run_unless_expired, deadline, func, *args)
+        # The slot is released when the work actually finishes, not when the
+        # caller stops waiting, so timed-out calls still count against the limit
+        self._in_flight += 1
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise HashingTimeout()
+
+    def stats(self) -> dict:
+        return {
+            "executor": self.executor_type,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Global instance
+hashing_service = PasswordHashingService(
+    executor_type=PASSWORD_HASH_EXECUTOR,
+    workers=PASSWORD_HASH_WORKERS,
+    max_queue=PASSWORD_HASH_MAX_QUEUE,
+    timeout=PASSWORD_HASH_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,109 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Iterable, Optional, Sequence
+
+from fastapi import HTTPException, Request, Response, status
+
+# Responses are per user, so shared caches must not store them, and
+# browsers must revalidate before reusing one
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    """Weak ETag built from values that change whenever the resource does.
+
+    ``make_etag("layout", 12, 5)`` -> ``W/"layout-12-5"``
+    """
+    return 'W/"' + "-".join(_etag_part(part) for part in parts) + '"'
+
+
+def collection_etag(kind: str, rows: Iterable[Sequence], *extra) -> str:
+    """Weak ETag for a page of a listing, from the (id, version) pairs of
+    its rows. Anything else that shapes the body, such as a total count,
+    goes in ``extra``."""
+    digest = hashlib.sha1()
+    for row in rows:
+        digest.update("|".join(_etag_part(value) for value in row).encode())
+        digest.update(b";")
+    return make_etag(kind, *extra, digest.hexdigest()[:20])
+
+
+def _etag_part(value) -> str:
+    if isinstance(value, datetime):
+        return f"{_as_utc(value).timestamp():.6f}"
+    return "" if value is None else str(value)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Timestamps are stored naive, in UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(_as_utc(value).replace(microsecond=0), usegmt=True)
+
+
+def cache_headers(etag: str, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison of an ETag against an If-Match/If-None-Match list"""
+    if header.strip() == "*":
+        return True
+    return _opaque(etag) in (_opaque(tag) for tag in header.split(","))
+
+
+def is_conditional(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """Whether a GET can be answered with 304. If-None-Match wins over
+    If-Modified-Since when both are sent."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have one second resolution
+    return _as_utc(last_modified).replace(microsecond=0) <= since
+
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(etag, last_modified))
+
+
+def check_if_match(request: Request, etag: Optional[str]) -> None:
+    """Reject a write whose If-Match doesn't name the current representation.
+
+    The ETags handed out are weak, so they are compared weakly here too;
+    requests without If-Match are not checked.
+    """
+    if_match = request.headers.get("if-match")
+    if if_match is None:
+        return
+    if etag is None or not etag_matches(if_match, etag):
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Resource has changed, reload and retry"
+        )
\ No newline at end of file
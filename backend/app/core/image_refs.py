@@ -0,0 +1,77 @@
+from typing import Iterable, List, Optional, Set
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .storage import get_storage_service
+from ..models.models import EventImage, StoredObject
+
+
+def image_keys(urls: Optional[Iterable[str]]) -> List[str]:
+    """Storage keys for the images we host, in order and without duplicates"""
+    storage = get_storage_service()
+    keys = []
+    for url in urls or []:
+        if storage.owns_url(url):
+            key = storage.key_from_url(url)
+            if key not in keys:
+                keys.append(key)
+    return keys
+
+
+async def adjust_ref_counts(db: AsyncSession, added: Set[str], removed: Set[str]) -> None:
+    """Count one more reference to each ``added`` key and one fewer to each
+    ``removed`` key, creating stored_objects rows as needed.
+
+    Counts are changed with ``ref_count + 1`` expressions, so concurrent
+    writers can't lose an update. Runs in the caller's transaction.
+    """
+    if added:
+        known = set((await db.scalars(
+            select(StoredObject.object_key).where(StoredObject.object_key.in_(added))
+        )).all())
+        db.add_all([StoredObject(object_key=key, ref_count=0) for key in added - known])
+        await db.flush()
+        await db.execute(
+            update(StoredObject)
+            .where(StoredObject.object_key.in_(added))
+            .values(ref_count=StoredObject.ref_count + 1)
+        )
+    if removed:
+        await db.execute(
+            update(StoredObject)
+            .where(StoredObject.object_key.in_(removed))
+            .values(ref_count=StoredObject.ref_count - 1)
+        )
+
+
+async def sync_event_images(db: AsyncSession, event_id: int, old_urls: Optional[Iterable[str]], new_urls: Optional[Iterable[str]]) -> None:
+    """Update image references after an event's image list changes.
+
+    Adds/removes event_images rows and adjusts each object's ref_count in
+    the caller's transaction.
+    """
+    old_keys = set(image_keys(old_urls))
+    new_keys = set(image_keys(new_urls))
+    added = new_keys - old_keys
+    removed = old_keys - new_keys
+
+    await adjust_ref_counts(db, added, removed)
+    if added:
+        db.add_all([EventImage(event_id=event_id, object_key=key) for key in added])
+    if removed:
+        await db.execute(
+            delete(EventImage).where(EventImage.event_id == event_id, EventImage.object_key.in_(removed))
+        )
+
+
+async def sync_thumbnail_ref(db: AsyncSession, old_url: Optional[str], new_url: Optional[str]) -> None:
+    """Update the reference a custom element holds on its stored thumbnail,
+    in the caller's transaction"""
+    old_keys = set(image_keys([old_url] if old_url else []))
+    new_keys = set(image_keys([new_url] if new_url else []))
+    await adjust_ref_counts(db, new_keys - old_keys, old_keys - new_keys)
+
+
+async def get_ref_count(db: AsyncSession, key: str) -> int:
+    return await db.scalar(select(StoredObject.ref_count).where(StoredObject.object_key == key)) or 0
\ No newline at end of file
@@ -0,0 +1,249 @@
+import asyncio
+import io
+import re
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .config import (
+    IMAGE_VARIANTS_ENABLED,
+    IMAGE_VARIANT_WIDTHS,
+    IMAGE_VARIANT_FORMATS,
+    IMAGE_VARIANT_QUALITY,
+    IMAGE_VARIANT_WORKERS,
+    IMAGE_MAX_PIXELS,
+)
+from .storage import IMMUTABLE_CACHE_CONTROL, get_storage_service
+
+# format name -> (Pillow encoder, content type, file extension)
+VARIANT_FORMATS = {
+    "webp": ("WEBP", "image/webp", "webp"),
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+}
+
+_ENABLED_FORMATS = [fmt for fmt in IMAGE_VARIANT_FORMATS if fmt in VARIANT_FORMATS]
+_VARIANT_NAME = re.compile(r"_w\d+\.(webp|jpg)$")
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when an image has more pixels than IMAGE_MAX_PIXELS allows"""
+
+
+def variant_key(key: str, width: int, fmt: str) -> str:
+    """Deterministic name of a variant, stored next to the original.
+
+    ``events/abc.png`` -> ``events/abc_w480.webp``
+    """
+    stem = key.rsplit(".", 1)[0] if "." in key.rsplit("/", 1)[-1] else key
+    return f"{stem}_w{width}.{VARIANT_FORMATS[fmt][2]}"
+
+
+def variant_map(url: str) -> Dict[str, Dict[str, str]]:
+    """Map of width -> format -> URL for an uploaded image.
+
+    Variants are written in the background after upload, so a URL may 404
+    for a moment; clients should fall back to the original. Images not held
+    by our storage (or that are variants themselves) have no variants.
+    """
+    if not IMAGE_VARIANTS_ENABLED:
+        return {}
+    storage = get_storage_service()
+    if not storage.owns_url(url) or _VARIANT_NAME.search(url):
+        return {}
+    key = storage.key_from_url(url)
+    return {
+        str(width): {fmt: storage.public_url(variant_key(key, width, fmt)) for fmt in _ENABLED_FORMATS}
+        for width in IMAGE_VARIANT_WIDTHS
+    }
+
+
+def variant_urls(url: str) -> List[str]:
+    """Flat list of every variant URL for an image"""
+    return [variant for formats in variant_map(url).values() for variant in formats.values()]
+
+
+def render_variants(
+    data: bytes,
+    widths: Sequence[int],
+    formats: Sequence[str],
+    quality: int,
+    max_pixels: int,
+) -> Tuple[List[Tuple[int, str, bytes]], float]:
+    """Decode an image and encode it at each width and format.
+
+    Runs in a worker process. Images are never upscaled: a width larger than
+    the original is stored at the original size so every variant in the map
+    exists. Returns the encoded variants and the CPU time spent.
+    """
+    from PIL import Image, ImageOps
+
+    started = time.process_time()
+    # Pillow refuses to decode past twice this limit; we check it exactly below
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+
+    try:
+        image = Image.open(io.BytesIO(data))
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e))
+    # Only the header has been read at this point
+    if image.width * image.height > max_pixels:
+        raise ImageTooLargeError(f"Image has {image.width * image.height} pixels, limit is {max_pixels}")
+
+    # Let the JPEG decoder scale down by a power of two while decoding. The
+    # box is square so EXIF rotation can't leave the result below ``largest``
+    largest = max(widths)
+    if min(image.width, image.height) > largest:
+        image.draft("RGB", (largest, largest))
+
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha else "RGB")
+
+    results = []
+    # Resize from the previous (larger) step rather than the original each time
+    current = image
+    for width in sorted(set(widths), reverse=True):
+        if current.width > width:
+            current = current.resize((width, max(1, round(current.height * width / current.width))), Image.LANCZOS)
+        for fmt in formats:
+            encoder = VARIANT_FORMATS[fmt][0]
+            frame = current
+            if encoder == "JPEG" and frame.mode == "RGBA":
+                # JPEG has no alpha channel; flatten onto white
+                flattened = Image.new("RGB", frame.size, (255, 255, 255))
+                flattened.paste(frame, mask=frame.split()[3])
+                frame = flattened
+            buffer = io.BytesIO()
+            frame.save(buffer, encoder, quality=quality, optimize=encoder == "JPEG")
+            results.append((width, fmt, buffer.getvalue()))
+
+    return results, time.process_time() - started
+
+
+class ImageVariantService:
+    """Generates resized copies of uploaded images in a process pool.
+
+    Jobs are queued after the upload response is built, so uploads never
+    wait on decoding. At most ``workers`` jobs are decoding at once; the rest
+    wait their turn without holding image data in memory.
+    """
+
+    def __init__(self, workers: int, widths: Sequence[int], formats: Sequence[str], quality: int, max_pixels: int):
+        self.workers = workers
+        self.widths = list(widths)
+        self.formats = [fmt for fmt in formats if fmt in VARIANT_FORMATS]
+        self.quality = quality
+        self.max_pixels = max_pixels
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks = set()
+
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.skipped = 0
+        self.variants_written = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+        self.wall_seconds = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def submit(self, url: str) -> None:
+        """Queue variant generation for an uploaded image"""
+        if not IMAGE_VARIANTS_ENABLED or not variant_map(url):
+            return
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        task = asyncio.create_task(self._process(url))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self.queued += 1
+
+    async def _process(self, url: str) -> None:
+        storage = get_storage_service()
+        key = storage.key_from_url(url)
+        async with self._slots:
+            started = time.perf_counter()
+            try:
+                # Identical uploads share a key, so their variants may already exist
+                names = [variant_key(key, width, fmt) for width in self.widths for fmt in self.formats]
+                if all(await asyncio.gather(*(storage.exists(name) for name in names))):
+                    self.skipped += 1
+                    return
+                data = await storage.read_object(key)
+                loop = asyncio.get_running_loop()
+                variants, cpu_seconds = await loop.run_in_executor(
+                    self._get_executor(),
+                    render_variants,
+                    data, self.widths, self.formats, self.quality, self.max_pixels
+                )
+                await asyncio.gather(*(
+                    storage.put_object(
+                        variant_key(key, width, fmt),
+                        body,
+                        VARIANT_FORMATS[fmt][1],
+                        cache_control=IMMUTABLE_CACHE_CONTROL
+                    )
+                    for width, fmt, body in variants
+                ))
+            except ImageTooLargeError as e:
+                self.rejected += 1
+                print(f"Skipping image variants for {url}: {e}")
+                return
+            except Exception as e:
+                self.failed += 1
+                print(f"Error generating image variants for {url}: {e}")
+                return
+
+            self.completed += 1
+            self.variants_written += len(variants)
+            self.bytes_in += len(data)
+            self.bytes_out += sum(len(body) for _, _, body in variants)
+            self.cpu_seconds += cpu_seconds
+            self.wall_seconds += time.perf_counter() - started
+
+    def stats(self) -> dict:
+        return {
+            "enabled": IMAGE_VARIANTS_ENABLED,
+            "workers": self.workers,
+            "widths": self.widths,
+            "formats": self.formats,
+            "queued": self.queued,
+            "pending": len(self._tasks),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "skipped": self.skipped,
+            "variants_written": self.variants_written,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "avg_job_ms": self.wall_seconds / self.completed * 1000 if self.completed else 0.0,
+            "avg_cpu_ms": self.cpu_seconds / self.completed * 1000 if self.completed else 0.0,
+            # Per worker process; multiply by workers for the pool's ceiling
+            "images_per_cpu_second": self.completed / self.cpu_seconds if self.cpu_seconds else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Global instance
+image_variant_service = ImageVariantService(
+    workers=IMAGE_VARIANT_WORKERS,
+    widths=IMAGE_VARIANT_WIDTHS,
+    formats=IMAGE_VARIANT_FORMATS,
+    quality=IMAGE_VARIANT_QUALITY,
+    max_pixels=IMAGE_MAX_PIXELS,
+)
@@ -0,0 +1,379 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import (
+    LAYOUT_ANALYSIS_CACHE_SIZE, LAYOUT_ANALYSIS_IGNORED_TYPES, LAYOUT_ANALYSIS_MAX_REPORTED,
+    LAYOUT_ANALYSIS_SEAT_MAX_SIZE, LAYOUT_ANALYSIS_SEAT_TYPES, LAYOUT_RENDER_CANVAS_HEIGHT,
+    LAYOUT_RENDER_CANVAS_WIDTH
+)
+from .geometry import CENTERED_TYPES, DEFAULT_SIZE
+from .layout_render import GROUP_TYPES
+
+# Candidate pairs materialized at once, to bound memory on crowded layouts
+PAIR_CHUNK = 1_000_000
+# Elements spanning more grid cells than this (a floor plan's outer wall,
+# say) are checked against every other element instead of being hashed
+MAX_CELLS_PER_ELEMENT = 64
+ELLIPSE_TYPES = ("round", "ellipse")
+# Clearances whose results are kept per layout version
+CLEARANCES_PER_LAYOUT = 4
+# Types that never count as seats, however small
+NON_SHAPE_TYPES = ("text", "image", "line")
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _column(values: List[Any], default) -> np.ndarray:
+    """Numbers from element fields, with missing, non-numeric and
+    non-finite values replaced by ``default`` as the renderer does"""
+    try:
+        column = np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        # Some value isn't a number; convert one by one
+        column = np.fromiter((_number(value) for value in values), dtype=np.float64, count=len(values))
+    return np.where(np.isfinite(column), column, default)
+
+
+def _flatten(elements: Sequence[Any]) -> Tuple[List[Dict[str, Any]], List[int], List[int], List[int]]:
+    """Every element and group child, parents first, with the index of its
+    parent (-1 at the top level), its nesting depth and the index of the
+    top-level element it belongs to"""
+    nodes: List[Dict[str, Any]] = []
+    parents: List[int] = []
+    depths: List[int] = []
+    owners: List[int] = []
+    pending = [(element, -1, 0, owner) for owner, element in reversed(list(enumerate(elements)))]
+    while pending:
+        element, parent, depth, owner = pending.pop()
+        if not isinstance(element, dict):
+            continue
+        index = len(nodes)
+        nodes.append(element)
+        parents.append(parent)
+        depths.append(depth)
+        owners.append(owner)
+        if element.get("type") in GROUP_TYPES:
+            children = element.get("children") or []
+            if isinstance(children, list):
+                pending.extend((child, index, depth + 1, owner) for child in reversed(children))
+    return nodes, parents, depths, owners
+
+
+class ElementArrays:
+    """Bounds and attributes of a layout's shapes as parallel arrays.
+
+    Groups and merged elements are flattened into their children, placed
+    as ``layout_render.build_scene`` draws them: moved to x/y within the
+    parent, then rotated about that point. Bounds are the axis-aligned
+    box around each placed shape, and ``owner`` maps every shape back to
+    the top-level element it belongs to.
+
+    The designer has no seat type, so a seat is any shape no larger than
+    LAYOUT_ANALYSIS_SEAT_MAX_SIZE across, plus elements of the legacy
+    LAYOUT_ANALYSIS_SEAT_TYPES.
+    """
+
+    def __init__(self, elements: Sequence[Dict[str, Any]]):
+        self.elements = list(elements)
+        self.top_count = sum(1 for element in self.elements if isinstance(element, dict))
+        nodes, parents, depths, owners = _flatten(self.elements)
+
+        # Placement matrices (a, b, c, d, e, f) of every node, composed
+        # with the parent's one nesting level at a time
+        x = _column([node.get("x") for node in nodes], 0.0)
+        y = _column([node.get("y") for node in nodes], 0.0)
+        angle = np.radians(_column([node.get("rotation") for node in nodes], 0.0))
+        cos, sin = np.cos(angle), np.sin(angle)
+        matrix = np.stack([cos, sin, -sin, cos, x, y], axis=1)
+        parent = np.array(parents, dtype=np.int64)
+        depth = np.array(depths, dtype=np.int64)
+        for level in range(1, int(depth.max()) + 1 if len(depth) else 0):
+            at = np.flatnonzero(depth == level)
+            pa, pb, pc, pd, pe, pf = matrix[parent[at]].T
+            a, b, c, d, e, f = matrix[at].T
+            matrix[at] = np.stack([
+                pa * a + pc * b, pb * a + pd * b,
+                pa * c + pc * d, pb * c + pd * d,
+                pa * e + pc * f + pe, pb * e + pd * f + pf,
+            ], axis=1)
+
+        leaf = np.fromiter((node.get("type") not in GROUP_TYPES for node in nodes), dtype=bool, count=len(nodes))
+        leaves = np.flatnonzero(leaf)
+        shapes = [nodes[k] for k in leaves]
+        count = len(shapes)
+        self.types = [str(shape.get("type") or "unknown") for shape in shapes]
+        self.owner = np.array(owners, dtype=np.int64)[leaves]
+
+        width = np.maximum(_column([shape.get("width") for shape in shapes], DEFAULT_SIZE), 0.0)
+        height = np.maximum(_column([shape.get("height") for shape in shapes], width), 0.0)
+        # Circles are drawn from their width alone
+        is_round = np.fromiter((t == "round" for t in self.types), dtype=bool, count=count)
+        height = np.where(is_round, width, height)
+        a, b, c, d, e, f = matrix[leaves].T
+
+        centered = np.fromiter((t in CENTERED_TYPES for t in self.types), dtype=bool, count=count)
+        left = np.where(centered, -width / 2, 0.0)
+        top = np.where(centered, -height / 2, 0.0)
+        corners_x = [a * cx + c * cy + e for cx in (left, left + width) for cy in (top, top + height)]
+        corners_y = [b * cx + d * cy + f for cx in (left, left + width) for cy in (top, top + height)]
+        self.x0, self.x1 = np.minimum.reduce(corners_x), np.maximum.reduce(corners_x)
+        self.y0, self.y1 = np.minimum.reduce(corners_y), np.maximum.reduce(corners_y)
+        # Ellipses get their exact extent rather than their rotated box's
+        ellipse = np.fromiter((t in ELLIPSE_TYPES for t in self.types), dtype=bool, count=count)
+        half_x = np.hypot(a * width, c * height) / 2
+        half_y = np.hypot(b * width, d * height) / 2
+        self.x0 = np.where(ellipse, e - half_x, self.x0)
+        self.x1 = np.where(ellipse, e + half_x, self.x1)
+        self.y0 = np.where(ellipse, f - half_y, self.y0)
+        self.y1 = np.where(ellipse, f + half_y, self.y1)
+        self.area = width * height
+
+        type_names, self.type_codes = np.unique(np.array(self.types, dtype=object), return_inverse=True)
+        self.type_names = [str(name) for name in type_names]
+        self.ignored = np.isin(type_names, list(LAYOUT_ANALYSIS_IGNORED_TYPES))[self.type_codes]
+        shape = ~np.isin(type_names, list(NON_SHAPE_TYPES))[self.type_codes]
+        small = (width <= LAYOUT_ANALYSIS_SEAT_MAX_SIZE) & (height <= LAYOUT_ANALYSIS_SEAT_MAX_SIZE)
+        seat_type = np.isin(type_names, list(LAYOUT_ANALYSIS_SEAT_TYPES))[self.type_codes]
+        self.is_seat = (seat_type | (shape & small)) & ~self.ignored
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def owner_id(self, index: int) -> Any:
+        return self.elements[self.owner[index]].get("id")
+
+    def owner_bounds(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Bounds of every top-level element around its shapes, and which
+        elements have any shapes at all"""
+        size = len(self.elements)
+        x0, y0 = np.full(size, np.inf), np.full(size, np.inf)
+        x1, y1 = np.full(size, -np.inf), np.full(size, -np.inf)
+        np.minimum.at(x0, self.owner, self.x0)
+        np.minimum.at(y0, self.owner, self.y0)
+        np.maximum.at(x1, self.owner, self.x1)
+        np.maximum.at(y1, self.owner, self.y1)
+        return x0, y0, x1, y1, np.bincount(self.owner, minlength=size) > 0
+
+
+def _run_pairs(counts: np.ndarray) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Yield chunks of (p, q) position pairs where q runs over the
+    ``counts[p]`` positions right after p"""
+    cumulative = np.cumsum(counts)
+    count = len(counts)
+    start = 0
+    while start < count:
+        # Largest run of rows whose pairs fit in one chunk
+        base = cumulative[start - 1] if start else 0
+        stop = int(np.searchsorted(cumulative, base + PAIR_CHUNK, side="right"))
+        stop = max(stop, start + 1)
+        chunk = counts[start:stop]
+        total = int(chunk.sum())
+        if total:
+            rows = np.repeat(np.arange(start, stop), chunk)
+            offsets = np.arange(total) - np.repeat(np.cumsum(chunk) - chunk, chunk)
+            yield rows, rows + 1 + offsets
+        start = stop
+
+
+def candidate_pairs(
+    x0: np.ndarray, y0: np.ndarray, x1: np.ndarray, y1: np.ndarray, pad: float = 0.0
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Yield chunks of (i, j) index pairs whose boxes, widened by ``pad``,
+    intersect, each pair once.
+
+    Spatial hash: every box is entered in the grid cells it covers, and only
+    boxes sharing a cell are compared, so the work follows the number of
+    near neighbours rather than n². A pair is kept only in the cell holding
+    the corner where the two boxes start to intersect, which de-duplicates
+    it. Boxes too large for the grid are compared against everything
+    directly.
+    """
+    count = len(x0)
+    if count < 2:
+        return
+    x1 = x1 + pad
+    y1 = y1 + pad
+    cell = max(float(np.median(np.maximum(x1 - x0, y1 - y0))), 1.0)
+    gx0 = np.floor(x0 / cell).astype(np.int64)
+    gy0 = np.floor(y0 / cell).astype(np.int64)
+    nx = np.floor(x1 / cell).astype(np.int64) - gx0 + 1
+    ny = np.floor(y1 / cell).astype(np.int64) - gy0 + 1
+    covered = nx * ny
+    large = covered > MAX_CELLS_PER_ELEMENT
+
+    small = np.flatnonzero(~large)
+    reps = covered[small]
+    element = np.repeat(small, reps)
+    k = np.arange(len(element)) - np.repeat(np.cumsum(reps) - reps, reps)
+    cx = gx0[element] + k % nx[element]
+    cy = gy0[element] + k // nx[element]
+
+    order = np.lexsort((cy, cx))
+    element, cx, cy = element[order], cx[order], cy[order]
+    first = np.r_[True, (cx[1:] != cx[:-1]) | (cy[1:] != cy[:-1])]
+    starts = np.flatnonzero(first)
+    ends = np.r_[starts[1:], len(element)][np.cumsum(first) - 1]
+    for p, q in _run_pairs(ends - np.arange(len(element)) - 1):
+        i, j = element[p], element[q]
+        owner = (cx[p] == np.maximum(gx0[i], gx0[j])) & (cy[p] == np.maximum(gy0[i], gy0[j]))
+        yield i[owner], j[owner]
+
+    everything = np.arange(count)
+    for i in np.flatnonzero(large):
+        # Other large boxes are only paired with those after them
+        others = everything[~large | (everything > i)]
+        near = (x0[others] < x1[i]) & (x0[i] < x1[others]) & (y0[others] < y1[i]) & (y0[i] < y1[others])
+        j = others[near]
+        yield np.full(len(j), i), j
+
+
+def analyze_layout(
+    elements: Sequence[Dict[str, Any]],
+    clearance: float,
+    canvas_width: float = LAYOUT_RENDER_CANVAS_WIDTH,
+    canvas_height: float = LAYOUT_RENDER_CANVAS_HEIGHT
+) -> Dict[str, Any]:
+    """Overlaps, out-of-canvas elements, clearance violations and per-type
+    counts for a layout's elements.
+
+    Shapes of the ignored types (annotations such as text) are left out of
+    the overlap and clearance checks, as are pairs within one group, which
+    the designer places together on purpose. Seats are exempt from
+    clearance since they sit against their tables. Pairs and elements are
+    reported by top-level element id. Lists are capped at
+    LAYOUT_ANALYSIS_MAX_REPORTED entries, worst first; counts are exact.
+    """
+    started = time.perf_counter()
+    arrays = ElementArrays(elements)
+    limit = LAYOUT_ANALYSIS_MAX_REPORTED
+
+    # Overlaps and clearance from one pass over the candidate pairs
+    checked = np.flatnonzero(~arrays.ignored)
+    x0, y0, x1, y1 = (arrays.x0[checked], arrays.y0[checked], arrays.x1[checked], arrays.y1[checked])
+    seat = arrays.is_seat[checked]
+    owner = arrays.owner[checked]
+    overlap_parts: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+    clearance_parts: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+    for i, j in candidate_pairs(x0, y0, x1, y1, pad=max(clearance, 0.0)):
+        apart = owner[i] != owner[j]
+        i, j = i[apart], j[apart]
+        dx = np.maximum(x0[i], x0[j]) - np.minimum(x1[i], x1[j])
+        dy = np.maximum(y0[i], y0[j]) - np.minimum(y1[i], y1[j])
+        overlapping = (dx < 0) & (dy < 0)
+        if overlapping.any():
+            overlap_parts.append((i[overlapping], j[overlapping], (dx * dy)[overlapping]))
+        if clearance > 0:
+            gap = np.hypot(np.maximum(dx, 0), np.maximum(dy, 0))
+            too_close = ~overlapping & (gap < clearance) & ~seat[i] & ~seat[j]
+            if too_close.any():
+                clearance_parts.append((i[too_close], j[too_close], gap[too_close]))
+
+    def report(parts, value_key: str, largest_first: bool) -> Dict[str, Any]:
+        if not parts:
+            return {"count": 0, "pairs": [], "truncated": False}
+        i, j, value = (np.concatenate(column) for column in zip(*parts))
+        key = -value if largest_first else value
+        # Only the reported entries need sorting
+        order = np.argpartition(key, limit)[:limit] if len(key) > limit else np.arange(len(key))
+        order = order[np.argsort(key[order], kind="stable")]
+        pairs = [
+            {"a": arrays.owner_id(checked[i[k]]), "b": arrays.owner_id(checked[j[k]]), value_key: round(float(value[k]), 2)}
+            for k in order
+        ]
+        return {"count": int(len(value)), "pairs": pairs, "truncated": len(value) > limit}
+
+    top_x0, top_y0, top_x1, top_y1, drawn = arrays.owner_bounds()
+    outside_any = drawn & ((top_x0 < 0) | (top_y0 < 0) | (top_x1 > canvas_width) | (top_y1 > canvas_height))
+    outside_all = (top_x1 <= 0) | (top_y1 <= 0) | (top_x0 >= canvas_width) | (top_y0 >= canvas_height)
+    outside = np.flatnonzero(outside_any)
+
+    type_count = len(arrays.type_names)
+    counts = np.bincount(arrays.type_codes, minlength=type_count)
+    areas = np.bincount(arrays.type_codes, weights=arrays.area, minlength=type_count)
+    seats = np.bincount(arrays.type_codes, weights=arrays.is_seat, minlength=type_count)
+
+    return {
+        "element_count": arrays.top_count,
+        "shape_count": len(arrays),
+        "canvas": {"width": canvas_width, "height": canvas_height},
+        "clearance": clearance,
+        "bounds": [
+            float(arrays.x0.min()), float(arrays.y0.min()), float(arrays.x1.max()), float(arrays.y1.max())
+        ] if len(arrays) else None,
+        "overlaps": report(overlap_parts, "area", largest_first=True),
+        "clearance_violations": report(clearance_parts, "gap", largest_first=False),
+        "out_of_canvas": {
+            "count": int(len(outside)),
+            "elements": [
+                {"id": arrays.elements[k].get("id"), "type": arrays.elements[k].get("type"), "fully_outside": bool(outside_all[k])}
+                for k in outside[:limit]
+            ],
+            "truncated": len(outside) > limit,
+        },
+        "by_type": {
+            name: {"count": int(counts[code]), "area": round(float(areas[code]), 2), "seats": int(seats[code])}
+            for code, name in enumerate(arrays.type_names)
+        },
+        "capacity": int(arrays.is_seat.sum()),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+class LayoutAnalysisCache:
+    """LRU cache of analysis results per layout, tagged with the layout
+    version so a save makes them stale without explicit invalidation.
+    Each layout keeps results for its CLEARANCES_PER_LAYOUT most recently
+    used clearances."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._results: "OrderedDict[int, Tuple[int, OrderedDict[int, Dict[str, Any]]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, layout_id: int, version: int, clearance: int) -> Optional[Dict[str, Any]]:
+        cached = self._results.get(layout_id)
+        result = cached[1].get(clearance) if cached is not None and cached[0] == version else None
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        cached[1].move_to_end(clearance)
+        self._results.move_to_end(layout_id)
+        return result
+
+    def put(self, layout_id: int, version: int, clearance: int, result: Dict[str, Any]) -> None:
+        cached = self._results.get(layout_id)
+        if cached is None or cached[0] != version:
+            cached = (version, OrderedDict())
+        cached[1][clearance] = result
+        cached[1].move_to_end(clearance)
+        while len(cached[1]) > CLEARANCES_PER_LAYOUT:
+            cached[1].popitem(last=False)
+        self._results[layout_id] = cached
+        self._results.move_to_end(layout_id)
+        while len(self._results) > self.max_size:
+            self._results.popitem(last=False)
+
+    def invalidate(self, layout_id: int) -> None:
+        self._results.pop(layout_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "layouts": len(self._results),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Global instance
+layout_analysis_cache = LayoutAnalysisCache(max_size=LAYOUT_ANALYSIS_CACHE_SIZE)
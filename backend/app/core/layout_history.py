@@ -0,0 +1,202 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import LAYOUT_REVISION_SNAPSHOT_INTERVAL
+from ..models.models import Layout, LayoutRevision
+
+SNAPSHOT = "snapshot"
+DELTA = "delta"
+
+
+def _key(element: Dict[str, Any]) -> str:
+    # Element ids come from the client and may be numbers or strings
+    return str(element.get("id"))
+
+
+def _keyed(elements: List[Dict[str, Any]]) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Elements by id, or None when ids are missing or repeated and a delta
+    couldn't address them"""
+    by_key = {}
+    for element in elements:
+        if not isinstance(element, dict) or element.get("id") is None:
+            return None
+        by_key[_key(element)] = element
+    return by_key if len(by_key) == len(elements) else None
+
+
+def diff_elements(previous: List[Dict[str, Any]], elements: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Element-level changes turning ``previous`` into ``elements``.
+
+    ``upsert`` holds every added or changed element in full, ``remove`` the
+    ids of deleted ones. ``order`` is only stored when the stacking order
+    differs from what applying the other changes gives. Returns None when
+    either list can't be diffed by id.
+    """
+    old = _keyed(previous)
+    new = _keyed(elements)
+    if old is None or new is None:
+        return None
+
+    delta: Dict[str, Any] = {}
+    upsert = {key: element for key, element in new.items() if old.get(key) != element}
+    remove = [key for key in old if key not in new]
+    if upsert:
+        delta["upsert"] = upsert
+    if remove:
+        delta["remove"] = remove
+
+    order = list(new)
+    if _ordered_keys(list(old), delta) != order:
+        delta["order"] = order
+    return delta
+
+
+def _ordered_keys(previous_keys: List[str], delta: Dict[str, Any]) -> List[str]:
+    # Surviving elements keep their place and new ones go on top
+    removed = set(delta.get("remove", ()))
+    keys = [key for key in previous_keys if key not in removed]
+    known = set(keys)
+    keys.extend(key for key in delta.get("upsert", {}) if key not in known)
+    return keys
+
+
+def apply_delta(elements: List[Dict[str, Any]], delta: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Apply a delta from diff_elements and return the new element list"""
+    by_key = {_key(element): element for element in elements}
+    by_key.update(delta.get("upsert", {}))
+    order = delta.get("order") or _ordered_keys([_key(element) for element in elements], delta)
+    return [by_key[key] for key in order]
+
+
+class LayoutRevisionStore:
+    """Version history of layouts as periodic snapshots plus deltas.
+
+    Every save writes one revision row in the same transaction as the
+    layout. Most are deltas against the previous revision; a full snapshot
+    is written every ``snapshot_interval`` revisions, or sooner when a
+    delta would be about as large as the layout itself. Reading any
+    revision therefore loads one snapshot and applies at most
+    ``snapshot_interval - 1`` deltas.
+    """
+
+    def __init__(self, snapshot_interval: int):
+        self.snapshot_interval = max(1, snapshot_interval)
+        self.snapshots = 0
+        self.deltas = 0
+        self.bytes_written = 0
+        self.reconstructions = 0
+        self.deltas_applied = 0
+
+    async def record(self, db: AsyncSession, layout: Layout, previous: Optional[List[Dict[str, Any]]] = None) -> Optional[LayoutRevision]:
+        """Add the revision for a pending write of ``layout``.
+
+        ``previous`` is the element list the write replaced, None for a new
+        layout. The session is flushed so the layout's new version is known;
+        the caller commits. Nothing is recorded, and None returned, when the
+        write changed nothing and the version didn't move.
+        """
+        await db.flush()
+        elements = (layout.layout or {}).get("elements") or []
+
+        last = None
+        if previous is not None:
+            last = (await db.execute(
+                select(LayoutRevision.version, LayoutRevision.chain_length)
+                .where(LayoutRevision.layout_id == layout.layout_id)
+                .order_by(LayoutRevision.version.desc())
+                .limit(1)
+            )).first()
+
+        if last is not None and last.version == layout.version:
+            return None
+
+        delta = None
+        # A gap in the chain (say, a layout saved before history existed)
+        # can't be bridged by a delta
+        if last is not None and last.version == layout.version - 1 and last.chain_length + 1 < self.snapshot_interval:
+            delta = diff_elements(previous, elements)
+            if delta is not None and len(delta.get("upsert", ())) * 2 > len(elements):
+                delta = None
+
+        if delta is None:
+            kind, chain_length, data = SNAPSHOT, 0, {"elements": elements}
+        else:
+            kind, chain_length, data = DELTA, last.chain_length + 1, delta
+        size = len(orjson.dumps(data))
+
+        revision = LayoutRevision(
+            layout_id=layout.layout_id,
+            version=layout.version,
+            kind=kind,
+            chain_length=chain_length,
+            data=data,
+            name=layout.name,
+            element_count=len(elements),
+            size_bytes=size
+        )
+        db.add(revision)
+
+        if kind == SNAPSHOT:
+            self.snapshots += 1
+        else:
+            self.deltas += 1
+        self.bytes_written += size
+        return revision
+
+    async def reconstruct(self, db: AsyncSession, layout_id: int, version: int) -> Optional[Tuple[LayoutRevision, List[Dict[str, Any]], int]]:
+        """Elements of a layout as of ``version``.
+
+        Returns the revision row, its elements and the number of deltas
+        applied, or None if the revision doesn't exist.
+        """
+        snapshot = await db.scalar(
+            select(LayoutRevision)
+            .where(
+                LayoutRevision.layout_id == layout_id,
+                LayoutRevision.version <= version,
+                LayoutRevision.kind == SNAPSHOT
+            )
+            .order_by(LayoutRevision.version.desc())
+            .limit(1)
+        )
+        if snapshot is None:
+            return None
+
+        revision = snapshot
+        elements = list(snapshot.data.get("elements") or [])
+        deltas = []
+        if snapshot.version < version:
+            deltas = (await db.scalars(
+                select(LayoutRevision)
+                .where(
+                    LayoutRevision.layout_id == layout_id,
+                    LayoutRevision.version > snapshot.version,
+                    LayoutRevision.version <= version
+                )
+                .order_by(LayoutRevision.version)
+            )).all()
+            if not deltas or deltas[-1].version != version:
+                return None
+            for revision in deltas:
+                elements = apply_delta(elements, revision.data)
+
+        self.reconstructions += 1
+        self.deltas_applied += len(deltas)
+        return revision, elements, len(deltas)
+
+    def stats(self) -> dict:
+        return {
+            "snapshot_interval": self.snapshot_interval,
+            "snapshots_written": self.snapshots,
+            "deltas_written": self.deltas,
+            "bytes_written": self.bytes_written,
+            "reconstructions": self.reconstructions,
+            "average_deltas_applied": self.deltas_applied / self.reconstructions if self.reconstructions else 0.0,
+        }
+
+
+# Global instance
+layout_revisions = LayoutRevisionStore(snapshot_interval=LAYOUT_REVISION_SNAPSHOT_INTERVAL)
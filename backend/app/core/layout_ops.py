@@ -0,0 +1,82 @@
+from typing import Any, Dict, List, Optional, Sequence
+
+from .geometry import compute_layout_stats
+from ..models.models import Layout
+from ..schemas.layout import LayoutOperation
+
+
+class LayoutOperationError(ValueError):
+    """Raised when an operation cannot be applied to the current elements"""
+
+
+def _element_key(element_id: Any) -> str:
+    # Element ids come from the client and may be numbers or strings
+    return str(element_id)
+
+
+def apply_operations(elements: List[Dict[str, Any]], operations: Sequence[LayoutOperation]) -> List[Dict[str, Any]]:
+    """Apply element operations and return a new element list.
+
+    The input list and its element dicts are left untouched, so a failure
+    part-way through leaves the stored layout unchanged.
+    """
+    result = list(elements)
+    positions = {_element_key(el.get("id")): i for i, el in enumerate(result)}
+
+    def reindex(start: int = 0) -> None:
+        for i in range(start, len(result)):
+            positions[_element_key(result[i].get("id"))] = i
+
+    for operation in operations:
+        key = _element_key(operation.id)
+
+        if operation.op == "add":
+            if key in positions:
+                raise LayoutOperationError(f"Element {operation.id} already exists")
+            if operation.element is None:
+                raise LayoutOperationError(f"Add operation for {operation.id} is missing 'element'")
+            element = {**operation.element, "id": operation.id}
+            index = len(result) if operation.index is None else max(0, min(operation.index, len(result)))
+            result.insert(index, element)
+            reindex(index)
+            continue
+
+        if key not in positions:
+            raise LayoutOperationError(f"Element {operation.id} not found")
+        position = positions[key]
+
+        if operation.op == "remove":
+            result.pop(position)
+            del positions[key]
+            reindex(position)
+
+        elif operation.op == "update":
+            if not operation.changes:
+                raise LayoutOperationError(f"Update operation for {operation.id} is missing 'changes'")
+            result[position] = {**result[position], **operation.changes, "id": result[position].get("id")}
+
+        elif operation.op == "move":
+            moved = dict(result[position])
+            if operation.x is not None:
+                moved["x"] = operation.x
+            if operation.y is not None:
+                moved["y"] = operation.y
+            result[position] = moved
+            if operation.index is not None:
+                result.pop(position)
+                index = max(0, min(operation.index, len(result)))
+                result.insert(index, moved)
+                reindex(min(position, index))
+
+    return result
+
+
+def set_layout_elements(db_layout: Layout, elements: List[Dict[str, Any]], base: Optional[Dict[str, Any]] = None) -> None:
+    """Store a new element list on a layout row and refresh its derived stats.
+
+    JSON columns don't track in-place mutation, so a new document is always
+    assigned. ``base`` carries over any other keys of the stored document.
+    """
+    db_layout.layout = {**(base or {}), "elements": elements}
+    for key, value in compute_layout_stats(elements).items():
+        setattr(db_layout, key, value)
@@ -0,0 +1,707 @@
+import asyncio
+import base64
+import binascii
+import io
+import math
+import re
+import time
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+from .config import (
+    LAYOUT_RENDER_WORKERS,
+    LAYOUT_RENDER_CACHE_MB,
+    LAYOUT_RENDER_CANVAS_WIDTH,
+    LAYOUT_RENDER_CANVAS_HEIGHT,
+    LAYOUT_RENDER_FONT,
+    IMAGE_MAX_PIXELS,
+)
+from .geometry import CENTERED_TYPES, DEFAULT_SIZE, element_bounds
+from .storage import get_storage_service
+
+# format name -> (content type, file extension)
+RENDER_FORMATS = {
+    "svg": ("image/svg+xml", "svg"),
+    "png": ("image/png", "png"),
+    "pdf": ("application/pdf", "pdf"),
+}
+
+# Elements whose children are positioned relative to them
+GROUP_TYPES = ("group", "merged")
+# Sides of the designer's RegularPolygon shapes
+POLYGON_SIDES = {"triangle": 3, "pentagon": 5, "hexagon": 6, "octagon": 8}
+# Segments used to draw ellipses in raster output
+ELLIPSE_SEGMENTS = 72
+# Raster output is drawn this many times larger and scaled down, for smooth edges,
+# as long as the oversized canvas stays under this width
+SUPERSAMPLE = 2
+SUPERSAMPLE_MAX_WIDTH = 4096
+
+Bounds = Tuple[float, float, float, float]
+# Affine transform (a, b, c, d, e, f): x' = a*x + c*y + e, y' = b*x + d*y + f
+Matrix = Tuple[float, float, float, float, float, float]
+RenderKey = Tuple[int, int, str, int]
+
+IDENTITY: Matrix = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+_DATA_URL = re.compile(r"^data:image/[\w.+-]+;base64,", re.IGNORECASE)
+_RGBA = re.compile(r"^rgba?\(\s*([\d.]+)\s*,\s*([\d.]+)\s*,\s*([\d.]+)\s*(?:,\s*([\d.]+%?)\s*)?\)$", re.IGNORECASE)
+
+Color = Tuple[int, int, int, int]
+
+
+class RenderTooLargeError(ValueError):
+    """Raised when a layout would render to more pixels than the limit allows"""
+
+
+# -- Scene ------------------------------------------------------------------
+
+def _multiply(m: Matrix, n: Matrix) -> Matrix:
+    """``m`` applied after ``n``"""
+    a, b, c, d, e, f = m
+    a2, b2, c2, d2, e2, f2 = n
+    return (
+        a * a2 + c * b2, b * a2 + d * b2,
+        a * c2 + c * d2, b * c2 + d * d2,
+        a * e2 + c * f2 + e, b * e2 + d * f2 + f,
+    )
+
+
+def _translate(x: float, y: float) -> Matrix:
+    return (1.0, 0.0, 0.0, 1.0, x, y)
+
+
+def _rotate(degrees: float) -> Matrix:
+    # Clockwise on screen, like Konva's ``rotation``
+    r = math.radians(degrees)
+    return (math.cos(r), math.sin(r), -math.sin(r), math.cos(r), 0.0, 0.0)
+
+
+def _apply(m: Matrix, x: float, y: float) -> Tuple[float, float]:
+    a, b, c, d, e, f = m
+    return a * x + c * y + e, b * x + d * y + f
+
+
+def _number(value: Any, default: float) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    return number if math.isfinite(number) else default
+
+
+def parse_color(value: Any, opacity: float = 1.0) -> Optional[Color]:
+    """RGBA tuple for a CSS colour, or None for transparent/unparseable values"""
+    if not isinstance(value, str) or not value.strip() or value.strip().lower() == "transparent":
+        return None
+    value = value.strip()
+    match = _RGBA.match(value)
+    if match:
+        r, g, b, alpha = match.groups()
+        if alpha is None:
+            alpha_value = 1.0
+        elif alpha.endswith("%"):
+            alpha_value = float(alpha[:-1]) / 100
+        else:
+            alpha_value = float(alpha)
+        rgba = (int(float(r)), int(float(g)), int(float(b)), alpha_value)
+    else:
+        from PIL import ImageColor
+        try:
+            parsed = ImageColor.getrgb(value)
+        except ValueError:
+            return None
+        rgba = (*parsed[:3], parsed[3] / 255 if len(parsed) == 4 else 1.0)
+    r, g, b, alpha_value = rgba
+    alpha = round(max(0.0, min(1.0, alpha_value * opacity)) * 255)
+    if alpha == 0:
+        return None
+    return (min(r, 255), min(g, 255), min(b, 255), alpha)
+
+
+def optimal_font_size(width: float, height: float, text: str, min_size: float = 8, max_size: float = 72) -> float:
+    """Port of the designer's calculateOptimalFontSize"""
+    available_width = width * 0.9
+    available_height = height * 0.9
+    font_size = max(min(available_width, available_height) * 0.2, min_size)
+
+    aspect_ratio = width / height if height else 1
+    if aspect_ratio > 3:
+        font_size = max(available_height * 0.4, min_size)
+    elif aspect_ratio < 0.33:
+        font_size = max(available_width * 0.5, min_size)
+
+    if text:
+        if len(text) > 10:
+            font_size *= max(0.5, 8 / len(text))
+        elif len(text) > 5:
+            font_size *= max(0.7, 10 / len(text))
+        if len(text) * font_size * 0.6 > available_width:
+            font_size = (available_width / (len(text) * 0.6)) * 0.9
+
+    return min(max(font_size, min_size), max_size)
+
+
+def _polygon_points(sides: int, radius: float) -> List[Tuple[float, float]]:
+    # Same vertex placement as Konva.RegularPolygon: first vertex straight up
+    return [
+        (radius * math.sin(2 * math.pi * i / sides), -radius * math.cos(2 * math.pi * i / sides))
+        for i in range(sides)
+    ]
+
+
+def _star_points(points: int, inner: float, outer: float) -> List[Tuple[float, float]]:
+    return [
+        ((outer if i % 2 == 0 else inner) * math.sin(math.pi * i / points),
+         -(outer if i % 2 == 0 else inner) * math.cos(math.pi * i / points))
+        for i in range(points * 2)
+    ]
+
+
+def build_scene(elements: Sequence[Dict[str, Any]]) -> List[dict]:
+    """Flatten a layout into drawing primitives in stacking order.
+
+    Each primitive carries the matrix from its local coordinates to layout
+    coordinates. Positioning follows the designer: round shapes, polygons
+    and stars are placed by their centre, everything else by its top-left
+    corner, and each element rotates about that point. Group children are
+    relative to the group.
+    """
+    scene: List[dict] = []
+    for element in elements:
+        if isinstance(element, dict):
+            _add_element(scene, element, IDENTITY, 1.0, in_group=False)
+    return scene
+
+
+def _add_element(scene: List[dict], element: Dict[str, Any], parent: Matrix, parent_opacity: float, in_group: bool) -> None:
+    element_type = element.get("type")
+    x = _number(element.get("x"), 0.0)
+    y = _number(element.get("y"), 0.0)
+    width = max(_number(element.get("width"), DEFAULT_SIZE), 0.0)
+    height = max(_number(element.get("height"), width), 0.0)
+    opacity = parent_opacity * max(0.0, min(1.0, _number(element.get("opacity"), 1.0)))
+    position = _multiply(parent, _translate(x, y))
+    matrix = _multiply(position, _rotate(_number(element.get("rotation"), 0.0)))
+
+    fill = parse_color(element.get("color"), opacity)
+    border_width = _number(element.get("borderWidth"), 0.0)
+    stroke = parse_color(element.get("borderColor") or ("#000000" if in_group else None), opacity) if border_width > 0 else None
+    style = {"matrix": matrix, "fill": fill, "stroke": stroke, "stroke_width": border_width if stroke else 0.0}
+
+    if element_type in GROUP_TYPES:
+        for child in element.get("children") or []:
+            if isinstance(child, dict):
+                _add_element(scene, child, matrix, opacity, in_group=True)
+        return
+
+    if element_type == "round":
+        scene.append({**style, "kind": "ellipse", "rx": width / 2, "ry": width / 2})
+    elif element_type == "ellipse":
+        scene.append({**style, "kind": "ellipse", "rx": width / 2, "ry": height / 2})
+    elif element_type in POLYGON_SIDES:
+        scene.append({**style, "kind": "polygon", "points": _polygon_points(POLYGON_SIDES[element_type], width / 2)})
+    elif element_type == "star":
+        scene.append({**style, "kind": "polygon", "points": _star_points(5, width / 4, width / 2)})
+    elif element_type == "line":
+        color = parse_color(element.get("color"), opacity)
+        if color:
+            scene.append({"kind": "line", "matrix": matrix, "length": width, "stroke": color, "stroke_width": height or 2})
+        return
+    elif element_type == "text":
+        text = str(element.get("text") or element.get("label") or "Text")
+        size = _number(element.get("fontSize"), 0.0) or (16 if in_group else optimal_font_size(width, height, text))
+        color = parse_color(element.get("color"), opacity)
+        if color:
+            scene.append({
+                "kind": "text", "matrix": matrix, "text": text, "font_size": size,
+                "fill": color, "bold": False, "cx": width / 2, "cy": height / 2,
+            })
+        return
+    elif element_type == "image":
+        scene.append({
+            "kind": "image", "matrix": matrix, "width": width, "height": height,
+            "source": element.get("imageData") or element.get("imageUrl"), "opacity": opacity,
+        })
+    else:
+        # square, rectangle and anything the renderer doesn't know draw as boxes
+        scene.append({**style, "kind": "rect", "width": width, "height": height})
+
+    label = element.get("text")
+    if label:
+        # The designer draws shape labels upright at the centre, ignoring rotation
+        if element_type in CENTERED_TYPES:
+            center = _multiply(parent, _translate(x, y))
+        else:
+            center = _multiply(parent, _translate(x + width / 2, y + height / 2))
+        size = 14 if in_group else (_number(element.get("fontSize"), 0.0) or optimal_font_size(width, height, str(label)))
+        scene.append({
+            "kind": "text", "matrix": center, "text": str(label), "font_size": size,
+            "fill": (255, 255, 255, round(255 * opacity)), "bold": True, "cx": 0.0, "cy": 0.0,
+        })
+
+
+def scene_bounds(elements: Sequence[Dict[str, Any]]) -> Bounds:
+    """Area to draw: the designer's canvas, grown to fit elements outside it"""
+    min_x, min_y = 0.0, 0.0
+    max_x, max_y = float(LAYOUT_RENDER_CANVAS_WIDTH), float(LAYOUT_RENDER_CANVAS_HEIGHT)
+    for element in elements:
+        if isinstance(element, dict):
+            e_min_x, e_min_y, e_max_x, e_max_y = element_bounds(element)
+            min_x, min_y = min(min_x, e_min_x), min(min_y, e_min_y)
+            max_x, max_y = max(max_x, e_max_x), max(max_y, e_max_y)
+    return min_x, min_y, max_x, max_y
+
+
+def output_size(elements: Sequence[Dict[str, Any]], width: int, max_pixels: Optional[int] = None) -> Tuple[Bounds, int, int]:
+    """Scene bounds, output height and supersampling factor for a render
+    ``width`` pixels wide.
+
+    Raises RenderTooLargeError when the drawing isn't finite or, given
+    ``max_pixels``, when the raster canvas would hold more pixels than
+    that. Supersampling is dropped before giving up.
+    """
+    min_x, min_y, max_x, max_y = bounds = scene_bounds(elements)
+    ratio = (max_y - min_y) / (max_x - min_x)
+    if not math.isfinite(ratio) or not all(math.isfinite(value) for value in bounds):
+        raise RenderTooLargeError("Layout has elements at non-finite positions")
+    height = max(1, round(width * ratio))
+    if max_pixels is None:
+        return bounds, height, 1
+
+    factor = SUPERSAMPLE if width * SUPERSAMPLE <= SUPERSAMPLE_MAX_WIDTH else 1
+    if width * height * factor * factor > max_pixels:
+        factor = 1
+    if width * height > max_pixels:
+        raise RenderTooLargeError(f"Render would be {width}x{height} pixels, limit is {max_pixels}; try a smaller width")
+    return bounds, height, factor
+
+
+def image_urls(elements: Sequence[Dict[str, Any]]) -> List[str]:
+    """URLs of every image element, including those inside groups"""
+    urls = []
+    for element in elements:
+        if not isinstance(element, dict):
+            continue
+        if element.get("type") == "image" and not element.get("imageData"):
+            url = element.get("imageUrl")
+            if isinstance(url, str) and not _DATA_URL.match(url):
+                urls.append(url)
+        urls.extend(image_urls(element.get("children") or []))
+    return urls
+
+
+def _image_bytes(source: Any, images: Dict[str, bytes]) -> Optional[bytes]:
+    if not isinstance(source, str):
+        return None
+    match = _DATA_URL.match(source)
+    if match:
+        try:
+            return base64.b64decode(source[match.end():], validate=True)
+        except (binascii.Error, ValueError):
+            return None
+    return images.get(source)
+
+
+# -- SVG --------------------------------------------------------------------
+
+def _svg_matrix(m: Matrix) -> str:
+    return "matrix(" + ",".join(f"{value:.4f}".rstrip("0").rstrip(".") or "0" for value in m) + ")"
+
+
+def _svg_paint(attribute: str, color: Optional[Color]) -> str:
+    if color is None:
+        return f' {attribute}="none"'
+    r, g, b, a = color
+    paint = f' {attribute}="rgb({r},{g},{b})"'
+    if a < 255:
+        paint += f' {attribute}-opacity="{a / 255:.3f}"'
+    return paint
+
+
+def _svg_style(item: dict) -> str:
+    style = _svg_paint("fill", item.get("fill"))
+    if item.get("stroke"):
+        style += _svg_paint("stroke", item["stroke"]) + f' stroke-width="{item["stroke_width"]:g}"'
+    return style
+
+
+def render_svg(elements: Sequence[Dict[str, Any]], width: int, images: Dict[str, bytes]) -> bytes:
+    (min_x, min_y, max_x, max_y), height, _ = output_size(elements, width)
+    scene_width, scene_height = max_x - min_x, max_y - min_y
+
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+        f'width="{width}" height="{height}" viewBox="{min_x:g} {min_y:g} {scene_width:g} {scene_height:g}">',
+        f'<rect x="{min_x:g}" y="{min_y:g}" width="{scene_width:g}" height="{scene_height:g}" fill="#ffffff"/>',
+    ]
+    for item in build_scene(elements):
+        kind = item["kind"]
+        transform = _svg_matrix(item["matrix"])
+        if kind == "rect":
+            out.append(f'<rect width="{item["width"]:g}" height="{item["height"]:g}" transform="{transform}"{_svg_style(item)}/>')
+        elif kind == "ellipse":
+            out.append(f'<ellipse rx="{item["rx"]:g}" ry="{item["ry"]:g}" transform="{transform}"{_svg_style(item)}/>')
+        elif kind == "polygon":
+            points = " ".join(f"{px:.3f},{py:.3f}" for px, py in item["points"])
+            out.append(f'<polygon points="{points}" transform="{transform}"{_svg_style(item)}/>')
+        elif kind == "line":
+            out.append(
+                f'<line x2="{item["length"]:g}" transform="{transform}"{_svg_paint("stroke", item["stroke"])} '
+                f'stroke-width="{item["stroke_width"]:g}"/>'
+            )
+        elif kind == "text":
+            lines = item["text"].split("\n")
+            size = item["font_size"]
+            top = item["cy"] - size * (len(lines) - 1) / 2
+            tspans = "".join(
+                f'<tspan x="{item["cx"]:g}" y="{top + i * size:g}">{escape(line)}</tspan>'
+                for i, line in enumerate(lines)
+            )
+            weight = ' font-weight="bold"' if item["bold"] else ""
+            out.append(
+                f'<text transform="{transform}" font-family="sans-serif" font-size="{size:g}"{weight} '
+                f'text-anchor="middle" dominant-baseline="central"{_svg_paint("fill", item["fill"])}>{tspans}</text>'
+            )
+        elif kind == "image":
+            data = _image_bytes(item["source"], images)
+            if data is None:
+                out.append(
+                    f'<rect width="{item["width"]:g}" height="{item["height"]:g}" transform="{transform}" '
+                    f'fill="none" stroke="#d1d5db" stroke-dasharray="5 5"/>'
+                )
+                continue
+            href = "data:application/octet-stream;base64," + base64.b64encode(data).decode()
+            out.append(
+                f'<image width="{item["width"]:g}" height="{item["height"]:g}" transform="{transform}" '
+                f'preserveAspectRatio="none" opacity="{item["opacity"]:g}" xlink:href={quoteattr(href)}/>'
+            )
+    out.append("</svg>")
+    return "\n".join(out).encode()
+
+
+# -- Raster -----------------------------------------------------------------
+
+def _load_font(size: float, bold: bool):
+    return _font(max(1, round(size)), bold)
+
+
+@lru_cache(maxsize=64)
+def _font(size: int, bold: bool):
+    """Loaded once per size in each worker; labels mostly share a few sizes"""
+    from PIL import ImageFont
+
+    path = LAYOUT_RENDER_FONT
+    if bold and path.lower().endswith(".ttf") and "bold" not in path.lower():
+        try:
+            return ImageFont.truetype(path[:-4] + "-Bold.ttf", size)
+        except OSError:
+            pass
+    try:
+        return ImageFont.truetype(path, size)
+    except OSError:
+        return ImageFont.load_default(size=size)
+
+
+def _scale_of(m: Matrix) -> float:
+    return math.sqrt(abs(m[0] * m[3] - m[1] * m[2]))
+
+
+def _angle_of(m: Matrix) -> float:
+    return math.degrees(math.atan2(m[1], m[0]))
+
+
+def _paste_transformed(canvas, tile, matrix: Matrix, local_center: Tuple[float, float]) -> None:
+    """Paste ``tile`` rotated by the matrix, centred on ``local_center``"""
+    from PIL import Image
+
+    angle = _angle_of(matrix)
+    if abs(angle) > 0.01:
+        tile = tile.rotate(-angle, resample=Image.BICUBIC, expand=True)
+    cx, cy = _apply(matrix, *local_center)
+    # Masked paste, since tiles may hang off the top or left edge
+    canvas.paste(tile, (round(cx - tile.width / 2), round(cy - tile.height / 2)), tile)
+
+
+def render_raster(elements: Sequence[Dict[str, Any]], width: int, images: Dict[str, bytes], max_pixels: int):
+    """Draw a layout with Pillow and return an RGB image ``width`` pixels wide"""
+    from PIL import Image, ImageDraw
+
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+
+    # Checked before Image.new: the canvas is allocated all at once
+    (min_x, min_y, max_x, max_y), height, factor = output_size(elements, width, max_pixels)
+    scale = width * factor / (max_x - min_x)
+    view = _multiply((scale, 0.0, 0.0, scale, 0.0, 0.0), _translate(-min_x, -min_y))
+
+    # RGBA ink is only blended when drawing onto an RGB image
+    canvas = Image.new("RGB", (width * factor, height * factor), (255, 255, 255))
+    draw = ImageDraw.Draw(canvas, "RGBA")
+    decoded: Dict[int, Any] = {}
+
+    for item in build_scene(elements):
+        kind = item["kind"]
+        matrix = _multiply(view, item["matrix"])
+        pixel_scale = _scale_of(matrix)
+
+        if kind in ("rect", "ellipse", "polygon"):
+            if kind == "rect":
+                local = [(0, 0), (item["width"], 0), (item["width"], item["height"]), (0, item["height"])]
+            elif kind == "ellipse":
+                local = [
+                    (item["rx"] * math.cos(2 * math.pi * i / ELLIPSE_SEGMENTS), item["ry"] * math.sin(2 * math.pi * i / ELLIPSE_SEGMENTS))
+                    for i in range(ELLIPSE_SEGMENTS)
+                ]
+            else:
+                local = item["points"]
+            points = [_apply(matrix, px, py) for px, py in local]
+            stroke_width = round(item["stroke_width"] * pixel_scale) if item["stroke"] else 0
+            draw.polygon(points, fill=item["fill"], outline=item["stroke"] if stroke_width else None, width=max(stroke_width, 1))
+        elif kind == "line":
+            draw.line([_apply(matrix, 0, 0), _apply(matrix, item["length"], 0)], fill=item["stroke"], width=max(1, round(item["stroke_width"] * pixel_scale)))
+        elif kind == "text":
+            font = _load_font(item["font_size"] * pixel_scale, item["bold"])
+            if abs(_angle_of(matrix)) <= 0.01:
+                position = _apply(matrix, item["cx"], item["cy"])
+                if "\n" in item["text"]:
+                    draw.multiline_text(position, item["text"], fill=item["fill"], font=font, anchor="mm", align="center")
+                else:
+                    draw.text(position, item["text"], fill=item["fill"], font=font, anchor="mm")
+                continue
+            left, top, right, bottom = draw.multiline_textbbox((0, 0), item["text"], font=font, anchor="mm", align="center")
+            tile = Image.new("RGBA", (max(1, math.ceil(right - left)), max(1, math.ceil(bottom - top))), (0, 0, 0, 0))
+            ImageDraw.Draw(tile).multiline_text((-left, -top), item["text"], fill=item["fill"], font=font, anchor="mm", align="center")
+            _paste_transformed(canvas, tile, matrix, (item["cx"], item["cy"]))
+        elif kind == "image":
+            box = (max(1, round(item["width"] * pixel_scale)), max(1, round(item["height"] * pixel_scale)))
+            data = _image_bytes(item["source"], images)
+            picture = None
+            if data is not None:
+                key = id(data)
+                if key not in decoded:
+                    try:
+                        decoded[key] = Image.open(io.BytesIO(data)).convert("RGBA")
+                    except Exception:
+                        decoded[key] = None
+                picture = decoded[key]
+            if picture is None:
+                points = [_apply(matrix, px, py) for px, py in [(0, 0), (item["width"], 0), (item["width"], item["height"]), (0, item["height"])]]
+                draw.polygon(points, outline=(209, 213, 219, 255))
+                continue
+            tile = picture.resize(box, Image.LANCZOS)
+            if item["opacity"] < 1:
+                alpha = tile.getchannel("A").point(lambda value: round(value * item["opacity"]))
+                tile.putalpha(alpha)
+            _paste_transformed(canvas, tile, matrix, (item["width"] / 2, item["height"] / 2))
+
+    if factor > 1:
+        canvas = canvas.reduce(factor)
+    return canvas
+
+
+def render_layout(
+    elements: Sequence[Dict[str, Any]],
+    fmt: str,
+    width: int,
+    images: Dict[str, bytes],
+    max_pixels: int,
+) -> Tuple[bytes, float]:
+    """Render a layout's elements as SVG, PNG or PDF.
+
+    Runs in a worker process. PDF output is a single page holding the
+    raster rendering. Returns the encoded file and the CPU time spent.
+    """
+    started = time.process_time()
+    if fmt == "svg":
+        return render_svg(elements, width, images), time.process_time() - started
+
+    image = render_raster(elements, width, images, max_pixels)
+    buffer = io.BytesIO()
+    if fmt == "pdf":
+        # 144 dpi keeps the designer's default 1600px export at its on-screen size
+        image.save(buffer, "PDF", resolution=144.0)
+    else:
+        image.save(buffer, "PNG", optimize=False)
+    return buffer.getvalue(), time.process_time() - started
+
+
+class LayoutRenderService:
+    """Renders layouts in a process pool and caches the files.
+
+    Results are keyed by (layout_id, version, format, width), so a layout
+    is drawn once per version and size however often it is downloaded.
+    Concurrent requests for the same key share a single render. The cache
+    is an LRU bounded by total bytes; storing a newer version of a layout
+    drops the older ones.
+    """
+
+    def __init__(self, workers: int, cache_bytes: int, max_pixels: int):
+        self.workers = workers
+        self.cache_bytes = cache_bytes
+        self.max_pixels = max_pixels
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._cache: "OrderedDict[RenderKey, bytes]" = OrderedDict()
+        self._cached_bytes = 0
+        self._inflight: Dict[RenderKey, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.renders = 0
+        self.failed = 0
+        self.rejected = 0
+        self.pool_restarts = 0
+        self.evictions = 0
+        self.cpu_seconds = 0.0
+        self.wall_seconds = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _reset_executor(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            self.pool_restarts += 1
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def cached(self, key: RenderKey) -> Optional[bytes]:
+        data = self._cache.get(key)
+        if data is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+        return data
+
+    def _store(self, key: RenderKey, data: bytes) -> None:
+        layout_id, version = key[0], key[1]
+        for stale in [k for k in self._cache if k[0] == layout_id and k[1] < version]:
+            self._cached_bytes -= len(self._cache.pop(stale))
+        if len(data) > self.cache_bytes:
+            return
+        self._cache[key] = data
+        self._cached_bytes += len(data)
+        while self._cached_bytes > self.cache_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cached_bytes -= len(evicted)
+            self.evictions += 1
+
+    def invalidate(self, layout_id: int) -> None:
+        for key in [k for k in self._cache if k[0] == layout_id]:
+            self._cached_bytes -= len(self._cache.pop(key))
+
+    async def _load_images(self, elements: Sequence[Dict[str, Any]]) -> Dict[str, bytes]:
+        """Read the images we host; anything else renders as a placeholder"""
+        storage = get_storage_service()
+        urls = [url for url in dict.fromkeys(image_urls(elements)) if storage.owns_url(url)]
+
+        async def read(url: str) -> Optional[bytes]:
+            try:
+                return await storage.read_object(storage.key_from_url(url))
+            except Exception as e:
+                print(f"Error reading layout image {url}: {e}")
+                return None
+
+        results = await asyncio.gather(*(read(url) for url in urls))
+        return {url: data for url, data in zip(urls, results) if data is not None}
+
+    async def render(self, key: RenderKey, elements: Sequence[Dict[str, Any]]) -> bytes:
+        """Rendered file for ``key``, from the cache or a worker"""
+        data = self.cached(key)
+        if data is not None:
+            return data
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The request doing the render was cancelled, not this one
+                return await self.render(key, elements)
+
+        self.misses += 1
+        # Refuse oversized renders here, so they never reach a worker
+        try:
+            output_size(elements, key[3], None if key[2] == "svg" else self.max_pixels)
+        except RenderTooLargeError:
+            self.rejected += 1
+            raise
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # Nobody may be waiting when a render fails
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+
+        started = time.perf_counter()
+        try:
+            images = await self._load_images(elements)
+            async with self._slots:
+                data, cpu_seconds = await loop.run_in_executor(
+                    self._get_executor(),
+                    render_layout,
+                    list(elements), key[2], key[3], images, self.max_pixels
+                )
+        except Exception as e:
+            self.failed += 1
+            if isinstance(e, BrokenProcessPool):
+                # A worker died (say, killed for memory); the pool can't be
+                # used again, so the next render starts a fresh one
+                self._reset_executor()
+            future.set_exception(e)
+            raise
+        except BaseException:
+            # Cancelled: release the requests waiting on this render
+            future.cancel()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        self.renders += 1
+        self.cpu_seconds += cpu_seconds
+        self.wall_seconds += time.perf_counter() - started
+        self._store(key, data)
+        future.set_result(data)
+        return data
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "cached": len(self._cache),
+            "cached_bytes": self._cached_bytes,
+            "cache_limit_bytes": self.cache_bytes,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "renders": self.renders,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "pool_restarts": self.pool_restarts,
+            "evictions": self.evictions,
+            "avg_render_ms": self.wall_seconds / self.renders * 1000 if self.renders else 0.0,
+            "avg_cpu_ms": self.cpu_seconds / self.renders * 1000 if self.renders else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Global instance
+layout_render_service = LayoutRenderService(
+    workers=LAYOUT_RENDER_WORKERS,
+    cache_bytes=LAYOUT_RENDER_CACHE_MB * 1024 * 1024,
+    max_pixels=IMAGE_MAX_PIXELS,
+)
\ No newline at end of file
@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+from .config import AUTH_CACHE_TTL_SECONDS, AUTH_CACHE_MAX_SIZE
+
+
+class PrincipalCache:
+    """In-process TTL/LRU cache of resolved users, keyed by bearer token.
+
+    Entries hold a plain snapshot of the user's columns rather than an ORM
+    instance, so they can be re-attached to any request's session. Each
+    entry expires after ``ttl_seconds`` or when the token itself expires,
+    whichever comes first. The cache is per process: explicit invalidation
+    only reaches the current worker, and the TTL bounds staleness elsewhere.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._tokens_by_user: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_size > 0
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Return the cached user snapshot for a token, if still fresh"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, user_id, values = entry
+            if expires_at <= time.monotonic():
+                self._remove(token, user_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return values
+
+    def put(self, token: str, user_id: int, values: Dict[str, Any], token_exp: Optional[int] = None) -> None:
+        """Cache a user snapshot for a token"""
+        if not self.enabled:
+            return
+        ttl = self.ttl_seconds
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+            if ttl <= 0:
+                return
+        with self._lock:
+            if token in self._entries:
+                self._remove(token, self._entries[token][1])
+            self._entries[token] = (time.monotonic() + ttl, user_id, values)
+            self._tokens_by_user.setdefault(user_id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                old_token, (_, old_user_id, _) = self._entries.popitem(last=False)
+                self._discard_user_token(old_user_id, old_token)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Drop every cached token that resolves to the given user"""
+        with self._lock:
+            for token in self._tokens_by_user.pop(user_id, set()):
+                self._entries.pop(token, None)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, token: str, user_id: int) -> None:
+        self._entries.pop(token, None)
+        self._discard_user_token(user_id, token)
+
+    def _discard_user_token(self, user_id: int, token: str) -> None:
+        tokens = self._tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user_id]
+
+
+# Global instance
+principal_cache = PrincipalCache(max_size=AUTH_CACHE_MAX_SIZE, ttl_seconds=AUTH_CACHE_TTL_SECONDS)
@@ -0,0 +1,23 @@
+from typing import Any, Optional
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by orjson.
+
+    Returned directly from a handler it also bypasses FastAPI's
+    ``jsonable_encoder`` walk. Values wrapped in ``raw_json`` are written
+    into the body verbatim.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def raw_json(value: Optional[str], default: bytes = b"null") -> orjson.Fragment:
+    """Embed an already-serialized JSON string without decoding it"""
+    if value is None:
+        return orjson.Fragment(default)
+    return orjson.Fragment(value.encode() if isinstance(value, str) else value)
@@ -0,0 +1,121 @@
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from sqlalchemy import inspect, select, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+from .geometry import compute_layout_stats
+from ..models.models import Base, Layout
+
+# Columns added to tables that older databases already have, as (table,
+# column, type and default). create_all only creates missing tables, so
+# these are added here
+_COLUMNS: List[Tuple[str, str, str]] = [
+    ("layouts", "version", "INTEGER NOT NULL DEFAULT 1"),
+    ("layouts", "element_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("layouts", "bounds_min_x", "FLOAT"),
+    ("layouts", "bounds_min_y", "FLOAT"),
+    ("layouts", "bounds_max_x", "FLOAT"),
+    ("layouts", "bounds_max_y", "FLOAT"),
+    # NULL on rows saved before it existed, which their ETags allow for
+    ("user_elements", "updated_at", "TIMESTAMP"),
+]
+
+# Rows read per query when filling in a new column
+BACKFILL_BATCH_SIZE = 500
+
+# Serializes workers that start at once against the same Postgres database
+_POSTGRES_LOCK_ID = 4200417
+
+
+def _backfill_layout_stats(conn: Connection) -> None:
+    """Derive the stat columns of layouts saved before they existed"""
+    layouts = Layout.__table__
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(layouts.c.layout_id, layouts.c.layout)
+            .where(layouts.c.layout_id > last_id)
+            .order_by(layouts.c.layout_id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        for layout_id, document in rows:
+            # A core update, so the layout's version isn't bumped
+            conn.execute(
+                update(layouts)
+                .where(layouts.c.layout_id == layout_id)
+                .values(**compute_layout_stats((document or {}).get("elements") or []))
+            )
+        last_id = rows[-1][0]
+
+
+# Run after the column they fill in has been added
+_BACKFILLS: Dict[str, Callable[[Connection], None]] = {
+    "layouts.element_count": _backfill_layout_stats,
+}
+
+
+@contextmanager
+def _locked_transaction(conn: Connection) -> Iterator[None]:
+    """One transaction holding a database-wide lock, so workers starting
+    together upgrade one after another and a failed upgrade leaves nothing
+    half-done"""
+    if conn.dialect.name != "sqlite":
+        with conn.begin():
+            if conn.dialect.name == "postgresql":
+                conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _POSTGRES_LOCK_ID})
+            yield
+        return
+    # pysqlite only opens a transaction before DML, so ALTER TABLE would
+    # commit as it runs. Take the write lock up front instead
+    driver = conn.connection.driver_connection
+    isolation_level = driver.isolation_level
+    driver.isolation_level = None
+    try:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+    finally:
+        driver.isolation_level = isolation_level
+
+
+def _upgrade(conn: Connection) -> List[str]:
+    inspector = inspect(conn)
+    added = []
+    for table, column, ddl in _COLUMNS:
+        if column not in {existing["name"] for existing in inspector.get_columns(table)}:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+            added.append(f"{table}.{column}")
+    for column in added:
+        if column in _BACKFILLS:
+            _BACKFILLS[column](conn)
+    # Indexes declared on tables that already existed
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(conn)
+                added.append(index.name)
+    return added
+
+
+def upgrade_schema(engine: Engine) -> None:
+    """Add the columns and indexes this code expects to tables created by
+    an older version. Safe to run on every start: each is only added if it
+    is missing, in one locked transaction per run.
+    """
+    try:
+        with engine.connect() as conn, _locked_transaction(conn):
+            added = _upgrade(conn)
+    except DBAPIError as e:
+        print(f"Error upgrading database schema: {e}")
+        return
+    if added:
+        print(f"Upgraded database schema, added {', '.join(added)}")
\ No newline at end of file
@@ -0,0 +1,172 @@
+import math
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .config import SPATIAL_INDEX_CELL_SIZE, SPATIAL_INDEX_CACHE_SIZE
+from .geometry import element_bounds
+from ..schemas.layout import LayoutOperation
+
+Bounds = Tuple[float, float, float, float]
+
+# Elements covering more cells than this (or with non-finite bounds) are kept
+# in a side list checked by every query, instead of in each of their cells
+MAX_CELLS_PER_ELEMENT = 1024
+
+
+class GridIndex:
+    """Uniform-grid spatial index over a layout's elements.
+
+    Each element is registered in every cell its bounding box touches, so a
+    bounding-box query only inspects the cells under the viewport, or only
+    the occupied cells when the viewport covers more cells than that.
+    Results are returned in the layout's stacking order.
+    """
+
+    def __init__(self, elements: Iterable[Dict[str, Any]] = (), cell_size: int = SPATIAL_INDEX_CELL_SIZE):
+        self.cell_size = cell_size
+        self._cells: Dict[Tuple[int, int], Set[str]] = {}
+        self._entries: Dict[str, Tuple[Bounds, int, Dict[str, Any]]] = {}
+        self._large: Set[str] = set()
+        self._next_order = 0
+        for element in elements:
+            self.insert(element)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _cell_span(self, bounds: Bounds) -> Tuple[int, int, int, int]:
+        size = self.cell_size
+        return tuple(math.floor(value / size) for value in bounds)
+
+    def _cell_count(self, span: Tuple[int, int, int, int]) -> int:
+        return max(0, span[2] - span[0] + 1) * max(0, span[3] - span[1] + 1)
+
+    def _cell_range(self, span: Tuple[int, int, int, int]):
+        for cx in range(span[0], span[2] + 1):
+            for cy in range(span[1], span[3] + 1):
+                yield cx, cy
+
+    def _is_large(self, bounds: Bounds) -> bool:
+        return not all(math.isfinite(value) for value in bounds) or (
+            self._cell_count(self._cell_span(bounds)) > MAX_CELLS_PER_ELEMENT
+        )
+
+    def insert(self, element: Dict[str, Any], order: Optional[int] = None) -> None:
+        key = str(element.get("id"))
+        if key in self._entries:
+            order = self._entries[key][1] if order is None else order
+            self.remove(key)
+        if order is None:
+            order = self._next_order
+        self._next_order = max(self._next_order, order + 1)
+
+        bounds = element_bounds(element)
+        self._entries[key] = (bounds, order, element)
+        if self._is_large(bounds):
+            self._large.add(key)
+            return
+        for cell in self._cell_range(self._cell_span(bounds)):
+            self._cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        if key in self._large:
+            self._large.discard(key)
+            return
+        for cell in self._cell_range(self._cell_span(entry[0])):
+            members = self._cells.get(cell)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del self._cells[cell]
+
+    def query(self, bounds: Bounds) -> List[Dict[str, Any]]:
+        """Return the elements whose bounds intersect ``bounds``, which must
+        be finite"""
+        min_x, min_y, max_x, max_y = bounds
+        candidates: Set[str] = set(self._large)
+        span = self._cell_span(bounds)
+        if self._cell_count(span) > len(self._cells):
+            # Cheaper to scan what's occupied than every cell in the viewport
+            for (cx, cy), members in self._cells.items():
+                if span[0] <= cx <= span[2] and span[1] <= cy <= span[3]:
+                    candidates.update(members)
+        else:
+            for cell in self._cell_range(span):
+                candidates.update(self._cells.get(cell, ()))
+
+        hits = []
+        for key in candidates:
+            (e_min_x, e_min_y, e_max_x, e_max_y), order, element = self._entries[key]
+            if e_min_x <= max_x and e_max_x >= min_x and e_min_y <= max_y and e_max_y >= min_y:
+                hits.append((order, element))
+        hits.sort(key=lambda hit: hit[0])
+        return [element for _, element in hits]
+
+
+class SpatialIndexCache:
+    """LRU cache of per-layout grid indexes, tagged with the layout version"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._indexes: "OrderedDict[int, Tuple[int, GridIndex]]" = OrderedDict()
+
+    def get(self, layout_id: int, version: int) -> Optional[GridIndex]:
+        cached = self._indexes.get(layout_id)
+        if cached is None or cached[0] != version:
+            return None
+        self._indexes.move_to_end(layout_id)
+        return cached[1]
+
+    def build(self, layout_id: int, version: int, elements: Sequence[Dict[str, Any]]) -> GridIndex:
+        index = GridIndex(elements)
+        self._store(layout_id, version, index)
+        return index
+
+    def apply(
+        self,
+        layout_id: int,
+        old_version: int,
+        new_version: int,
+        operations: Sequence[LayoutOperation],
+        elements: Sequence[Dict[str, Any]],
+    ) -> None:
+        """Bring a cached index up to date after a patch.
+
+        Touched elements are re-inserted from the patched element list. Ops
+        that change stacking order fall back to a rebuild from that list,
+        which still avoids a database read on the next query.
+        """
+        cached = self._indexes.get(layout_id)
+        if cached is None or cached[0] != old_version:
+            self.invalidate(layout_id)
+            return
+
+        index = cached[1]
+        if any(operation.index is not None for operation in operations):
+            self._store(layout_id, new_version, GridIndex(elements, index.cell_size))
+            return
+
+        by_key = {str(element.get("id")): element for element in elements}
+        for operation in operations:
+            key = str(operation.id)
+            if operation.op == "remove":
+                index.remove(key)
+            elif key in by_key:
+                index.insert(by_key[key])
+        self._store(layout_id, new_version, index)
+
+    def invalidate(self, layout_id: int) -> None:
+        self._indexes.pop(layout_id, None)
+
+    def _store(self, layout_id: int, version: int, index: GridIndex) -> None:
+        self._indexes[layout_id] = (version, index)
+        self._indexes.move_to_end(layout_id)
+        while len(self._indexes) > self.max_size:
+            self._indexes.popitem(last=False)
+
+
+# Global instance
+spatial_index_cache = SpatialIndexCache(max_size=SPATIAL_INDEX_CACHE_SIZE)
@@ -1,31 +1,265 @@
-import boto3
+import asyncio
+import base64
+import hashlib
+import json
 import os
-from botocore.exceptions import ClientError
-from typing import Optional
 import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from typing import AsyncIterator, List, NamedTuple, Optional
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
 from fastapi import UploadFile
 
-class S3StorageService:
+from .config import (
+    MINIO_ENDPOINT,
+    MINIO_PUBLIC_ENDPOINT,
+    MINIO_ACCESS_KEY,
+    MINIO_SECRET_KEY,
+    MINIO_BUCKET,
+    MINIO_SECURE,
+    STORAGE_BACKEND,
+    STORAGE_MAX_CONCURRENT_UPLOADS,
+    STORAGE_IO_WORKERS,
+    LOCAL_STORAGE_DIR,
+    LOCAL_STORAGE_PUBLIC_URL,
+)
+
+# Bytes read from the client per iteration while streaming an upload
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+# S3 multipart parts must be at least 5MB (except the last one)
+MULTIPART_PART_SIZE = 5 * 1024 * 1024
+# S3 accepts at most this many keys per list or delete_objects call
+LIST_PAGE_SIZE = 1000
+DELETE_BATCH_SIZE = 1000
+# Object keys are derived from their content, so stored files never change in place
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class FileTooLargeError(Exception):
+    """Raised when an upload exceeds the allowed size while streaming"""
+
+    def __init__(self, max_size: int):
+        super().__init__(f"File exceeds maximum size of {max_size} bytes")
+        self.max_size = max_size
+
+
+class UploadResult(NamedTuple):
+    url: str
+    key: str
+    size: int
+    deduplicated: bool  # identical bytes were already stored; nothing was written
+
+
+class ObjectInfo(NamedTuple):
+    key: str
+    size: int
+    last_modified: datetime  # timezone-aware UTC
+
+
+class PresignNotSupported(Exception):
+    """Raised when the storage backend cannot issue direct upload URLs"""
+
+
+def content_key(filename: str, folder: str, digest: str) -> str:
+    """Content-addressed object key: the same bytes always map to the same key"""
+    file_extension = filename.split('.')[-1].lower() if '.' in filename else 'jpg'
+    return f"{folder}/{digest}.{file_extension}"
+
+
+class StorageBackend(ABC):
+    """Interface for where uploaded files live.
+
+    Backends do no I/O until first used, so importing the app never waits
+    on storage. Blocking calls run on a dedicated thread pool, and the number
+    of uploads in progress at once is capped per process.
+    """
+
     def __init__(self):
-        self.endpoint_url = f"http://{os.getenv('MINIO_ENDPOINT', 'localhost:9000')}"
-        self.public_endpoint_url = f"http://{os.getenv('MINIO_PUBLIC_ENDPOINT', 'localhost:9000')}"
-        self.access_key = os.getenv('MINIO_ACCESS_KEY', 'hostbuddy')
-        self.secret_key = os.getenv('MINIO_SECRET_KEY', 'hostbuddy123')
-        self.bucket_name = os.getenv('MINIO_BUCKET', 'images')
-        self.secure = os.getenv('MINIO_SECURE', 'false').lower() == 'true'
-        
-        # Initialize S3 client
-        self.s3_client = boto3.client(
-            's3',
-            endpoint_url=self.endpoint_url,
-            aws_access_key_id=self.access_key,
-            aws_secret_access_key=self.secret_key,
-            region_name='us-east-1'  # MinIO doesn't care about region
-        )
-        
-        # Create bucket if it doesn't exist
-        self._create_bucket_if_not_exists()
-    
+        self._executor = ThreadPoolExecutor(max_workers=STORAGE_IO_WORKERS, thread_name_prefix="storage-io")
+        self._upload_slots = asyncio.Semaphore(STORAGE_MAX_CONCURRENT_UPLOADS)
+        self.uploads = 0
+        self.bytes_uploaded = 0
+        self.dedup_hits = 0
+        self.bytes_deduplicated = 0
+
+    async def _run(self, func, *args, **kwargs):
+        """Run a blocking call on the storage I/O pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def upload_file(self, file: UploadFile, folder: str = "events", max_size: Optional[int] = None) -> Optional[UploadResult]:
+        """Store a file under a key derived from its SHA-256.
+
+        The object key has to be known before the first byte is sent, so the
+        digest is taken in a first pass over the spooled upload. If an object
+        with that key already exists the upload is skipped entirely.
+
+        Raises FileTooLargeError as soon as ``max_size`` is exceeded; other
+        failures are logged and reported as ``None``.
+        """
+        async with self._upload_slots:
+            digest, size = await self._hash_upload(file, max_size)
+            key = content_key(file.filename, folder, digest)
+
+            if await self.exists(key):
+                self.dedup_hits += 1
+                self.bytes_deduplicated += size
+                return UploadResult(self.public_url(key), key, size, True)
+
+            url = await self._upload_file(file, key, max_size)
+            if url is None:
+                return None
+            self.uploads += 1
+            self.bytes_uploaded += size
+            return UploadResult(url, key, size, False)
+
+    async def _hash_upload(self, file: UploadFile, max_size: Optional[int]):
+        """Hash an upload chunk by chunk and rewind it for the real transfer"""
+        hasher = hashlib.sha256()
+        total_size = 0
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            total_size += len(chunk)
+            if max_size is not None and total_size > max_size:
+                raise FileTooLargeError(max_size)
+            hasher.update(chunk)
+        await file.seek(0)
+        return hasher.hexdigest(), total_size
+
+    @abstractmethod
+    async def _upload_file(self, file: UploadFile, key: str, max_size: Optional[int]) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        """Whether an object is stored under a key"""
+
+    @abstractmethod
+    def public_url(self, key: str) -> str:
+        """Public URL for an object key"""
+
+    @abstractmethod
+    def key_from_url(self, file_url: str) -> str:
+        """Object key for a public URL"""
+
+    def owns_url(self, file_url: str) -> bool:
+        """Whether a URL points at an object in this storage"""
+        return file_url.startswith(self.public_url(""))
+
+    @abstractmethod
+    async def read_object(self, key: str) -> bytes:
+        """Read a whole object into memory"""
+
+    @abstractmethod
+    async def put_object(self, key: str, data: bytes, content_type: str, cache_control: Optional[str] = None) -> str:
+        """Store bytes under a key and return the public URL"""
+
+    async def presign_upload(self, key: str, content_type: str, size: int, sha256: str, expires_in: int) -> dict:
+        """Issue a direct-to-storage upload for exactly these bytes"""
+        raise PresignNotSupported()
+
+    async def object_info(self, key: str) -> Optional[dict]:
+        """Size, content type and SHA-256 (hex, if known) of a stored object"""
+        raise PresignNotSupported()
+
+    async def hash_object(self, key: str) -> str:
+        """SHA-256 (hex) of a stored object, read back in chunks"""
+        raise PresignNotSupported()
+
+    @abstractmethod
+    async def delete_file(self, file_url: str) -> bool:
+        """Delete a file using its URL"""
+
+    async def delete_files(self, file_urls: List[str]) -> bool:
+        """Delete several files"""
+        keys = [self.key_from_url(url) for url in file_urls]
+        return await self.delete_keys(keys) == len(keys)
+
+    @abstractmethod
+    async def delete_keys(self, keys: List[str]) -> int:
+        """Delete objects by key and return how many were deleted"""
+
+    @abstractmethod
+    def list_objects(self, prefix: str) -> AsyncIterator[List[ObjectInfo]]:
+        """Yield the objects under a prefix, a page at a time"""
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "uploads": self.uploads,
+            "bytes_uploaded": self.bytes_uploaded,
+            "dedup_hits": self.dedup_hits,
+            "bytes_deduplicated": self.bytes_deduplicated,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+class S3StorageService(StorageBackend):
+    def __init__(self):
+        super().__init__()
+        self.endpoint_url = f"http://{MINIO_ENDPOINT}"
+        self.public_endpoint_url = f"http://{MINIO_PUBLIC_ENDPOINT}"
+        self.access_key = MINIO_ACCESS_KEY
+        self.secret_key = MINIO_SECRET_KEY
+        self.bucket_name = MINIO_BUCKET
+        self.secure = MINIO_SECURE
+
+        # The clients and bucket are set up on first use, not at import time
+        self._s3_client = None
+        self._presign_client = None
+        self._bucket_ready = False
+        self._bucket_lock = asyncio.Lock()
+
+    @property
+    def s3_client(self):
+        if self._s3_client is None:
+            self._s3_client = boto3.client(
+                's3',
+                endpoint_url=self.endpoint_url,
+                aws_access_key_id=self.access_key,
+                aws_secret_access_key=self.secret_key,
+                region_name='us-east-1',  # MinIO doesn't care about region
+                config=Config(max_pool_connections=STORAGE_IO_WORKERS)
+            )
+        return self._s3_client
+
+    @property
+    def presign_client(self):
+        """Client that signs URLs for the public endpoint browsers reach.
+
+        SigV4 signs the content type, length and checksum headers along with
+        the URL, so the upload must match what was requested.
+        """
+        if self._presign_client is None:
+            self._presign_client = boto3.client(
+                's3',
+                endpoint_url=self.public_endpoint_url,
+                aws_access_key_id=self.access_key,
+                aws_secret_access_key=self.secret_key,
+                region_name='us-east-1',
+                config=Config(signature_version='s3v4')
+            )
+        return self._presign_client
+
+    async def _ensure_bucket(self) -> None:
+        """Create the bucket on first use"""
+        if self._bucket_ready:
+            return
+        async with self._bucket_lock:
+            if not self._bucket_ready:
+                await self._run(self._create_bucket_if_not_exists)
+                self._bucket_ready = True
+
     def _create_bucket_if_not_exists(self):
         """Create the bucket if it doesn't exist"""
         try:
@@ -46,57 +280,403 @@ class S3StorageService:
                         }
                     ]
                 }
-                import json
                 self.s3_client.put_bucket_policy(
                     Bucket=self.bucket_name,
                     Policy=json.dumps(bucket_policy)
                 )
             except ClientError as e:
                 print(f"Error creating bucket: {e}")
-    
-    async def upload_file(self, file: UploadFile, folder: str = "events") -> Optional[str]:
-        """Upload a file and return the public URL"""
+
+    def public_url(self, key: str) -> str:
+        return f"{self.public_endpoint_url}/{self.bucket_name}/{key}"
+
+    def key_from_url(self, file_url: str) -> str:
+        # URL format: http://minio:9000/images/events/<sha256>.jpg
+        return file_url.split(f"{self.bucket_name}/")[-1]
+
+    async def _upload_file(self, file: UploadFile, key: str, max_size: Optional[int]) -> Optional[str]:
+        """Read the file in chunks and switch to a multipart upload once it
+        outgrows a single part, so memory stays bounded to about one part"""
+        content_type = file.content_type or 'image/jpeg'
+
+        upload_id = None
+        parts = []
+        buffer = bytearray()
+        total_size = 0
+
         try:
-            # Generate unique filename
-            file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'jpg'
-            unique_filename = f"{folder}/{uuid.uuid4()}.{file_extension}"
-            
-            # Read file content
-            file_content = await file.read()
-            await file.seek(0)  # Reset file pointer
-            
-            # Upload to S3
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=unique_filename,
-                Body=file_content,
-                ContentType=file.content_type or 'image/jpeg'
-            )
-            
-            # Return public URL
-            public_url = f"{self.public_endpoint_url}/{self.bucket_name}/{unique_filename}"
-            return public_url
-            
+            await self._ensure_bucket()
+
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+
+                total_size += len(chunk)
+                if max_size is not None and total_size > max_size:
+                    raise FileTooLargeError(max_size)
+
+                buffer.extend(chunk)
+                if len(buffer) >= MULTIPART_PART_SIZE:
+                    if upload_id is None:
+                        upload_id = (await self._run(
+                            self.s3_client.create_multipart_upload,
+                            Bucket=self.bucket_name,
+                            Key=key,
+                            ContentType=content_type,
+                            CacheControl=IMMUTABLE_CACHE_CONTROL
+                        ))["UploadId"]
+                    parts.append(await self._upload_part(key, upload_id, len(parts) + 1, bytes(buffer)))
+                    buffer.clear()
+
+            if upload_id is None:
+                # Small file: a single request is cheaper than a multipart upload
+                await self._run(
+                    self.s3_client.put_object,
+                    Bucket=self.bucket_name,
+                    Key=key,
+                    Body=bytes(buffer),
+                    ContentType=content_type,
+                    CacheControl=IMMUTABLE_CACHE_CONTROL
+                )
+            else:
+                if buffer:
+                    parts.append(await self._upload_part(key, upload_id, len(parts) + 1, bytes(buffer)))
+                await self._run(
+                    self.s3_client.complete_multipart_upload,
+                    Bucket=self.bucket_name,
+                    Key=key,
+                    UploadId=upload_id,
+                    MultipartUpload={"Parts": parts}
+                )
+
+            return self.public_url(key)
+
+        except FileTooLargeError:
+            await self._abort_multipart(key, upload_id)
+            raise
         except Exception as e:
             print(f"Error uploading file: {e}")
+            await self._abort_multipart(key, upload_id)
             return None
-    
-    def delete_file(self, file_url: str) -> bool:
+
+    async def exists(self, key: str) -> bool:
+        await self._ensure_bucket()
+        try:
+            await self._run(self.s3_client.head_object, Bucket=self.bucket_name, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey", "NotFound"):
+                print(f"Error checking object: {e}")
+            return False
+
+    async def read_object(self, key: str) -> bytes:
+        await self._ensure_bucket()
+        response = await self._run(self.s3_client.get_object, Bucket=self.bucket_name, Key=key)
+        return await self._run(response["Body"].read)
+
+    async def put_object(self, key: str, data: bytes, content_type: str, cache_control: Optional[str] = None) -> str:
+        await self._ensure_bucket()
+        extra = {"CacheControl": cache_control} if cache_control else {}
+        await self._run(
+            self.s3_client.put_object,
+            Bucket=self.bucket_name,
+            Key=key,
+            Body=data,
+            ContentType=content_type,
+            **extra
+        )
+        return self.public_url(key)
+
+    async def presign_upload(self, key: str, content_type: str, size: int, sha256: str, expires_in: int) -> dict:
+        await self._ensure_bucket()
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode()
+        url = await self._run(
+            self.presign_client.generate_presigned_url,
+            "put_object",
+            Params={
+                "Bucket": self.bucket_name,
+                "Key": key,
+                "ContentType": content_type,
+                "ContentLength": size,
+                "ChecksumSHA256": checksum,
+                "CacheControl": IMMUTABLE_CACHE_CONTROL,
+            },
+            ExpiresIn=expires_in
+        )
+        return {
+            "method": "PUT",
+            "url": url,
+            # The client must send exactly these headers; they are part of the signature
+            "headers": {
+                "Content-Type": content_type,
+                "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+                "x-amz-checksum-sha256": checksum,
+            },
+        }
+
+    async def object_info(self, key: str) -> Optional[dict]:
+        await self._ensure_bucket()
+        try:
+            response = await self._run(
+                self.s3_client.head_object,
+                Bucket=self.bucket_name,
+                Key=key,
+                ChecksumMode="ENABLED"
+            )
+        except ClientError:
+            return None
+        checksum = response.get("ChecksumSHA256")
+        return {
+            "size": response["ContentLength"],
+            "content_type": response.get("ContentType"),
+            "sha256": base64.b64decode(checksum).hex() if checksum else None,
+        }
+
+    async def hash_object(self, key: str) -> str:
+        response = await self._run(self.s3_client.get_object, Bucket=self.bucket_name, Key=key)
+        body = response["Body"]
+        hasher = hashlib.sha256()
+        try:
+            while True:
+                chunk = await self._run(body.read, UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+        finally:
+            body.close()
+        return hasher.hexdigest()
+
+    async def _upload_part(self, key: str, upload_id: str, part_number: int, body: bytes) -> dict:
+        """Upload one multipart part and return its completion entry"""
+        response = await self._run(
+            self.s3_client.upload_part,
+            Bucket=self.bucket_name,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=body
+        )
+        return {"ETag": response["ETag"], "PartNumber": part_number}
+
+    async def _abort_multipart(self, key: str, upload_id: Optional[str]) -> None:
+        """Discard the parts of an unfinished multipart upload"""
+        if upload_id is None:
+            return
+        try:
+            await self._run(
+                self.s3_client.abort_multipart_upload,
+                Bucket=self.bucket_name,
+                Key=key,
+                UploadId=upload_id
+            )
+        except Exception as e:
+            print(f"Error aborting multipart upload: {e}")
+
+    async def delete_file(self, file_url: str) -> bool:
         """Delete a file using its URL"""
         try:
-            # Extract key from URL
-            # URL format: http://minio:9000/images/events/uuid.jpg
-            key = file_url.split(f"{self.bucket_name}/")[-1]
-            
-            self.s3_client.delete_object(
+            await self._run(
+                self.s3_client.delete_object,
                 Bucket=self.bucket_name,
-                Key=key
+                Key=self.key_from_url(file_url)
             )
             return True
-            
+
         except Exception as e:
             print(f"Error deleting file: {e}")
             return False
 
-# Global instance
-storage_service = S3StorageService()
\ No newline at end of file
+    async def delete_keys(self, keys: List[str]) -> int:
+        """Delete objects in batches of up to 1000 keys per request"""
+        deleted = 0
+        for start in range(0, len(keys), DELETE_BATCH_SIZE):
+            batch = keys[start:start + DELETE_BATCH_SIZE]
+            try:
+                response = await self._run(
+                    self.s3_client.delete_objects,
+                    Bucket=self.bucket_name,
+                    Delete={
+                        "Objects": [{"Key": key} for key in batch],
+                        "Quiet": True
+                    }
+                )
+                errors = response.get("Errors", [])
+                for error in errors:
+                    print(f"Error deleting {error.get('Key')}: {error.get('Message')}")
+                deleted += len(batch) - len(errors)
+
+            except Exception as e:
+                print(f"Error deleting files: {e}")
+        return deleted
+
+    async def list_objects(self, prefix: str) -> AsyncIterator[List[ObjectInfo]]:
+        await self._ensure_bucket()
+        params = {"Bucket": self.bucket_name, "Prefix": prefix, "MaxKeys": LIST_PAGE_SIZE}
+        while True:
+            response = await self._run(self.s3_client.list_objects_v2, **params)
+            yield [
+                ObjectInfo(item["Key"], item["Size"], item["LastModified"])
+                for item in response.get("Contents", [])
+            ]
+            if not response.get("IsTruncated"):
+                break
+            params["ContinuationToken"] = response["NextContinuationToken"]
+
+
+class LocalStorageService(StorageBackend):
+    """Stores files under a local directory and serves them through the API.
+
+    Meant for single-node deployments and development without MinIO.
+    """
+
+    def __init__(self, root: str = LOCAL_STORAGE_DIR, public_base_url: str = LOCAL_STORAGE_PUBLIC_URL):
+        super().__init__()
+        self.root = Path(root).resolve()
+        self.public_base_url = public_base_url.rstrip("/")
+
+    def public_url(self, key: str) -> str:
+        return f"{self.public_base_url}/{key}"
+
+    def key_from_url(self, file_url: str) -> str:
+        return file_url[len(self.public_base_url):].lstrip("/") if file_url.startswith(self.public_base_url) else file_url
+
+    def path_for_key(self, key: str) -> Optional[Path]:
+        """Resolve an object key to a path inside the storage root, or None if it escapes it"""
+        path = (self.root / key).resolve()
+        if path != self.root and self.root not in path.parents:
+            return None
+        return path
+
+    @staticmethod
+    def _temp_path(path: Path) -> Path:
+        # Unique per write: uploads of the same bytes share one key
+        return path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+
+    async def _upload_file(self, file: UploadFile, key: str, max_size: Optional[int]) -> Optional[str]:
+        path = self.path_for_key(key)
+        # Write to a temporary name and rename, so readers never see a partial file
+        tmp_path = self._temp_path(path)
+
+        try:
+            await self._run(path.parent.mkdir, parents=True, exist_ok=True)
+            handle = await self._run(open, tmp_path, "wb")
+            try:
+                total_size = 0
+                while True:
+                    chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    total_size += len(chunk)
+                    if max_size is not None and total_size > max_size:
+                        raise FileTooLargeError(max_size)
+                    await self._run(handle.write, chunk)
+            finally:
+                await self._run(handle.close)
+            await self._run(os.replace, tmp_path, path)
+            return self.public_url(key)
+
+        except FileTooLargeError:
+            await self._run(tmp_path.unlink, missing_ok=True)
+            raise
+        except Exception as e:
+            print(f"Error uploading file: {e}")
+            await self._run(tmp_path.unlink, missing_ok=True)
+            return None
+
+    def _write_atomic(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._temp_path(path)
+        try:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    async def exists(self, key: str) -> bool:
+        path = self.path_for_key(key)
+        return path is not None and await self._run(path.is_file)
+
+    async def read_object(self, key: str) -> bytes:
+        path = self.path_for_key(key)
+        if path is None:
+            raise FileNotFoundError(key)
+        return await self._run(path.read_bytes)
+
+    async def put_object(self, key: str, data: bytes, content_type: str, cache_control: Optional[str] = None) -> str:
+        # Content type and caching headers are decided when the file is served
+        path = self.path_for_key(key)
+        if path is None:
+            raise ValueError(f"Invalid storage key: {key}")
+        await self._run(self._write_atomic, path, data)
+        return self.public_url(key)
+
+    async def delete_file(self, file_url: str) -> bool:
+        """Delete a file using its URL"""
+        return await self.delete_keys([self.key_from_url(file_url)]) == 1
+
+    def _delete_paths(self, keys: List[str]) -> int:
+        deleted = 0
+        for key in keys:
+            path = self.path_for_key(key)
+            if path is None:
+                continue
+            try:
+                # Like S3, deleting a missing object succeeds: variants may
+                # never have been generated for an image
+                path.unlink(missing_ok=True)
+                deleted += 1
+            except Exception as e:
+                print(f"Error deleting file: {e}")
+        return deleted
+
+    async def delete_keys(self, keys: List[str]) -> int:
+        deleted = 0
+        for start in range(0, len(keys), DELETE_BATCH_SIZE):
+            deleted += await self._run(self._delete_paths, keys[start:start + DELETE_BATCH_SIZE])
+        return deleted
+
+    def _scan(self, prefix: str) -> List[ObjectInfo]:
+        base = self.path_for_key(prefix) if prefix else self.root
+        if base is None or not base.is_dir():
+            return []
+        objects = []
+        for directory, _, filenames in os.walk(base):
+            for filename in filenames:
+                path = Path(directory) / filename
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    # A temporary file renamed by a finishing upload
+                    continue
+                objects.append(ObjectInfo(
+                    path.relative_to(self.root).as_posix(),
+                    stat.st_size,
+                    datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+                ))
+        return objects
+
+    async def list_objects(self, prefix: str) -> AsyncIterator[List[ObjectInfo]]:
+        objects = await self._run(self._scan, prefix)
+        for start in range(0, len(objects), LIST_PAGE_SIZE):
+            yield objects[start:start + LIST_PAGE_SIZE]
+
+
+_storage_service: Optional[StorageBackend] = None
+
+
+def get_storage_service() -> StorageBackend:
+    """Return the configured storage backend, creating it on first use"""
+    global _storage_service
+    if _storage_service is None:
+        if STORAGE_BACKEND == "local":
+            _storage_service = LocalStorageService()
+        else:
+            _storage_service = S3StorageService()
+    return _storage_service
+
+
+def shutdown_storage_service() -> None:
+    if _storage_service is not None:
+        _storage_service.shutdown()
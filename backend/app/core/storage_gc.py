@@ -0,0 +1,222 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Callable, List, Optional, Sequence, Set
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import STORAGE_GC_PREFIXES, STORAGE_GC_GRACE_SECONDS
+from .database import open_db_session
+from .image_refs import image_keys
+from .images import IMAGE_VARIANT_WIDTHS, VARIANT_FORMATS, variant_key
+from .storage import ObjectInfo, get_storage_service
+from .thumbnails import thumbnail_keys
+from ..models.models import Event, StoredObject
+
+# Rows read per query while collecting references
+REFERENCE_BATCH_SIZE = 1000
+# Orphan keys kept in a report so a dry run can be eyeballed
+REPORT_SAMPLE_SIZE = 20
+
+ReferenceSource = Callable[[AsyncSession], AsyncIterator[str]]
+
+
+class GarbageCollectionRunning(Exception):
+    """Raised when a collection is requested while another one is in progress"""
+
+
+def _with_variants(key: str) -> List[str]:
+    return [key] + [variant_key(key, width, fmt) for width in IMAGE_VARIANT_WIDTHS for fmt in VARIANT_FORMATS]
+
+
+async def event_image_keys(db: AsyncSession) -> AsyncIterator[str]:
+    """Keys of every event image and its variants"""
+    last_id = 0
+    while True:
+        rows = (await db.execute(
+            select(Event.event_id, Event.images)
+            .where(Event.event_id > last_id)
+            .order_by(Event.event_id)
+            .limit(REFERENCE_BATCH_SIZE)
+        )).all()
+        if not rows:
+            return
+        for _, images in rows:
+            if isinstance(images, list):
+                for key in image_keys(images):
+                    for name in _with_variants(key):
+                        yield name
+        last_id = rows[-1][0]
+
+
+async def referenced_stored_objects(db: AsyncSession) -> AsyncIterator[str]:
+    """Keys the reference table still counts as in use"""
+    keys = await db.scalars(select(StoredObject.object_key).where(StoredObject.ref_count > 0))
+    for key in keys:
+        for name in _with_variants(key):
+            yield name
+
+
+class StorageGarbageCollector:
+    """Deletes stored objects that nothing in the database points at.
+
+    A run collects every referenced key up front, then lists the configured
+    prefixes page by page and deletes unreferenced objects older than the
+    grace period in batches of up to 1000 keys. The grace period keeps
+    uploads that haven't been attached to an event yet. Just before each
+    batch is deleted it is re-checked against the reference table, in case
+    an upload deduplicated onto one of the objects since the scan.
+    """
+
+    def __init__(self, prefixes: Sequence[str], grace_seconds: int):
+        self.prefixes = list(prefixes)
+        self.grace_seconds = grace_seconds
+        self._reference_sources: List[ReferenceSource] = [event_image_keys, referenced_stored_objects, thumbnail_keys]
+        self._running = False
+        self._periodic_task: Optional[asyncio.Task] = None
+
+        self.progress: Optional[dict] = None
+        self.last_report: Optional[dict] = None
+        self.runs = 0
+        self.total_deleted = 0
+
+    def add_reference_source(self, source: ReferenceSource) -> None:
+        """Register another async generator of keys that must be kept"""
+        self._reference_sources.append(source)
+
+    async def _referenced_keys(self, db: AsyncSession) -> Set[str]:
+        referenced = set()
+        for source in self._reference_sources:
+            async for key in source(db):
+                referenced.add(key)
+        return referenced
+
+    async def _still_unreferenced(self, db: AsyncSession, candidates: List[ObjectInfo]) -> List[ObjectInfo]:
+        in_use = set((await db.scalars(
+            select(StoredObject.object_key).where(
+                StoredObject.object_key.in_([obj.key for obj in candidates]),
+                StoredObject.ref_count > 0
+            )
+        )).all())
+        return [obj for obj in candidates if obj.key not in in_use]
+
+    async def run(self, dry_run: bool = True) -> dict:
+        """Run one collection and return its report"""
+        if self._running:
+            raise GarbageCollectionRunning()
+        self._running = True
+
+        storage = get_storage_service()
+        started = time.perf_counter()
+        report = {
+            "dry_run": dry_run,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "finished_at": None,
+            "phase": "references",
+            "prefixes": self.prefixes,
+            "grace_seconds": self.grace_seconds,
+            "referenced": 0,
+            "pages": 0,
+            "listed": 0,
+            "skipped_recent": 0,
+            "orphans": 0,
+            "orphan_bytes": 0,
+            "deleted": 0,
+            "delete_errors": 0,
+            "orphan_sample": [],
+            "reference_seconds": 0.0,
+            "list_seconds": 0.0,
+            "duration_seconds": 0.0,
+            "error": None,
+        }
+        self.progress = report
+
+        try:
+            async with open_db_session() as db:
+                referenced = await self._referenced_keys(db)
+                report["referenced"] = len(referenced)
+                report["reference_seconds"] = time.perf_counter() - started
+                report["phase"] = "listing"
+
+                cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.grace_seconds)
+                for prefix in self.prefixes:
+                    async for page in storage.list_objects(prefix):
+                        report["pages"] += 1
+                        report["listed"] += len(page)
+
+                        orphans = [obj for obj in page if obj.key not in referenced]
+                        candidates = [obj for obj in orphans if obj.last_modified <= cutoff]
+                        report["skipped_recent"] += len(orphans) - len(candidates)
+                        if not candidates:
+                            continue
+
+                        candidates = await self._still_unreferenced(db, candidates)
+                        report["orphans"] += len(candidates)
+                        report["orphan_bytes"] += sum(obj.size for obj in candidates)
+                        room = REPORT_SAMPLE_SIZE - len(report["orphan_sample"])
+                        report["orphan_sample"].extend(obj.key for obj in candidates[:room])
+
+                        if dry_run or not candidates:
+                            continue
+
+                        keys = [obj.key for obj in candidates]
+                        deleted = await storage.delete_keys(keys)
+                        report["deleted"] += deleted
+                        report["delete_errors"] += len(keys) - deleted
+                        # Drop bookkeeping rows for objects that are gone
+                        await db.execute(
+                            delete(StoredObject).where(
+                                StoredObject.object_key.in_(keys),
+                                StoredObject.ref_count <= 0
+                            )
+                        )
+                        await db.commit()
+
+            report["list_seconds"] = time.perf_counter() - started - report["reference_seconds"]
+            report["phase"] = "done"
+        except Exception as e:
+            print(f"Error collecting storage garbage: {e}")
+            report["phase"] = "failed"
+            report["error"] = str(e)
+        finally:
+            report["finished_at"] = datetime.now(timezone.utc).isoformat()
+            report["duration_seconds"] = time.perf_counter() - started
+            self.runs += 1
+            self.total_deleted += report["deleted"]
+            self.last_report = report
+            self.progress = None
+            self._running = False
+
+        return report
+
+    async def _run_periodically(self, interval: int, dry_run: bool) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.run(dry_run=dry_run)
+            except GarbageCollectionRunning:
+                pass
+
+    def start_periodic(self, interval: int, dry_run: bool) -> None:
+        if self._periodic_task is None:
+            self._periodic_task = asyncio.create_task(self._run_periodically(interval, dry_run))
+
+    def stop(self) -> None:
+        if self._periodic_task is not None:
+            self._periodic_task.cancel()
+            self._periodic_task = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self._running,
+            "periodic": self._periodic_task is not None,
+            "runs": self.runs,
+            "total_deleted": self.total_deleted,
+            "progress": self.progress,
+            "last_report": self.last_report,
+        }
+
+
+# Global instance
+storage_gc = StorageGarbageCollector(prefixes=STORAGE_GC_PREFIXES, grace_seconds=STORAGE_GC_GRACE_SECONDS)
@@ -0,0 +1,163 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import re
+from typing import AsyncIterator, Dict, Optional, Set
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import async_engine, open_db_session
+from .image_refs import sync_thumbnail_ref
+from .storage import IMMUTABLE_CACHE_CONTROL, get_storage_service, shutdown_storage_service
+from ..models.models import StoredObject, UserElement
+
+THUMBNAIL_FOLDER = "thumbnails"
+# Rows handled per transaction when moving inline thumbnails to storage
+MIGRATION_BATCH_SIZE = 100
+
+_DATA_URL = re.compile(r"^data:image/(png|jpeg|jpg|gif|webp);base64,", re.IGNORECASE)
+_EXTENSIONS = {"jpeg": "jpg"}
+
+# Thumbnail column without inline base64 payloads, for listings. Rows that
+# still hold a data URL read as NULL until they have been moved to storage
+thumbnail_url_column = case(
+    (UserElement.thumbnail.like("data:%"), None),
+    else_=UserElement.thumbnail
+).label("thumbnail")
+
+
+async def store_thumbnail(thumbnail: Optional[str]) -> Optional[str]:
+    """Move a base64 data URL thumbnail to object storage and return its URL.
+
+    Objects are keyed by content hash, so identical thumbnails are stored
+    once, and are served with long-lived cache headers. Anything that isn't
+    an image data URL is returned unchanged, as is the data URL itself if
+    storage fails, so saving an element never fails because of its preview.
+    """
+    if not thumbnail:
+        return thumbnail
+    match = _DATA_URL.match(thumbnail)
+    if not match:
+        return thumbnail
+
+    try:
+        data = base64.b64decode(thumbnail[match.end():], validate=True)
+    except (binascii.Error, ValueError):
+        return thumbnail
+
+    subtype = match.group(1).lower()
+    key = f"{THUMBNAIL_FOLDER}/{hashlib.sha256(data).hexdigest()}.{_EXTENSIONS.get(subtype, subtype)}"
+    storage = get_storage_service()
+    try:
+        if not await storage.exists(key):
+            await storage.put_object(key, data, f"image/{'jpeg' if subtype == 'jpg' else subtype}", cache_control=IMMUTABLE_CACHE_CONTROL)
+        return storage.public_url(key)
+    except Exception as e:
+        print(f"Error storing thumbnail: {e}")
+        return thumbnail
+
+
+async def thumbnail_keys(db: AsyncSession) -> AsyncIterator[str]:
+    """Storage keys of every stored thumbnail, for garbage collection"""
+    storage = get_storage_service()
+    last_id = 0
+    while True:
+        rows = (await db.execute(
+            select(UserElement.element_id, thumbnail_url_column)
+            .where(UserElement.element_id > last_id)
+            .order_by(UserElement.element_id)
+            .limit(MIGRATION_BATCH_SIZE * 10)
+        )).all()
+        if not rows:
+            return
+        for _, url in rows:
+            if url and storage.owns_url(url):
+                yield storage.key_from_url(url)
+        last_id = rows[-1][0]
+
+
+async def migrate_inline_thumbnails() -> dict:
+    """Move every thumbnail still stored as base64 in its row to storage and
+    recount the references held on stored thumbnails.
+
+    Meant to be run once, with ``python -m app.core.thumbnails`` or through
+    the internal endpoint, not by every worker. A row is only switched to its
+    URL if it still holds the data URL that was read, and counts are
+    recomputed from the rows, so an overlapping run counts nothing twice.
+    """
+    migrated = 0
+    failed = 0
+    last_id = 0
+    async with open_db_session() as db:
+        while True:
+            rows = (await db.execute(
+                select(UserElement.element_id, UserElement.thumbnail)
+                .where(UserElement.element_id > last_id, UserElement.thumbnail.like("data:%"))
+                .order_by(UserElement.element_id)
+                .limit(MIGRATION_BATCH_SIZE)
+            )).all()
+            if not rows:
+                break
+            for element_id, thumbnail in rows:
+                url = await store_thumbnail(thumbnail)
+                if url == thumbnail:
+                    failed += 1
+                    continue
+                result = await db.execute(
+                    update(UserElement)
+                    .where(UserElement.element_id == element_id, UserElement.thumbnail == thumbnail)
+                    .values(thumbnail=url)
+                )
+                if result.rowcount == 1:
+                    await sync_thumbnail_ref(db, None, url)
+                    migrated += 1
+            last_id = rows[-1][0]
+            await db.commit()
+        recounted = await recount_thumbnail_refs(db)
+    return {"migrated": migrated, "failed": failed, "recounted": recounted}
+
+
+async def recount_thumbnail_refs(db: AsyncSession) -> int:
+    """Set the ref_count of every stored thumbnail to the number of elements
+    using it, covering rows moved to storage before thumbnails were counted"""
+    storage = get_storage_service()
+    urls: Dict[str, Set[str]] = {}
+    for url in (await db.scalars(
+        select(thumbnail_url_column).where(UserElement.thumbnail.is_not(None)).distinct()
+    )).all():
+        if url and storage.owns_url(url):
+            urls.setdefault(storage.key_from_url(url), set()).add(url)
+
+    keys = list(urls)
+    for start in range(0, len(keys), MIGRATION_BATCH_SIZE):
+        batch = keys[start:start + MIGRATION_BATCH_SIZE]
+        known = set((await db.scalars(
+            select(StoredObject.object_key).where(StoredObject.object_key.in_(batch))
+        )).all())
+        db.add_all([StoredObject(object_key=key, ref_count=0) for key in batch if key not in known])
+        await db.flush()
+        for key in batch:
+            # One statement per key, so a concurrent save can't slip between
+            # the count and the write
+            await db.execute(
+                update(StoredObject)
+                .where(StoredObject.object_key == key)
+                .values(ref_count=select(func.count()).where(UserElement.thumbnail.in_(urls[key])).scalar_subquery())
+            )
+        await db.commit()
+    return len(keys)
+
+
+async def _main() -> None:
+    try:
+        print(await migrate_inline_thumbnails())
+    finally:
+        shutdown_storage_service()
+        if async_engine is not None:
+            await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
\ No newline at end of file
@@ -3,11 +3,22 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
 from .api.v1.api import api_router
-from .core.database import engine
+from .core.collab import collab_hub
+from .core.database import engine, async_engine
+from .core.event_search import install_event_search
+from .core.hashing import hashing_service
+from .core.storage import shutdown_storage_service
+from .core.config import STORAGE_GC_INTERVAL_SECONDS, STORAGE_GC_DRY_RUN
+from .core.images import image_variant_service
+from .core.schema_upgrade import upgrade_schema
+from .core.layout_render import layout_render_service
+from .core.storage_gc import storage_gc
 from .models.models import Base
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
+install_event_search(engine)
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -23,7 +34,7 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
     allow_headers=["*"],
 )
 
@@ -41,6 +52,26 @@ async def root():
     }
 
 
+@app.on_event("startup")
+async def startup_event():
+    """Start optional background jobs"""
+    if STORAGE_GC_INTERVAL_SECONDS > 0:
+        storage_gc.start_periodic(STORAGE_GC_INTERVAL_SECONDS, dry_run=STORAGE_GC_DRY_RUN)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release background worker pools and database connections"""
+    await collab_hub.shutdown()
+    hashing_service.shutdown()
+    storage_gc.stop()
+    image_variant_service.shutdown()
+    layout_render_service.shutdown()
+    shutdown_storage_service()
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
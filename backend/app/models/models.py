@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Date, Time, JSON
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Text, Date, Time, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -39,6 +39,12 @@ class Event(Base):
     # Relationships
     user = relationship("User", back_populates="events")
     layouts = relationship("Layout", back_populates="event", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        Index("ix_events_user_id_created_at_event_id", "user_id", "created_at", "event_id"),
+        Index("ix_events_user_id_start_date_event_id", "user_id", "start_date", "event_id"),
+        Index("ix_events_user_id_updated_at", "user_id", "updated_at"),
+    )
 
 
 class Layout(Base):
@@ -48,11 +54,46 @@ class Layout(Base):
     event_id = Column(Integer, ForeignKey("events.event_id"), nullable=False)
     name = Column(String(200), nullable=False)
     layout = Column(JSON)  # Use generic JSON instead of PostgreSQL-specific JSONB
+    version = Column(Integer, nullable=False, default=1)  # Bumped on every write, used for optimistic locking
+    # Stats derived from the elements on every write, so listings can skip the JSON
+    element_count = Column(Integer, nullable=False, default=0)
+    bounds_min_x = Column(Float)
+    bounds_min_y = Column(Float)
+    bounds_max_x = Column(Float)
+    bounds_max_y = Column(Float)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # Relationship
+    # Relationships
     event = relationship("Event", back_populates="layouts")
+    revisions = relationship("LayoutRevision", back_populates="layout", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        Index("ix_layouts_event_id_layout_id", "event_id", "layout_id"),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+
+class LayoutRevision(Base):
+    __tablename__ = "layout_revisions"
+    
+    revision_id = Column(Integer, primary_key=True, index=True)
+    layout_id = Column(Integer, ForeignKey("layouts.layout_id"), nullable=False)
+    version = Column(Integer, nullable=False)  # Layout.version written by this save
+    kind = Column(String(10), nullable=False)  # "snapshot" holds every element, "delta" the changes since the previous revision
+    chain_length = Column(Integer, nullable=False, default=0)  # deltas since the last snapshot, 0 for snapshots
+    data = Column(JSON, nullable=False)
+    name = Column(String(200), nullable=False)
+    element_count = Column(Integer, nullable=False, default=0)
+    size_bytes = Column(Integer, nullable=False, default=0)  # serialized size of data
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationship
+    layout = relationship("Layout", back_populates="revisions")
+    
+    __table_args__ = (
+        Index("ix_layout_revisions_layout_id_version", "layout_id", "version", unique=True),
+    )
 
 
 class UserElement(Base):
@@ -63,6 +104,27 @@ class UserElement(Base):
     name = Column(String(200), nullable=False)
     element_data = Column(JSON, nullable=False)  # Stores the element configuration (type, properties, etc.)
     thumbnail = Column(Text)  # Optional base64 encoded thumbnail for preview
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # NULL on rows saved before it existed
     
     # Relationship
-    user = relationship("User", back_populates="custom_elements")
\ No newline at end of file
+    user = relationship("User", back_populates="custom_elements")
+    
+    __table_args__ = (
+        Index("ix_user_elements_user_id_element_id", "user_id", "element_id"),
+    )
+
+
+class StoredObject(Base):
+    __tablename__ = "stored_objects"
+    
+    # Content-addressed storage key, e.g. events/<sha256>.jpg
+    object_key = Column(String(512), primary_key=True)
+    ref_count = Column(Integer, nullable=False, default=0)  # event_images rows and element thumbnails pointing here
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class EventImage(Base):
+    __tablename__ = "event_images"
+    
+    event_id = Column(Integer, ForeignKey("events.event_id"), primary_key=True)
+    object_key = Column(String(512), ForeignKey("stored_objects.object_key"), primary_key=True, index=True)
\ No newline at end of file
@@ -1,6 +1,8 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, computed_field
 from datetime import datetime, date, time
-from typing import Optional, List
+from typing import Optional, List, Dict
+
+from ..core.images import variant_map
 
 
 # Event Schemas
@@ -36,10 +38,27 @@ class EventResponse(EventBase):
     created_at: datetime
     updated_at: datetime
 
+    @computed_field
+    @property
+    def image_variants(self) -> Dict[str, Dict[str, Dict[str, str]]]:
+        """Resized copies of each image: url -> width -> format -> url"""
+        return {url: variant_map(url) for url in self.images}
+
     class Config:
         from_attributes = True
 
 
+class EventSearchHit(BaseModel):
+    event: EventResponse
+    score: float  # higher is a better match
+    highlights: Dict[str, Optional[str]]  # title/description/location, HTML-escaped with matches in <mark>
+
+
+class EventSearchResults(BaseModel):
+    items: List[EventSearchHit]
+    next_offset: Optional[int] = None  # pass back as ?offset= to fetch the next page
+
+
 # Image Upload Schema
 class ImageUpload(BaseModel):
     event_id: int
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Literal, Union
 
 
 # Layout Schemas
@@ -22,10 +22,36 @@ class LayoutUpdate(BaseModel):
     elements: Optional[List[Dict[str, Any]]] = None
 
 
+class LayoutOperation(BaseModel):
+    """A single element-level change, keyed by the element's id"""
+    op: Literal["add", "update", "remove", "move"]
+    id: Union[str, int]
+    element: Optional[Dict[str, Any]] = None  # full element for "add"
+    changes: Optional[Dict[str, Any]] = None  # fields to merge for "update"
+    x: Optional[Union[int, float]] = None  # new position for "move"
+    y: Optional[Union[int, float]] = None
+    index: Optional[int] = None  # stacking position for "add"/"move"
+
+
+class LayoutPatch(BaseModel):
+    version: int  # version the operations were made against
+    name: Optional[str] = None
+    title: Optional[str] = None
+    operations: List[LayoutOperation] = []
+
+
+class LayoutPatchAck(BaseModel):
+    layout_id: int
+    version: int
+    applied: int
+    updated_at: datetime
+
+
 class LayoutResponse(LayoutBase):
     layout_id: int
     id: Optional[int] = None  # Add id alias
     event_id: int
+    version: int
     created_at: datetime
     updated_at: datetime
 
@@ -0,0 +1,13 @@
+from pydantic import BaseModel, Field
+
+
+# Direct-to-storage upload schemas
+class PresignedUploadRequest(BaseModel):
+    filename: str
+    content_type: str
+    size: int = Field(..., gt=0)
+    sha256: str = Field(..., pattern=r"^[0-9a-fA-F]{64}$")  # hex digest of the file, computed by the client
+
+
+class PresignedUploadComplete(BaseModel):
+    key: str
\ No newline at end of file
@@ -44,6 +44,7 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     email: Optional[str] = None
+    exp: Optional[int] = None  # expiry as a unix timestamp
 
 
 # Settings Schemas
@@ -6,7 +6,7 @@ from datetime import datetime
 class UserElementBase(BaseModel):
     name: str
     element_data: Dict[str, Any]  # Stores the element configuration
-    thumbnail: Optional[str] = None  # Base64 encoded thumbnail
+    thumbnail: Optional[str] = None  # Image URL; base64 data URLs are moved to storage on save
 
 
 class UserElementCreate(UserElementBase):
@@ -31,6 +31,7 @@ class UserElementLibrary(BaseModel):
     """Response model for user's custom element library"""
     elements: List[UserElementResponse]
     total_count: int
+    next_cursor: Optional[str] = None
 
 
 class ElementUsageUpdate(BaseModel):
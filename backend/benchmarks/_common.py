@@ -0,0 +1,107 @@
+import contextlib
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Sequence
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+INTERNAL_TOKEN = "benchmark"
+PASSWORD = "benchmark-password"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def run_server(env: Optional[Dict[str, str]] = None) -> Iterator["Server"]:
+    """Start uvicorn on a fresh SQLite database and local storage.
+
+    ``env`` overrides settings, including DATABASE_URL to benchmark
+    another database. Everything is removed when the block exits.
+    """
+    with tempfile.TemporaryDirectory(prefix="hostbuddy-bench-") as tmp:
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        server_env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{tmp}/bench.db",
+            "STORAGE_BACKEND": "local",
+            "LOCAL_STORAGE_DIR": f"{tmp}/storage",
+            "LOCAL_STORAGE_PUBLIC_URL": f"{url}/api/v1/upload/files",
+            "INTERNAL_API_TOKEN": INTERNAL_TOKEN,
+            **(env or {}),
+        }
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=BACKEND_DIR,
+            env=server_env,
+        )
+        try:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    httpx.get(f"{url}/health", timeout=1)
+                    break
+                except httpx.TransportError:
+                    if process.poll() is not None or time.monotonic() > deadline:
+                        raise RuntimeError("Server did not start")
+                    time.sleep(0.1)
+            yield Server(url, process.pid)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+class Server:
+    def __init__(self, url: str, pid: int):
+        self.url = url
+        self.api = f"{url}/api/v1"
+        self.pid = pid
+
+    def peak_rss_mb(self) -> float:
+        """Peak resident memory of the server process (Linux only)"""
+        for line in Path(f"/proc/{self.pid}/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+        return 0.0
+
+    def reset_peak_rss(self) -> None:
+        """Restart peak_rss_mb from the current usage (Linux only)"""
+        Path(f"/proc/{self.pid}/clear_refs").write_text("5")
+
+    def internal(self, path: str) -> dict:
+        response = httpx.get(f"{self.api}/internal/{path}", headers={"Authorization": f"Bearer {INTERNAL_TOKEN}"})
+        response.raise_for_status()
+        return response.json()
+
+
+def register(server: Server, email: str) -> Dict[str, str]:
+    """Create a user and return headers authenticating as them"""
+    httpx.post(f"{server.api}/auth/register", json={"name": "Bench", "email": email, "password": PASSWORD}, timeout=30)
+    response = httpx.post(f"{server.api}/auth/login", json={"email": email, "password": PASSWORD}, timeout=30)
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def describe_ms(values: Sequence[float]) -> str:
+    """p50/p95/p99/max of durations given in seconds"""
+    return " ".join(
+        f"{name}={percentile(values, fraction) * 1000:.1f}ms"
+        for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))
+    )
\ No newline at end of file
@@ -0,0 +1,93 @@
+"""Throughput and memory of bulk event import and streaming export.
+
+Streams --rows events to POST /events/bulk as NDJSON, exports them as
+NDJSON and CSV, then imports the CSV export into a second account. Peak
+server RSS is measured across each export to show it doesn't grow with the
+row count.
+
+    python -m benchmarks.bulk_events --rows 100000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from ._common import register, run_server
+
+LINES_PER_CHUNK = 500
+
+
+async def ndjson_rows(rows: int):
+    lines = []
+    for i in range(rows):
+        lines.append(json.dumps({
+            "title": f"Event {i}",
+            "description": "Annual gathering " * 3,
+            "location": f"Hall {i % 50}",
+            "start_date": f"2026-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+            "start_time": "18:30:00",
+        }))
+        if len(lines) == LINES_PER_CHUNK:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+
+async def replay(chunks: list):
+    for chunk in chunks:
+        yield chunk
+
+
+async def bulk_import(client: httpx.AsyncClient, api: str, headers: dict, body, content_type: str, rows: int) -> None:
+    started = time.perf_counter()
+    response = await client.post(f"{api}/events/bulk", content=body, headers={**headers, "Content-Type": content_type})
+    response.raise_for_status()
+    elapsed = time.perf_counter() - started
+    report = response.json()
+    print(f"  import {content_type}: {report['inserted']} inserted, {report['failed']} failed "
+          f"in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s)")
+
+
+async def export(client: httpx.AsyncClient, server, headers: dict, fmt: str) -> list:
+    server.reset_peak_rss()
+    chunks, first_byte = [], None
+    started = time.perf_counter()
+    async with client.stream("GET", f"{server.api}/events/export", params={"format": fmt}, headers=headers) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes():
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            chunks.append(chunk)
+    elapsed = time.perf_counter() - started
+    size = sum(len(chunk) for chunk in chunks)
+    lines = sum(chunk.count(b"\n") for chunk in chunks)
+    print(f"  export {fmt}: {size / 1e6:.1f} MB, {lines} lines in {elapsed:.2f}s ({lines / elapsed:,.0f} rows/s), "
+          f"first byte {first_byte * 1000:.0f}ms, peak RSS {server.peak_rss_mb():.0f} MB")
+    return chunks
+
+
+async def measure(server, rows: int) -> None:
+    exporter = register(server, "export@example.com")
+    importer = register(server, "import@example.com")
+    async with httpx.AsyncClient(timeout=600) as client:
+        await bulk_import(client, server.api, exporter, ndjson_rows(rows), "application/x-ndjson", rows)
+        await export(client, server, exporter, "ndjson")
+        csv_chunks = await export(client, server, exporter, "csv")
+        await bulk_import(client, server.api, importer, replay(csv_chunks), "text/csv", rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with run_server() as server:
+        print(f"{args.rows:,} events")
+        asyncio.run(measure(server, args.rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Broadcast latency and database writes of live layout editing.
+
+Opens --clients WebSocket editors on each of --layouts layouts. Every
+editor sends --rate move operations a second, carrying its send time in the
+element's x coordinate, and every editor records how long other people's
+operations take to arrive. The server's flush counters show how many
+database writes the operations were coalesced into.
+
+    python -m benchmarks.collab_load --layouts 4 --clients 25 --rate 2 --seconds 8
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+import websockets
+
+from ._common import describe_ms, register, run_server
+
+ELEMENTS_PER_LAYOUT = 200
+
+
+async def editor(ws_url: str, element_id: str, rate: float, start: float, seconds: float, latencies: list) -> None:
+    async with websockets.connect(ws_url, max_queue=None) as ws:
+        await ws.recv()  # snapshot
+
+        async def read() -> None:
+            async for message in ws:
+                message = json.loads(message)
+                if message["type"] == "ops":
+                    latencies.append(time.perf_counter() - message["operations"][0]["x"])
+
+        reader = asyncio.create_task(read())
+        await asyncio.sleep(start - time.perf_counter())
+        until = time.perf_counter() + seconds
+        while time.perf_counter() < until:
+            operation = {"op": "move", "id": element_id, "x": time.perf_counter(), "y": 0}
+            await ws.send(json.dumps({"type": "ops", "operations": [operation]}))
+            await asyncio.sleep(1 / rate)
+        # Let the last broadcasts arrive
+        await asyncio.sleep(1)
+        reader.cancel()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--layouts", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=25, help="editors per layout")
+    parser.add_argument("--rate", type=float, default=2, help="operations per second per editor")
+    parser.add_argument("--seconds", type=float, default=8)
+    args = parser.parse_args()
+
+    with run_server() as server:
+        headers = register(server, "collab@example.com")
+        event = httpx.post(f"{server.api}/events/", headers=headers, json={"title": "Collab"}).json()
+        elements = [{"id": f"e{i}", "type": "square", "x": 0, "y": 0} for i in range(ELEMENTS_PER_LAYOUT)]
+        layout_ids = [
+            httpx.post(f"{server.api}/layouts/", json={"event_id": event["event_id"], "elements": elements}).json()["layout_id"]
+            for _ in range(args.layouts)
+        ]
+        ws_base = server.api.replace("http://", "ws://")
+
+        async def run() -> list:
+            latencies = []
+            # Everyone connects first, then starts sending together
+            start = time.perf_counter() + 3
+            await asyncio.gather(*(
+                editor(f"{ws_base}/layouts/{layout_id}/ws", f"e{n}", args.rate, start, args.seconds, latencies)
+                for layout_id in layout_ids
+                for n in range(args.clients)
+            ))
+            return latencies
+
+        latencies = asyncio.run(run())
+        stats = server.internal("collab")
+        print(f"{args.layouts} layouts x {args.clients} editors x {args.rate:g} ops/s for {args.seconds:g}s")
+        print(f"  {stats['ops_applied']} ops, {len(latencies)} deliveries, latency {describe_ms(latencies)}")
+        print(f"  {stats['flushes']} flushes ({stats['flushes'] / args.seconds:.1f}/s, "
+              f"{stats['avg_ops_per_flush']:.0f} ops each, {stats['avg_flush_ms']:.1f}ms) "
+              f"for {stats['ops_applied'] / args.seconds:.0f} ops/s")
+        print(f"  dropped editors {stats['dropped_clients']}, flush errors {stats['flush_errors']}")
+
+
+if __name__ == "__main__":
+    main()
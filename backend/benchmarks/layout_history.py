@@ -0,0 +1,82 @@
+"""Storage and read cost of layout revision history.
+
+Makes --edits random edits to one layout: mostly PATCH moves and updates,
+with some adds, removes, reorders, and a reordered full PUT every 100
+edits. It then compares the bytes written to layout_revisions with keeping
+a full copy per revision, and times reading every revision back.
+
+    python -m benchmarks.layout_history --elements 200 --edits 1000
+"""
+import argparse
+import json
+import random
+import time
+
+import httpx
+
+from ._common import describe_ms, register, run_server
+
+
+def random_operation(rng: random.Random, elements: list, next_id: int) -> dict:
+    ids = [element["id"] for element in elements]
+    roll = rng.random()
+    if roll < 0.6:
+        return {"op": "move", "id": rng.choice(ids), "x": rng.random() * 800, "y": rng.random() * 600}
+    if roll < 0.8:
+        return {"op": "update", "id": rng.choice(ids), "changes": {"fill": "#%06x" % rng.randrange(1 << 24)}}
+    if roll < 0.9 or len(ids) <= 10:
+        return {"op": "add", "id": next_id, "element": {"type": "circle", "x": 1, "y": 2, "width": 20, "height": 20}}
+    if roll < 0.97:
+        return {"op": "remove", "id": rng.choice(ids)}
+    return {"op": "move", "id": rng.choice(ids), "index": 0}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--elements", type=int, default=200, help="elements in the layout to start with")
+    parser.add_argument("--edits", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with run_server() as server, httpx.Client(base_url=server.api, timeout=60) as client:
+        headers = register(server, "history@example.com")
+        event = client.post("/events/", headers=headers, json={"title": "History"}).json()
+        elements = [
+            {"id": i, "type": "rect", "x": i * 10.0, "y": i * 5.0, "width": 50, "height": 30,
+             "fill": "#abcdef", "label": f"Table {i}"}
+            for i in range(args.elements)
+        ]
+        layout = client.post("/layouts/", json={"event_id": event["event_id"], "elements": elements}).json()
+        layout_id, version = layout["layout_id"], layout["version"]
+        full_copy_bytes = len(json.dumps(elements))
+
+        started = time.perf_counter()
+        for n in range(args.edits):
+            if n % 100 == 50:
+                response = client.put(f"/layouts/{layout_id}", json={"elements": list(reversed(elements))})
+            else:
+                operation = random_operation(rng, elements, args.elements + n)
+                response = client.patch(f"/layouts/{layout_id}", json={"version": version, "operations": [operation]})
+            response.raise_for_status()
+            version = response.json()["version"]
+            elements = client.get(f"/layouts/{layout_id}").json()["elements"]
+            full_copy_bytes += len(json.dumps(elements))
+        print(f"{args.edits} edits to a {args.elements}-element layout in {time.perf_counter() - started:.1f}s")
+
+        stats = server.internal("layout-history")
+        print(f"  {stats['snapshots_written']} snapshots, {stats['deltas_written']} deltas, "
+              f"{stats['bytes_written'] / 1e6:.2f} MB written vs {full_copy_bytes / 1e6:.2f} MB as full copies")
+
+        timings, deltas = [], []
+        for revision in range(1, version + 1):
+            started = time.perf_counter()
+            response = client.get(f"/layouts/{layout_id}/revisions/{revision}")
+            timings.append(time.perf_counter() - started)
+            response.raise_for_status()
+            deltas.append(response.json()["deltas_applied"])
+        print(f"  reading {len(timings)} revisions: {describe_ms(timings)}, at most {max(deltas)} deltas applied")
+
+
+if __name__ == "__main__":
+    main()
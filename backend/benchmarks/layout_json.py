@@ -0,0 +1,69 @@
+"""GET /layouts/{id} latency and server memory with and without orjson.
+
+Stores layouts of several sizes, then fetches each one repeatedly with
+FAST_JSON_RESPONSES off and on. The fast path embeds the stored element
+JSON verbatim instead of decoding and re-encoding it.
+
+    python -m benchmarks.layout_json --sizes 1000 10000 50000 --repeat 20
+"""
+import argparse
+import random
+import time
+
+import httpx
+
+from ._common import describe_ms, register, run_server
+
+
+def make_elements(count: int) -> list:
+    rng = random.Random(count)
+    return [
+        {
+            "id": f"el-{i}",
+            "type": rng.choice(["table", "chair", "stage", "bar"]),
+            "x": rng.uniform(0, 5000),
+            "y": rng.uniform(0, 5000),
+            "width": rng.uniform(20, 200),
+            "height": rng.uniform(20, 200),
+            "rotation": rng.choice([0, 90, 180, 270]),
+            "label": f"Element {i}",
+            "properties": {"seats": rng.randint(1, 12), "color": "#88aacc"},
+        }
+        for i in range(count)
+    ]
+
+
+def measure(server, sizes: list, repeat: int) -> None:
+    headers = register(server, "layouts@example.com")
+    with httpx.Client(timeout=120) as client:
+        event = client.post(f"{server.api}/events/", headers=headers, json={"title": "Layouts"}).json()
+        for size in sizes:
+            response = client.post(f"{server.api}/layouts/", json={
+                "event_id": event["event_id"], "name": f"{size} elements", "elements": make_elements(size),
+            })
+            response.raise_for_status()
+            url = f"{server.api}/layouts/{response.json()['layout_id']}"
+            server.reset_peak_rss()
+            timings, body_size = [], 0
+            for _ in range(repeat):
+                started = time.perf_counter()
+                body_size = len(client.get(url).content)
+                timings.append(time.perf_counter() - started)
+            print(f"  {size:>6} elements ({body_size / 1e6:.1f} MB): {describe_ms(timings)}, "
+                  f"peak RSS while reading {server.peak_rss_mb():.0f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=20, help="fetches per layout")
+    args = parser.parse_args()
+
+    for fast in ("false", "true"):
+        with run_server({"FAST_JSON_RESPONSES": fast}) as server:
+            print(f"FAST_JSON_RESPONSES={fast}")
+            measure(server, args.sizes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
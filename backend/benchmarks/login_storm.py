@@ -0,0 +1,67 @@
+"""Latency of unrelated requests while many clients log in at once.
+
+Argon2 verification runs in the hashing pool, so /health and an
+authenticated event listing should stay fast during the storm, and logins
+beyond the pool's queue should be turned away with 503.
+
+    python -m benchmarks.login_storm --clients 64 --seconds 10
+    PASSWORD_HASH_EXECUTOR=process python -m benchmarks.login_storm
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+
+from ._common import PASSWORD, describe_ms, register, run_server
+
+
+async def probe(client: httpx.AsyncClient, url: str, headers: dict, until: float, samples: list) -> None:
+    while time.perf_counter() < until:
+        started = time.perf_counter()
+        await client.get(url, headers=headers)
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(0.01)
+
+
+async def login(client: httpx.AsyncClient, url: str, email: str, until: float, statuses: Counter) -> None:
+    while time.perf_counter() < until:
+        response = await client.post(url, json={"email": email, "password": PASSWORD})
+        statuses[response.status_code] += 1
+
+
+async def measure(server, headers: dict, email: str, clients: int, seconds: float) -> None:
+    limits = httpx.Limits(max_connections=clients + 8)
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+        for label, storm in (("idle", 0), ("storm", clients)):
+            health, events, statuses = [], [], Counter()
+            until = time.perf_counter() + seconds
+            await asyncio.gather(
+                probe(client, f"{server.url}/health", {}, until, health),
+                probe(client, f"{server.api}/events/", headers, until, events),
+                *(login(client, f"{server.api}/auth/login", email, until, statuses) for _ in range(storm)),
+            )
+            print(f"{label}: /health {describe_ms(health)}")
+            print(f"{label}: GET /events/ {describe_ms(events)}")
+            if storm:
+                total = sum(statuses.values())
+                print(f"{label}: {total} logins in {seconds:.0f}s ({total / seconds:.0f}/s), by status {dict(statuses)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=64, help="concurrent clients logging in")
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    with run_server() as server:
+        email = "storm@example.com"
+        headers = register(server, email)
+        asyncio.run(measure(server, headers, email, args.clients, args.seconds))
+        print(f"hashing pool: {server.internal('auth')['hashing_pool']}")
+        print(f"database pool: {server.internal('db-pool')}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
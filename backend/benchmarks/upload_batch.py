@@ -0,0 +1,121 @@
+"""Wall time of five-image /upload/upload batches at different concurrency.
+
+Runs against S3: a local moto server by default, answering after
+--latency-ms to stand in for the network, or a real endpoint such as MinIO
+with --endpoint. Compares STORAGE_MAX_CONCURRENT_UPLOADS=1, which
+uploads a batch one file at a time, with the default of 8, and probes
+/health meanwhile to show the event loop stays free.
+
+    python -m benchmarks.upload_batch --batches 10 --size-kb 1024 --latency-ms 50
+    python -m benchmarks.upload_batch --endpoint localhost:9000 --access-key hostbuddy --secret-key hostbuddy123
+"""
+import argparse
+import asyncio
+import io
+import logging
+import threading
+import time
+import uuid
+
+import httpx
+import numpy as np
+from PIL import Image
+from werkzeug.serving import make_server
+
+from ._common import free_port, describe_ms, register, run_server
+
+FILES_PER_BATCH = 5
+
+
+def make_jpeg(size_kb: int) -> bytes:
+    """A noise image, which JPEG can't shrink, of roughly the given size"""
+    side = int((size_kb * 1024 / 1.1) ** 0.5)
+    pixels = np.random.randint(0, 256, (side, side, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=95)
+    return buffer.getvalue()
+
+
+def start_moto(port: int, latency: float):
+    """Serve moto's S3 on a thread, delaying every response by ``latency``"""
+    from moto.server import DomainDispatcherApplication, create_backend_app
+
+    s3 = DomainDispatcherApplication(create_backend_app)
+
+    def app(environ, start_response):
+        time.sleep(latency)
+        return s3(environ, start_response)
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def probe(client: httpx.AsyncClient, url: str, done: asyncio.Event, samples: list) -> None:
+    while not done.is_set():
+        started = time.perf_counter()
+        await client.get(url)
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(0.01)
+
+
+async def measure(server, headers: dict, batches: list) -> None:
+    async with httpx.AsyncClient(timeout=120) as client:
+        health, walls, done = [], [], asyncio.Event()
+        prober = asyncio.create_task(probe(client, f"{server.url}/health", done, health))
+        for batch in batches:
+            files = [("files", (f"{uuid.uuid4().hex}.jpg", data, "image/jpeg")) for data in batch]
+            started = time.perf_counter()
+            response = await client.post(f"{server.api}/upload/upload", headers=headers, files=files)
+            response.raise_for_status()
+            walls.append(time.perf_counter() - started)
+        done.set()
+        await prober
+    print(f"  batch wall time {describe_ms(walls)}")
+    print(f"  /health during uploads {describe_ms(health)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batches", type=int, default=10)
+    parser.add_argument("--size-kb", type=int, default=1024, help="approximate size of each image")
+    parser.add_argument("--endpoint", help="S3 endpoint host:port; starts moto when omitted")
+    parser.add_argument("--latency-ms", type=float, default=50, help="delay added to each moto request")
+    parser.add_argument("--access-key", default="benchmark")
+    parser.add_argument("--secret-key", default="benchmark")
+    args = parser.parse_args()
+
+    moto = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        port = free_port()
+        moto = start_moto(port, args.latency_ms / 1000)
+        endpoint = f"127.0.0.1:{port}"
+
+    # Fresh bytes for every batch, since identical content is deduplicated
+    batches = [[make_jpeg(args.size_kb) for _ in range(FILES_PER_BATCH)] for _ in range(args.batches)]
+    try:
+        for concurrency in ("1", "8"):
+            env = {
+                "STORAGE_BACKEND": "s3",
+                # Resizing runs after the response; leave the CPU to the uploads
+                "IMAGE_VARIANTS_ENABLED": "false",
+                "STORAGE_MAX_CONCURRENT_UPLOADS": concurrency,
+                "MINIO_ENDPOINT": endpoint,
+                "MINIO_PUBLIC_ENDPOINT": endpoint,
+                "MINIO_ACCESS_KEY": args.access_key,
+                "MINIO_SECRET_KEY": args.secret_key,
+                "MINIO_BUCKET": f"bench-{uuid.uuid4().hex[:8]}",
+            }
+            with run_server(env) as server:
+                print(f"STORAGE_MAX_CONCURRENT_UPLOADS={concurrency}")
+                asyncio.run(measure(server, register(server, "uploads@example.com"), batches))
+                print(f"  storage {server.internal('images')['storage']}")
+    finally:
+        if moto is not None:
+            moto.shutdown()
+
+
+if __name__ == "__main__":
+    main()
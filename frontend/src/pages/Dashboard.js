@@ -4,6 +4,7 @@ import { useDispatch, useSelector } from 'react-redux';
 import { fetchEvents, deleteEvent } from '../store/eventSlice';
 import LoadingSpinner from '../components/LoadingSpinner';
 import CustomizedModal from '../components/CustomizedModal';
+import { getImageVariant, fallbackToOriginal } from '../utils/imageUtils';
 
 const Dashboard = () => {
   const dispatch = useDispatch();
@@ -182,7 +183,8 @@ const Dashboard = () => {
                 >
                   {event.images && event.images.length > 0 ? (
                     <img 
-                      src={event.images[0]} 
+                      src={getImageVariant(event, event.images[0], 480)}
+                      onError={fallbackToOriginal(event.images[0])}
                       alt={event.title}
                       className="event-image"
                     />
@@ -4,6 +4,7 @@ import { useDispatch, useSelector } from 'react-redux';
 import { fetchEventById, deleteEvent, clearCurrentEvent } from '../store/eventSlice';
 import LoadingSpinner from '../components/LoadingSpinner';
 import CustomizedModal from '../components/CustomizedModal';
+import { getImageVariant, fallbackToOriginal } from '../utils/imageUtils';
 
 const EventDetails = () => {
   const { id } = useParams();
@@ -171,7 +172,8 @@ const EventDetails = () => {
             <div>
               {currentEvent.images && currentEvent.images.length > 0 ? (
                 <img 
-                  src={currentEvent.images[0]} 
+                  src={getImageVariant(currentEvent, currentEvent.images[0], 1280)}
+                  onError={fallbackToOriginal(currentEvent.images[0])}
                   alt={currentEvent.title}
                   style={styles.eventImage}
                 />
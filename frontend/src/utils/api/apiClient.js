@@ -70,4 +70,20 @@ apiClient.interceptors.response.use(
   }
 );
 
+// Follow next_cursor through a keyset-paginated listing and collect every item
+export const fetchAllPages = async (url, params = {}, itemsKey = 'items') => {
+  const items = [];
+  let cursor = null;
+
+  do {
+    const response = await apiClient.get(url, {
+      params: cursor ? { ...params, cursor } : params,
+    });
+    items.push(...response.data[itemsKey]);
+    cursor = response.data.next_cursor;
+  } while (cursor);
+
+  return items;
+};
+
 export default apiClient;
\ No newline at end of file
@@ -1,9 +1,8 @@
-import apiClient from './apiClient';
+import apiClient, { fetchAllPages } from './apiClient';
 
 const eventAPI = {
   getEvents: async () => {
-    const response = await apiClient.get('/events');
-    return response.data;
+    return fetchAllPages('/events', { limit: 200 });
   },
 
   getEventById: async (id) => {
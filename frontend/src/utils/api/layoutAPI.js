@@ -1,9 +1,9 @@
-import apiClient from './apiClient';
+import apiClient, { fetchAllPages } from './apiClient';
 
 const layoutAPI = {
   getLayouts: async (eventId) => {
-    const response = await apiClient.get(`/layouts?event_id=${eventId}`);
-    return response.data;
+    // The layout picker only needs names; elements are fetched per layout on load
+    return fetchAllPages('/layouts', { event_id: eventId, view: 'summary' });
   },
 
   getLayoutById: async (id) => {
@@ -21,6 +21,12 @@ const layoutAPI = {
     return response.data;
   },
 
+  // Apply element-level operations ({ op, id, ... }) against a known layout version
+  patchLayout: async (id, version, operations) => {
+    const response = await apiClient.patch(`/layouts/${id}`, { version, operations });
+    return response.data;
+  },
+
   deleteLayout: async (id) => {
     const response = await apiClient.delete(`/layouts/${id}`);
     return response.data;
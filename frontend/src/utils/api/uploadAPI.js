@@ -1,10 +1,19 @@
+import axios from 'axios';
 import apiClient from './apiClient';
 
+const sha256Hex = async (file) => {
+  const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest))
+    .map((b) => b.toString(16).padStart(2, '0'))
+    .join('');
+};
+
 const uploadAPI = {
-  uploadImage: async (file) => {
+  // Upload through the API server
+  uploadImageViaServer: async (file) => {
     const formData = new FormData();
     formData.append('file', file);
-    
+
     const response = await apiClient.post('/upload/image', formData, {
       headers: {
         'Content-Type': 'multipart/form-data',
@@ -12,6 +21,35 @@ const uploadAPI = {
     });
     return response.data;
   },
+
+  // Upload straight to storage with a presigned URL, so the bytes never
+  // pass through the API server. Falls back to the server upload when the
+  // storage backend doesn't support it or the direct upload fails
+  uploadImage: async (file) => {
+    try {
+      const sha256 = await sha256Hex(file);
+      const { data: presigned } = await apiClient.post('/upload/presigned', {
+        filename: file.name,
+        content_type: file.type,
+        size: file.size,
+        sha256,
+      });
+
+      if (!presigned.deduplicated) {
+        const { method, url, headers } = presigned.upload;
+        await axios({ method, url, headers, data: file });
+      }
+
+      const { data } = await apiClient.post('/upload/presigned/complete', { key: presigned.key });
+      return data;
+    } catch (error) {
+      // Validation errors (type, size) apply to the fallback too
+      if (error.response?.status === 400 && error.config?.url === '/upload/presigned') {
+        throw error;
+      }
+      return uploadAPI.uploadImageViaServer(file);
+    }
+  },
 };
 
 export default uploadAPI;
\ No newline at end of file
@@ -1,4 +1,4 @@
-import apiClient from './apiClient';
+import apiClient, { fetchAllPages } from './apiClient';
 
 const userElementsAPI = {
   /**
@@ -7,17 +7,14 @@ const userElementsAPI = {
    * @param {string} params.search - Search term for name
    */
   getUserElements: async (params = {}) => {
-    const queryParams = new URLSearchParams();
+    const queryParams = { limit: 200 };
     
     if (params.search) {
-      queryParams.append('search', params.search);
+      queryParams.search = params.search;
     }
     
-    const queryString = queryParams.toString();
-    const url = queryString ? `/user-elements?${queryString}` : '/user-elements';
-    
-    const response = await apiClient.get(url);
-    return response.data;
+    const elements = await fetchAllPages('/user-elements', queryParams, 'elements');
+    return { elements, total_count: elements.length };
   },
 
   /**
@@ -0,0 +1,21 @@
+// Pick the smallest generated variant of an event image that is at least
+// `minWidth` pixels wide. Falls back to the original when the server has no
+// variants for it (e.g. external URLs)
+export const getImageVariant = (event, url, minWidth, format = 'webp') => {
+  const variants = event?.image_variants?.[url];
+  if (!variants) {
+    return url;
+  }
+
+  const widths = Object.keys(variants).map(Number).sort((a, b) => a - b);
+  const width = widths.find((w) => w >= minWidth) ?? widths[widths.length - 1];
+  return variants[width]?.[format] || url;
+};
+
+// Variants are generated in the background after upload, so a fresh one may
+// not exist yet. Swap back to the original image once if it fails to load
+export const fallbackToOriginal = (url) => (e) => {
+  if (e.currentTarget.src !== url) {
+    e.currentTarget.src = url;
+  }
+};
\ No newline at end of file